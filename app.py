@@ -2,16 +2,26 @@
 Main application file.
 """
 
+import csv
 import sys
 from functools import partial
+from importlib import import_module
+from pathlib import Path
+from threading import Thread
+from typing import TYPE_CHECKING
 
 from PySide6 import QtWidgets
-from PySide6.QtWidgets import QMessageBox
-from PySide6.QtCore import QPropertyAnimation
+from PySide6.QtWidgets import QCheckBox, QMessageBox
+from PySide6.QtCore import QPropertyAnimation, QTimer
 
-from packages.logic import toolkit, bg_processes
-from packages.ui.aesthetic import AestheticWindow
-from packages.ui.custom_widgets import CustomQLineEdit, CustomQLabel, CustomQProgressBar
+from packages.constants import constants
+from packages.logic import toolkit
+from packages.logic.jobs import Job
+from packages.ui.aesthetic import AestheticWindow, pixmap_from_bytes
+from packages.ui.custom_widgets import CustomQLineEdit, CustomQLabel, CustomQProgressBar, JobsDashboard
+
+if TYPE_CHECKING:
+    from packages.logic import bg_processes, playlists
 
 
 class MainWindow(AestheticWindow):
@@ -22,10 +32,12 @@ class MainWindow(AestheticWindow):
         self.setWindowTitle("YouTube MP3 Downloader")
         self.setFixedSize(900, 500)
         self.setAcceptDrops(True)
-        self.process_thread = bg_processes.DownloadAndProcess()
-        self.legal_thread = bg_processes.DetectVideoCopyright()
+        self.legal_timer = QTimer(self)
+        self.legal_timer.setSingleShot(True)
+        self.legal_timer.setInterval(constants.LEGAL_CHECK_DELAY)
         self.current_cover = None
         self.mp3_quality: str = "192k"
+        self.normalize: bool = False
         self.placeholders: list[str] = [
             "Title",
             "Artist",
@@ -58,6 +70,7 @@ class MainWindow(AestheticWindow):
         self.label_legal_warning_animation = None
         self.label_legal_warning_opacity_effect = None
         self.progress_bar = None
+        self.dashboard = None
         self.le_youtube_url = None
         self.btn_download = None
         self.btn_settings = None
@@ -76,20 +89,52 @@ class MainWindow(AestheticWindow):
 
         self.logic_connect_widgets()
 
+        ##################################################
+        # Background services.
+        ##################################################
+
+        # pytube, mutagen, PIL and friends are imported while the window is being built,
+        # and the services using them are only created once it has been painted.
+        self.services_loader = Thread(target=import_module, args=("packages.logic.bg_processes",), daemon=True)
+        self.services_loader.start()
+        self.scheduler = None
+        self.legal_checker = None
+        self.cover_processor = None
+        self.expander = None
+
+    def closeEvent(self, event):
+
+        for service in (self.scheduler, self.legal_checker, self.cover_processor, self.expander):
+            if service is not None:
+                service.shutdown()
+
+        super().closeEvent(event)
+
+    def paintEvent(self, event):
+
+        super().paintEvent(event)
+
+        if self.scheduler is None:
+            QTimer.singleShot(0, self.logic_start_services)
+
     def dragEnterEvent(self, event):
 
         event.accept()
 
     def dropEvent(self, event):
-        """Handle file drop events, process image files, and update the album cover label."""
+        """Handle file drop events: image files are sent to the background cover processor,
+        text and CSV files of links are imported."""
 
         event.accept()
         dropped_file = event.mimeData().urls()[0].toLocalFile()
 
         if dropped_file.split('.')[-1].casefold() in ['jpg', 'jpeg', 'png', 'bmp']:
 
-            self.current_cover = toolkit.process_album_cover(image=dropped_file)
-            self.label_album_cover.setPixmap(self.current_cover[0])
+            self.cover_processor.process(image=dropped_file)
+
+        elif dropped_file.split('.')[-1].casefold() in ['txt', 'csv']:
+
+            self.logic_import_links(path=dropped_file)
 
     def ui_manage_graphics(self) -> None:
         """Graphics are managed here."""
@@ -154,13 +199,81 @@ class MainWindow(AestheticWindow):
 
         self.btn_download.clicked.connect(self.logic_main_process)
         self.btn_settings.clicked.connect(self.logic_open_settings)
-        self.le_youtube_url.textChanged.connect(self.logic_legal_information)
-        self.process_thread.download_finished.connect(partial(self.logic_display_information, 1))
-        self.process_thread.file_converted.connect(partial(self.logic_display_information, 2))
-        self.process_thread.file_tagged.connect(partial(self.logic_display_information, 3))
-        self.process_thread.error_happened.connect(partial(self.logic_display_information, -1))
-        self.legal_thread.this_is_ok_signal.connect(partial(self.logic_show_legal_warning, False))
-        self.legal_thread.this_is_not_ok_signal.connect(partial(self.logic_show_legal_warning, True))
+        self.le_youtube_url.textChanged.connect(self.legal_timer.start)
+        self.legal_timer.timeout.connect(self.logic_legal_information)
+
+    def logic_start_services(self) -> None:
+        """Creates the background services and connects their signals, once their modules are loaded."""
+
+        if self.scheduler is not None:
+            return
+
+        self.services_loader.join()
+        from packages.logic import bg_processes, network
+
+        network.install_pytube()
+        self.scheduler = bg_processes.JobScheduler()
+        self.legal_checker = bg_processes.DetectVideoCopyright()
+        self.cover_processor = bg_processes.ProcessAlbumCover()
+        self.expander = bg_processes.ExpandCollection()
+
+        self.scheduler.job_submitted.connect(self.logic_connect_job)
+        self.scheduler.progress.updated.connect(self.logic_display_progress)
+        self.cover_processor.cover_ready.connect(self.logic_update_cover)
+        self.cover_processor.error_happened.connect(partial(self.logic_display_information, -4))
+        self.expander.entry_resolved.connect(self.logic_submit_entry)
+        self.expander.error_happened.connect(partial(self.logic_display_information, -1))
+        self.legal_checker.this_is_ok_signal.connect(partial(self.logic_show_legal_warning, False))
+        self.legal_checker.this_is_not_ok_signal.connect(partial(self.logic_show_legal_warning, True))
+        self.scheduler.resume()
+
+    def logic_connect_job(self, processor: "bg_processes.DownloadAndProcess") -> None:
+        """Connects the signals of a newly submitted job, and lists it in the jobs dashboard.
+        The dashboard starts a new list once every job of the previous one has finished,
+        and opens by itself as soon as several jobs run at the same time.
+
+        Args:
+            processor (bg_processes.DownloadAndProcess): The object processing the job.
+        """
+
+        if self.dashboard is None:
+            self.dashboard = JobsDashboard(parent=self)
+
+        job_list = self.dashboard.job_list
+        metadata = processor.job.metadata
+
+        if not job_list.active():
+            job_list.clear()
+
+        data: bool = metadata.get("artist") and metadata.get("title")
+        job_list.add_job(processor.job.job_id, f"{metadata["artist"]} - {metadata["title"]}" if data
+                         else processor.job.youtube_link)
+
+        if job_list.active() > 1 and not self.dashboard.isVisible():
+            self.dashboard.show()
+
+        processor.download_finished.connect(partial(self.logic_display_information, 1))
+        processor.file_converted.connect(partial(self.logic_display_information, 2))
+        processor.file_tagged.connect(self.logic_job_tagged)
+        processor.job_skipped.connect(self.logic_job_skipped)
+        processor.error_happened.connect(partial(self.logic_display_information, -1))
+
+    def logic_job_tagged(self) -> None:
+        """Tells the user that the job sending the signal succeeded, and whether its track was already in the library.
+        The job is found through sender, so that no connection keeps a finished job alive."""
+
+        processor: "bg_processes.DownloadAndProcess" = self.sender()
+        self.logic_display_information(signal=5 if processor.pipeline.duplicate else 3)
+
+    def logic_job_skipped(self, output_file: Path) -> None:
+        """Tells the user that a job was skipped, its video having been downloaded already,
+        or its audio being a track of the library already.
+
+        Args:
+            output_file (Path): The existing file, in the main quality of the job.
+        """
+
+        self.logic_display_information(signal=4)
 
     def logic_display_information(self, signal: int) -> None:
         """Displays information to the user regarding the progress or errors encountered.
@@ -171,63 +284,155 @@ class MainWindow(AestheticWindow):
         """
 
         signal_map: dict = {
+            -4: (" - The album cover could not be read.", 0),
             -3: (" - One or more tags are non-numeric.", 0),
             -2: (" - The provided link is not a valid YouTube link.", 0),
             -1: (" - An error has occurred.", 0),
             0: (" - Downloading...", 0),
-            1: (" - Converting...", 35),
-            2: (" - Writing metadata...", 70),
-            3: (" - Success!", 100)
+            1: (" - Converting...", None),
+            2: (" - Writing metadata...", None),
+            3: (" - Success!", None),
+            4: (" - Already downloaded.", 100),
+            5: (" - Success! A similar track was already in your library.", None)
         }
 
         self.setWindowTitle("YouTube MP3 Downloader" + signal_map[signal][0])
-        self.progress_bar.setValue(signal_map[signal][1])
+
+        if signal_map[signal][1] is not None:  # In between, the bar follows the real progress of the job
+            self.progress_bar.setValue(signal_map[signal][1])
+
+    def logic_display_progress(self, updates: dict) -> None:
+        """Updates the jobs dashboard, and the progress bar with the mean progress of the listed jobs.
+        Called with a batch of updates at most constants.PROGRESS_RATE times per second.
+
+        Args:
+            updates (dict): The bg_processes.JobUpdate of each job that changed, keyed by job ID.
+        """
+
+        self.dashboard.job_list.apply(updates)
+        self.progress_bar.setValue(self.dashboard.job_list.overall())
 
     def logic_legal_information(self) -> None:
-        """Initiates a legal information check process for the YouTube video URL entered."""
+        """Initiates a legal information check process for the YouTube video URL entered.
+        Called once the user has stopped typing for constants.LEGAL_CHECK_DELAY milliseconds."""
 
         if not toolkit.check_link(text=self.le_youtube_url.text()):
+            self.legal_checker.cancel()
             return
 
-        setattr(self.legal_thread, "youtube_url", self.le_youtube_url.text())
-        self.legal_thread.start()
+        self.legal_checker.check(youtube_url=self.le_youtube_url.text())
 
     def logic_main_process(self) -> None:
-        """Processes the information entered by the user and attempts to create the desired mp3 file."""
+        """Processes the information entered by the user and attempts to create the desired mp3 file.
+        A link with a start time ("t=90") only keeps the audio from that time on."""
+
+        from packages.logic import links, playlists  # Not needed until a link is submitted
 
-        line_edits: dict = CustomQLineEdit.instances
         youtube_link: str = self.le_youtube_url.text()
+        collection: bool = playlists.is_collection(youtube_link)
+        start: int = 0
+
+        if not collection:
+            try:
+                link: links.Link = links.parse_link(youtube_link)
+
+            except links.LinkError:
+                self.logic_display_information(signal=-2)
+                return
+
+            youtube_link, start = link.url, link.start
+
+        tags: dict | None = self.logic_read_tags()
 
-        if not toolkit.check_link(text=youtube_link):
-            self.logic_display_information(signal=-2)
+        if tags is None:
             return
 
+        self.logic_display_information(signal=0)
+
+        if collection:  # Its videos are submitted one by one as they are resolved
+            self.expander.expand(url=youtube_link, template=tags, options=self.job_options)
+            return
+
+        self.scheduler.submit(Job(youtube_link=youtube_link, metadata=tags, start=start, **self.job_options))
+
+    def logic_read_tags(self) -> dict | None:
+        """Reads the tags entered by the user.
+
+        Returns:
+            dict | None: The tags, or None if a numeric tag is not a number, the user being told so.
+        """
+
+        line_edits: dict = CustomQLineEdit.instances
         requires_num_value: list = [le for key, le in line_edits.items() if key == "Year" or " " in key]
         strings: list[str] = [le.text() for le in requires_num_value]
 
         if not toolkit.check_data(strings=strings):
             self.logic_display_information(signal=-3)
-            return
+            return None
 
         tags: dict = {phr.lower().replace(" ", "_"): line_edits[phr].text() for phr in self.placeholders}
         tags["disc_number"] = f"{line_edits["Disc Number"].text()}/{line_edits["Total Discs"].text()}"
         tags["track_number"] = f"{line_edits["Track Number"].text()}/{line_edits["Total Tracks"].text()}"
         tags["cover"] = self.current_cover[1] if self.current_cover else None
+        return tags
 
-        self.logic_display_information(signal=0)
-        setattr(self.process_thread, "youtube_link", youtube_link)
-        setattr(self.process_thread, "metadata", tags)
-        setattr(self.process_thread, "quality", self.mp3_quality)
-        self.process_thread.start()
+    def logic_import_links(self, path: str) -> None:
+        """Submits a job for every video of a text or CSV file of links. The tags entered by the user
+        apply to every video, except the title and the track number, which are specific to each one.
+
+        Args:
+            path (str): The path to the dropped file.
+        """
+
+        from packages.logic import links
+
+        tags: dict | None = self.logic_read_tags()
+
+        if tags is None:
+            return
+
+        try:
+            result: links.LinkImport = links.import_file(Path(path))
+
+        except (OSError, UnicodeError, csv.Error):
+            self.logic_display_information(signal=-1)
+            return
+
+        tags.update(title="", track_number="")
+        options: dict = self.job_options
+        self.scheduler.submit_many(Job(youtube_link=link.url, metadata=dict(tags), start=link.start, **options)
+                                   for link in result.links)
+
+        self.setWindowTitle(f"YouTube MP3 Downloader - {len(result.links)} links imported, "
+                            f"{result.duplicates} duplicates, {len(result.rejected)} rejected.")
+
+    def logic_submit_entry(self, entry: "playlists.PlaylistEntry", metadata: dict, options: dict) -> None:
+        """Submits a video of a playlist or channel, once it has been resolved.
+
+        Args:
+            entry (playlists.PlaylistEntry): The resolved video.
+            metadata (dict): Its tags, see playlists.entry_metadata.
+            options (dict): The settings in force when the playlist was submitted, see job_options.
+        """
+
+        self.scheduler.submit(Job(youtube_link=entry.url, metadata=metadata, **options))
+
+    @property
+    def job_options(self) -> dict:
+        """The settings chosen by the user, as arguments of the Job class."""
+
+        quality, *variants = self.mp3_quality.split(",")
+        return {"quality": quality, "variants": tuple(variants), "normalize": self.normalize}
 
     def logic_open_settings(self) -> None:
-        """Opens a dialog for selecting the mp3 audio quality."""
+        """Opens a dialog for selecting the mp3 audio quality, the original quality, or every mp3 quality
+        at once (in a folder each), and whether the loudness is levelled and the silences trimmed."""
 
         # Setting up the QMessageBox
         win = QMessageBox(self)
         win.setIcon(QMessageBox.Question)  # type: ignore
         win.setWindowTitle("Settings")
-        win.setText("Please select the audio quality for the mp3")
+        win.setText("Please select the audio quality for the mp3, or keep the original audio without re-encoding")
         win.setStyleSheet("QLabel {color: black} QPushButton {width: 120px; height: 40px}")
 
         # Creating the buttons
@@ -235,10 +440,26 @@ class MainWindow(AestheticWindow):
         buttons: dict = {
             win.addButton(opt + " kbps", QMessageBox.ActionRole): opt + "k" for opt in options  # type: ignore
         }
+        buttons[win.addButton("Original", QMessageBox.ActionRole)] = constants.ORIGINAL_QUALITY  # type: ignore
+        every_quality: str = ",".join(opt + "k" for opt in reversed(options))  # One folder per quality
+        buttons[win.addButton("All", QMessageBox.ActionRole)] = every_quality  # type: ignore
+        win.setCheckBox(QCheckBox("Normalize loudness and trim silences"))
+        win.checkBox().setChecked(self.normalize)
         win.exec()
 
         # Record the user's choice
         self.mp3_quality: str = buttons[win.clickedButton()]
+        self.normalize: bool = win.checkBox().isChecked()
+
+    def logic_update_cover(self, data: bytes) -> None:
+        """Stores the processed album cover and updates the album cover label.
+
+        Args:
+            data (bytes): The processed cover, ready to be embedded in the files.
+        """
+
+        self.current_cover = (pixmap_from_bytes(data=data), data)
+        self.label_album_cover.setPixmap(self.current_cover[0])
 
     def logic_show_legal_warning(self, flag: bool) -> None:
         """Controls the display of a legal warning based on the given flag.
@@ -0,0 +1,137 @@
+"""
+Inputs of the benchmark suite. They are generated on first use and kept in a cache folder, so
+every run measures exactly the same data: audio files of several lengths (pink noise encoded by
+ffmpeg into the fragmented MP4 container YouTube serves, noise being the hardest signal to encode),
+images from thumbnail to camera size, and synthetic video titles and links.
+"""
+
+import os
+import random
+import subprocess
+from pathlib import Path
+
+from packages.constants import constants
+
+
+FIXTURES_FOLDER: Path = Path.joinpath(constants.CACHE_FOLDER, "benchmarks")
+AUDIO_LENGTHS: dict[str, int] = {"short": 30, "medium": 240, "long": 1200}
+IMAGE_SIZES: dict[str, tuple[int, int]] = {"small": (300, 300), "large": (3000, 3000), "huge": (8000, 6000)}
+WORDS: list[str] = [
+    "official", "audio", "live", "remastered", "lyrics", "full", "album", "symphony", "concerto", "sonata",
+    "piano", "orchestra", "cover", "remix", "version", "hd", "music", "video", "night", "morning", "in",
+    "major", "minor", "no", "op", "movement", "quartet", "session", "acoustic", "edit", "extended", "mix"
+]
+
+
+def cached(path: Path) -> bool:
+    """Check if a fixture has already been generated, creating the fixtures folder if needed."""
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    return path.is_file()
+
+
+def audio_fixture(length: str) -> Path:
+    """Get an audio file of the given length, as YouTube would serve it.
+
+    Args:
+        length (str): A key of AUDIO_LENGTHS.
+
+    Returns:
+        Path: The path to the m4a file.
+    """
+
+    path: Path = Path.joinpath(FIXTURES_FOLDER, f"audio-{length}.m4a")
+
+    if not cached(path):
+        temporary: Path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+        subprocess.run([
+            constants.FFMPEG, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"anoisesrc=duration={AUDIO_LENGTHS[length]}:color=pink:amplitude=0.3:seed=1",
+            "-ac", "2", "-ar", "44100", "-codec:a", "aac", "-b:a", "128k",
+            "-movflags", "+frag_keyframe+empty_moov+default_base_moof",
+            str(temporary)
+        ], check=True)
+        os.replace(temporary, path)
+
+    return path
+
+
+def image_fixture(size: str) -> Path:
+    """Get a JPEG photograph-like image (noise over a gradient) of the given size.
+
+    Args:
+        size (str): A key of IMAGE_SIZES.
+
+    Returns:
+        Path: The path to the image.
+    """
+
+    from PIL import Image
+
+    path: Path = Path.joinpath(FIXTURES_FOLDER, f"image-{size}.jpg")
+
+    if not cached(path):
+        width, height = IMAGE_SIZES[size]
+        noise = Image.effect_noise((width, height), 48)
+        gradient = Image.linear_gradient("L").resize((width, height))
+        image = Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.5)))
+        temporary: Path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+        image.save(temporary, format="JPEG", quality=90)
+        os.replace(temporary, path)
+
+    return path
+
+
+def titles(count: int, seed: int = 0) -> list[str]:
+    """Generate video titles, about one in ten naming a public domain composer.
+
+    Args:
+        count (int): The number of titles.
+        seed (int): The seed of the generator, so the corpus is the same on every run.
+
+    Returns:
+        list[str]: The titles.
+    """
+
+    generator = random.Random(seed)
+    composers: list[str] = constants.COMPOSERS.read_text(encoding="UTF-8").split("\n")
+    corpus: list[str] = []
+
+    for _ in range(count):
+        words: list[str] = generator.choices(WORDS, k=generator.randint(3, 12))
+
+        if generator.random() < 0.1:
+            words.insert(generator.randrange(len(words)), generator.choice(composers))
+
+        corpus.append(" ".join(words).title())
+
+    return corpus
+
+
+def links(count: int, seed: int = 0) -> list[str]:
+    """Generate links as users paste them, valid or not.
+
+    Args:
+        count (int): The number of links.
+        seed (int): The seed of the generator, so the corpus is the same on every run.
+
+    Returns:
+        list[str]: The links.
+    """
+
+    generator = random.Random(seed)
+    alphabet: str = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    templates: list[str] = [
+        "https://www.youtube.com/watch?v={}",
+        "https://www.youtube.com/watch?v={}&t=42s",
+        "https://youtu.be/{}",
+        "https://m.youtube.com/watch?v={}",
+        "www.youtube.com/watch?v={}",
+        "https://www.example.com/watch?v={}",
+        "not a link {}"
+    ]
+
+    return [
+        generator.choice(templates).format("".join(generator.choices(alphabet, k=11)))
+        for _ in range(count)
+    ]
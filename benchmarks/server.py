@@ -0,0 +1,96 @@
+"""
+Local stand-in for YouTube's media servers: serves the files of a folder over HTTP/1.1 with
+keep-alive connections, honouring both Range headers (used by the segmented downloader) and
+YouTube's "range=a-b" query parameter (used by streaming), so the download paths of the
+application can be benchmarked without any network access.
+"""
+
+import re
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+from typing import Iterator
+from urllib.parse import parse_qs, urlsplit
+
+
+RANGE_HEADER: re.Pattern = re.compile(r"bytes=(\d+)-(\d*)")
+RANGE_PARAMETER: re.Pattern = re.compile(r"(\d+)-(\d*)")
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serves whole files or single byte ranges of them."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # The head and the body are sent separately on kept-alive connections
+
+    def log_message(self, format, *args):
+
+        pass
+
+    def requested_range(self) -> re.Match | None:
+        """Get the byte range asked for, through the Range header or the range query parameter."""
+
+        parameter: list[str] = parse_qs(urlsplit(self.path).query).get("range", [])
+
+        if parameter:
+            return RANGE_PARAMETER.fullmatch(parameter[0])
+
+        return RANGE_HEADER.fullmatch(self.headers.get("Range", ""))
+
+    def do_GET(self):
+
+        path = Path(self.translate_path(self.path))
+
+        if not path.is_file():
+            self.send_error(404)
+            return
+
+        size: int = path.stat().st_size
+        start, end = 0, size - 1
+        match: re.Match | None = self.requested_range()
+
+        if match:
+            start, end = int(match[1]), min(int(match[2] or end), end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+
+        with open(path, "rb") as file:
+            file.seek(start)
+            remaining: int = end - start + 1
+
+            while remaining > 0 and (chunk := file.read(min(remaining, 256 * 1024))):
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+@contextmanager
+def serve(folder: Path) -> Iterator[str]:
+    """Serve a folder on a free local port for the duration of the block.
+
+    Args:
+        folder (Path): The folder whose files are served.
+
+    Yields:
+        str: The base URL of the server, e.g. "http://127.0.0.1:50123".
+    """
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RangeRequestHandler, directory=str(folder)))
+    server.daemon_threads = True
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+
+    finally:
+        server.shutdown()
+        server.server_close()
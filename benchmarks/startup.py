@@ -0,0 +1,134 @@
+"""
+Startup benchmark: measures how long the main window takes to be painted for the first time,
+and how much each top-level module costs to import, in fresh interpreters.
+
+    python -m benchmarks.startup [--runs 5] [--budget-ms 1500] [--json]
+
+The exit code is 1 when the median time to first paint exceeds the budget, so the benchmark
+can guard against startup regressions. Qt runs on the offscreen platform unless QT_QPA_PLATFORM
+is already set, so no display is needed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+
+BASE_FOLDER: Path = Path(__file__).resolve().parent.parent
+
+
+def probe() -> None:
+    """Runs in the measured interpreter: builds the window and exits right after its first paint."""
+
+    started: float = float(os.environ["STARTUP_BENCHMARK_T0"])
+
+    from PySide6 import QtWidgets
+    from PySide6.QtCore import QEvent, QObject, QTimer
+
+    root = QtWidgets.QApplication(sys.argv[:1])
+    import app
+
+    class FirstPaint(QObject):
+
+        def eventFilter(self, watched, event):
+
+            if event.type() == QEvent.Paint and not hasattr(self, "painted"):  # type: ignore
+                self.painted: float = time.time() - started
+                QTimer.singleShot(0, root.quit)
+
+            return False
+
+    window = app.MainWindow()
+    watcher = FirstPaint()
+    window.installEventFilter(watcher)
+    window.show()
+    root.exec()
+    print(json.dumps({"first_paint": watcher.painted}))
+
+
+def run_once() -> tuple[float, dict[str, float]]:
+    """Start the application once in a fresh interpreter.
+
+    Returns:
+        tuple[float, dict[str, float]]: The time to first paint in seconds, and the cumulative
+        import time of each top-level package in seconds.
+    """
+
+    environment: dict = {**os.environ, "STARTUP_BENCHMARK_T0": repr(time.time())}
+    environment.setdefault("QT_QPA_PLATFORM", "offscreen")
+    command: list[str] = [sys.executable, "-X", "importtime", "-m", "benchmarks.startup", "--probe"]
+    completed = subprocess.run(command, cwd=BASE_FOLDER, env=environment, capture_output=True, text=True, check=True)
+    first_paint: float = json.loads(completed.stdout.strip().splitlines()[-1])["first_paint"]
+    imports: dict[str, float] = defaultdict(float)
+
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+
+        if not name.startswith("  "):  # Top-level imports only, nested ones are included in their parent
+            imports[name.strip().split(".")[0]] += int(cumulative) / 1_000_000
+
+    return first_paint, dict(imports)
+
+
+def main(argv: list[str] | None = None) -> int:
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts measured")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="maximum median time to first paint")
+    parser.add_argument("--top", type=int, default=10, help="number of modules listed")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.probe:
+        probe()
+        return 0
+
+    paints: list[float] = []
+    imports: dict[str, list[float]] = defaultdict(list)
+
+    for _ in range(arguments.runs):
+        first_paint, run_imports = run_once()
+        paints.append(first_paint)
+
+        for name, seconds in run_imports.items():
+            imports[name].append(seconds)
+
+    median_paint: float = statistics.median(paints) * 1000
+    modules: list[tuple[str, float]] = sorted(
+        ((name, statistics.median(values) * 1000) for name, values in imports.items()),
+        key=lambda item: item[1],
+        reverse=True
+    )[:arguments.top]
+    within_budget: bool = median_paint <= arguments.budget_ms
+
+    if arguments.json:
+        print(json.dumps({
+            "first_paint_ms": {"median": median_paint, "min": min(paints) * 1000, "max": max(paints) * 1000},
+            "budget_ms": arguments.budget_ms,
+            "within_budget": within_budget,
+            "imports_ms": dict(modules)
+        }, indent=2))
+
+    else:
+        print(f"Time to first paint: {median_paint:.0f} ms median over {arguments.runs} runs "
+              f"(min {min(paints) * 1000:.0f} ms, max {max(paints) * 1000:.0f} ms, budget {arguments.budget_ms:.0f} ms)")
+        print("Import cost of the top-level modules (median, cumulative):")
+
+        for name, milliseconds in modules:
+            print(f"  {name:<24}{milliseconds:8.1f} ms")
+
+    return 0 if within_budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,458 @@
+"""
+Offline benchmark suite of the processing core. The pipeline stages (download, conversion,
+streaming, tagging, fingerprinting and waveforms) run on generated audio files of several lengths
+served by a local HTTP server, and album cover processing, public domain composer matching and link
+validation run on generated images and corpora. Nothing is sent to YouTube.
+
+    python -m benchmarks.suite [--only download convert ...] [--repeat 5] [--json]
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite --threshold 0.25
+
+Each case runs in a fresh interpreter, so its peak memory (resident set size, that of the ffmpeg
+children being reported apart) is its own. Latency percentiles are computed over the repetitions,
+after one warm-up run, and throughput is the amount of data processed per second at the median
+latency. When a baseline exists (see --save-baseline), the exit code is 1 if the median latency or
+the peak memory of a case exceeds its baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, NamedTuple
+
+from benchmarks import fixtures
+
+
+BASE_FOLDER: Path = Path(__file__).resolve().parent.parent
+BASELINE: Path = Path.joinpath(BASE_FOLDER, "benchmarks", "baseline.json")
+VIDEO_LINK: str = "https://www.youtube.com/watch?v=BenchmarkID"
+
+
+class Benchmark(NamedTuple):
+    """A prepared case: the function timed, and the amount of data it processes per call."""
+
+    run: Callable[[], object]
+    amount: float
+    unit: str
+
+
+def covers_bytes() -> bytes:
+    """The album cover embedded by the audio cases, prepared like a dropped image."""
+
+    from packages.logic import covers
+
+    return covers.process_cover(source=fixtures.image_fixture("small"))
+
+
+def make_pipeline(workdir: Path, url: str, source: Path, cover: bytes | None = None):
+    """Create a pipeline whose stream resolves to a local file instead of a YouTube video.
+
+    Args:
+        workdir (Path): The output directory of the pipeline.
+        url (str): The URL the stream is served at.
+        source (Path): The served file.
+        cover (bytes | None): The album cover of the job.
+
+    Returns:
+        Pipeline: The pipeline, ready to run any of its stages.
+    """
+
+    from packages.logic.jobs import Job
+    from packages.logic.pipeline import Pipeline
+
+    metadata: dict = {
+        "title": "Benchmark", "artist": "Suite", "album": "Fixtures", "year": "2024", "genre": "Noise",
+        "copyright": "", "disc_number": "1/1", "track_number": "1/1", "cover": cover
+    }
+    pipeline = Pipeline(job=Job(youtube_link=VIDEO_LINK, metadata=metadata), output_directory=workdir)
+    stream = SimpleNamespace(url=url, filesize=source.stat().st_size, audio_codec="mp4a.40.2", itag=140,
+                             default_filename=source.name)
+    pipeline.select_stream = lambda: stream
+    pipeline.audio_codec = stream.audio_codec
+    pipeline.duration = fixtures.AUDIO_LENGTHS[source.stem.split("-")[1]]
+    return pipeline
+
+
+def serve_fixture(stack: ExitStack, source: Path) -> str:
+    """Start the local server for the duration of the case, and get the URL of a fixture."""
+
+    from benchmarks.server import serve
+
+    return f"{stack.enter_context(serve(source.parent))}/{source.name}"
+
+
+def download_case(length: str, workdir: Path, stack: ExitStack) -> Benchmark:
+    """Pipeline.download_file: segmented download over several keep-alive connections."""
+
+    source: Path = fixtures.audio_fixture(length)
+    url: str = serve_fixture(stack, source)
+
+    def run():
+        pipeline = make_pipeline(workdir, url, source)
+        pipeline.download_file().unlink()
+
+    return Benchmark(run=run, amount=source.stat().st_size, unit="B")
+
+
+def stream_case(length: str, workdir: Path, stack: ExitStack) -> Benchmark:
+    """Pipeline.stream_file: download piped into the MP3 encoder, tags included (the default mode)."""
+
+    source: Path = fixtures.audio_fixture(length)
+    url: str = serve_fixture(stack, source)
+
+    cover: bytes = covers_bytes()
+
+    def run():
+        pipeline = make_pipeline(workdir, url, source, cover=cover)
+        pipeline.stream_file().unlink()
+
+    return Benchmark(run=run, amount=fixtures.AUDIO_LENGTHS[length], unit="s of audio")
+
+
+def convert_case(length: str, workdir: Path, stack: ExitStack) -> Benchmark:
+    """Pipeline.convert_file: MP3 encoding of a downloaded file, tags included."""
+
+    source: Path = fixtures.audio_fixture(length)
+
+    cover: bytes = covers_bytes()
+
+    def run():
+        pipeline = make_pipeline(workdir, "", source, cover=cover)
+        pipeline.convert_file(file=source).unlink()
+
+    return Benchmark(run=run, amount=fixtures.AUDIO_LENGTHS[length], unit="s of audio")
+
+
+def tag_case(length: str, workdir: Path, stack: ExitStack) -> Benchmark:
+    """Pipeline.tag_file: full rewrite of the tags of an MP3 file, as done for containers ffmpeg cannot tag."""
+
+    from packages.logic import encoding
+
+    source: Path = fixtures.audio_fixture(length)
+    target: Path = encoding.transcode(source=source, destination=Path.joinpath(workdir, "tagged.mp3"), quality="192k")
+    cover: bytes = covers_bytes()
+
+    def run():
+        pipeline = make_pipeline(workdir, "", source, cover=cover)
+        pipeline.tag_file(file=target)
+
+    return Benchmark(run=run, amount=target.stat().st_size, unit="B")
+
+
+def fingerprint_case(length: str, workdir: Path, stack: ExitStack) -> Benchmark:
+    """fingerprint_file and FingerprintIndex.match: duplicate detection of a downloaded file, decoding included."""
+
+    from packages.logic.fingerprints import FingerprintIndex, fingerprint_file
+
+    source: Path = fixtures.audio_fixture(length)
+    index = FingerprintIndex(path=Path.joinpath(workdir, "fingerprints.sqlite3"))
+    stack.callback(index.close)
+    index.add(source, fingerprint_file(source))
+    return Benchmark(run=lambda: index.match(fingerprint_file(source)), amount=fixtures.AUDIO_LENGTHS[length],
+                     unit="s of audio")
+
+
+def waveform_case(length: str, workdir: Path, stack: ExitStack) -> Benchmark:
+    """clips.waveform: peak levels of a downloaded file, as previewed to choose the cut points of a clip."""
+
+    from packages.logic import clips
+
+    source: Path = fixtures.audio_fixture(length)
+    return Benchmark(run=partial(clips.waveform, source), amount=fixtures.AUDIO_LENGTHS[length], unit="s of audio")
+
+
+def lookups_case(workdir: Path, stack: ExitStack) -> Benchmark:
+    """HttpClient.request: many small concurrent requests sharing the keep-alive connections of the network loop."""
+
+    import asyncio
+
+    from packages.logic import network
+
+    source: Path = fixtures.image_fixture("small")
+    url: str = serve_fixture(stack, source)
+    headers: dict = {**network.HEADERS, "Range": "bytes=0-4095"}
+    loop: network.NetworkLoop = network.shared()
+
+    async def lookups():
+        await asyncio.gather(*(loop.client.request("GET", url, headers) for _ in range(1000)))
+
+    return Benchmark(run=lambda: loop.run(lookups()), amount=1000, unit="requests")
+
+
+def cover_case(size: str, workdir: Path, stack: ExitStack) -> Benchmark:
+    """covers.render_cover: decoding, resizing and re-encoding of a dropped album cover."""
+
+    from packages.constants import constants
+    from packages.logic import covers
+
+    source: Path = fixtures.image_fixture(size)
+    width, height = fixtures.IMAGE_SIZES[size]
+    run = partial(covers.render_cover, source, constants.COVER_SIZE, constants.COVER_FORMAT)
+    return Benchmark(run=run, amount=width * height, unit="px")
+
+
+def composers_case(workdir: Path, stack: ExitStack) -> Benchmark:
+    """ComposerMatcher.find_all: public domain composer detection over a corpus of titles."""
+
+    from packages.constants import constants
+    from packages.logic.composers import ComposerMatcher
+
+    matcher = ComposerMatcher.load(source=constants.COMPOSERS)
+    corpus: list[str] = fixtures.titles(20_000)
+    return Benchmark(run=partial(matcher.find_all, corpus), amount=len(corpus), unit="titles")
+
+
+def composers_build_case(workdir: Path, stack: ExitStack) -> Benchmark:
+    """ComposerMatcher.load without a cache: building the automaton from the list of composers."""
+
+    from packages.constants import constants
+    from packages.logic.composers import ComposerMatcher
+
+    return Benchmark(run=partial(ComposerMatcher.load, source=constants.COMPOSERS), amount=1, unit="builds")
+
+
+def check_link_case(workdir: Path, stack: ExitStack) -> Benchmark:
+    """toolkit.check_link over a corpus of pasted links, valid or not."""
+
+    from packages.logic import toolkit
+
+    corpus: list[str] = fixtures.links(100_000)
+    return Benchmark(run=lambda: [toolkit.check_link(text=link) for link in corpus], amount=len(corpus), unit="links")
+
+
+def import_links_case(workdir: Path, stack: ExitStack) -> Benchmark:
+    """links.import_lines over a corpus of pasted links, valid or not, with duplicates."""
+
+    from packages.logic import links
+
+    corpus: list[str] = fixtures.links(100_000)
+    return Benchmark(run=partial(links.import_lines, corpus), amount=len(corpus), unit="links")
+
+
+CASES: dict[str, tuple[Callable, Callable]] = {
+    **{f"download-{length}": (partial(download_case, length), partial(fixtures.audio_fixture, length))
+       for length in fixtures.AUDIO_LENGTHS},
+    **{f"convert-{length}": (partial(convert_case, length), partial(fixtures.audio_fixture, length))
+       for length in fixtures.AUDIO_LENGTHS},
+    **{f"stream-{length}": (partial(stream_case, length), partial(fixtures.audio_fixture, length))
+       for length in fixtures.AUDIO_LENGTHS},
+    **{f"tag-{length}": (partial(tag_case, length), partial(fixtures.audio_fixture, length))
+       for length in fixtures.AUDIO_LENGTHS},
+    **{f"fingerprint-{length}": (partial(fingerprint_case, length), partial(fixtures.audio_fixture, length))
+       for length in fixtures.AUDIO_LENGTHS},
+    **{f"waveform-{length}": (partial(waveform_case, length), partial(fixtures.audio_fixture, length))
+       for length in fixtures.AUDIO_LENGTHS},
+    "lookups": (lookups_case, partial(fixtures.image_fixture, "small")),
+    **{f"cover-{size}": (partial(cover_case, size), partial(fixtures.image_fixture, size))
+       for size in fixtures.IMAGE_SIZES},
+    "composers-match": (composers_case, lambda: None),
+    "composers-build": (composers_build_case, lambda: None),
+    "check-link": (check_link_case, lambda: None),
+    "import-links": (import_links_case, lambda: None)
+}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Get a percentile of a list of values, interpolating between the closest ranks.
+
+    Args:
+        values (list[float]): The values, in any order.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The value below which the given fraction of the values lie.
+    """
+
+    ordered: list[float] = sorted(values)
+    position: float = (len(ordered) - 1) * fraction
+    lower: int = int(position)
+    upper: int = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss() -> tuple[int | None, int | None]:
+    """Get the peak resident set size of this process and of its finished children, in bytes.
+
+    On Linux, the peak of this process is read from /proc, because ru_maxrss survives exec
+    and would report the memory of the parent at the time it started the benchmark.
+    """
+
+    try:
+        import resource
+
+    except ImportError:  # Windows
+        return None, None
+
+    scale: int = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is in kilobytes on Linux
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as status:
+            peak = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmHWM:"))
+
+    except (OSError, StopIteration):
+        pass
+
+    return peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+
+
+def probe(name: str, repeat: int) -> None:
+    """Runs in the measured interpreter: prepares a case, times it and prints the results as JSON."""
+
+    factory, _ = CASES[name]
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as folder, ExitStack() as stack:
+        benchmark: Benchmark = factory(Path(folder), stack)
+        benchmark.run()  # Warm-up: caches, imports, first connections
+        latencies: list[float] = []
+
+        for _ in range(repeat):
+            started: float = time.perf_counter()
+            benchmark.run()
+            latencies.append(time.perf_counter() - started)
+
+    peak, children = peak_rss()
+    print(json.dumps({"latencies": latencies, "amount": benchmark.amount, "unit": benchmark.unit,
+                      "peak_rss": peak, "peak_rss_children": children}))
+
+
+def run_case(name: str, repeat: int) -> dict:
+    """Run a case in a fresh interpreter.
+
+    Args:
+        name (str): A key of CASES.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        dict: The summary of the case: latency percentiles in milliseconds, throughput and peak memory.
+    """
+
+    command: list[str] = [sys.executable, "-m", "benchmarks.suite", "--probe", name, "--repeat", str(repeat)]
+    completed = subprocess.run(command, cwd=BASE_FOLDER, capture_output=True, text=True)
+
+    if completed.returncode != 0:
+        return {"error": (completed.stderr.strip().splitlines() or ["failed"])[-1]}
+
+    raw: dict = json.loads(completed.stdout.strip().splitlines()[-1])
+    latencies: list[float] = raw["latencies"]
+    median: float = percentile(latencies, 0.5)
+    return {
+        "p50_ms": median * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput": raw["amount"] / median if median > 0 else 0.0,
+        "unit": f"{raw['unit']}/s",
+        "peak_rss": raw["peak_rss"],
+        "peak_rss_children": raw["peak_rss_children"]
+    }
+
+
+def regressions(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """Compare results with a baseline.
+
+    Args:
+        results (dict[str, dict]): The summaries of the cases that were run.
+        baseline (dict[str, dict]): The summaries recorded by a previous run.
+        threshold (float): The tolerated relative increase, e.g. 0.2 for 20%.
+
+    Returns:
+        list[str]: A description of every regression, empty if there is none.
+    """
+
+    found: list[str] = []
+
+    for name, result in results.items():
+        reference: dict | None = baseline.get(name)
+
+        if reference is None or "error" in result or "error" in reference:
+            continue
+
+        for key in ("p50_ms", "peak_rss"):
+            if result.get(key) and reference.get(key) and result[key] > reference[key] * (1 + threshold):
+                found.append(f"{name}: {key} went from {reference[key]:.0f} to {result[key]:.0f} "
+                             f"(+{(result[key] / reference[key] - 1) * 100:.0f}%)")
+
+    return found
+
+
+def format_amount(value: float) -> str:
+    """Format a throughput with a decimal prefix, e.g. 12.3M."""
+
+    for prefix in ("", "k", "M", "G"):
+        if value < 1000:
+            return f"{value:.1f}{prefix}"
+        value /= 1000
+
+    return f"{value:.1f}T"
+
+
+def main(argv: list[str] | None = None) -> int:
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="run the cases starting with these prefixes")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs of each case")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerated relative regression")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--probe", metavar="CASE", help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.probe:
+        probe(arguments.probe, arguments.repeat)
+        return 0
+
+    names: list[str] = [
+        name for name in CASES
+        if not arguments.only or any(name.startswith(prefix) for prefix in arguments.only)
+    ]
+    results: dict[str, dict] = {}
+
+    for name in names:
+        CASES[name][1]()  # Fixtures are generated here, so their cost is not measured
+        results[name] = run_case(name, arguments.repeat)
+
+        if not arguments.json:
+            result: dict = results[name]
+
+            if "error" in result:
+                print(f"{name:<18} failed: {result['error']}")
+                continue
+
+            memory: str = f"{result['peak_rss'] / 2 ** 20:6.0f} MiB" if result["peak_rss"] else "       ?"
+            print(f"{name:<18} p50 {result['p50_ms']:9.1f} ms  p90 {result['p90_ms']:9.1f} ms  "
+                  f"p99 {result['p99_ms']:9.1f} ms  {format_amount(result['throughput']):>8} {result['unit']:<14} "
+                  f"peak {memory}", flush=True)
+
+    baseline: dict[str, dict] = {}
+
+    if arguments.baseline.is_file():
+        baseline = json.loads(arguments.baseline.read_text(encoding="UTF-8"))
+
+    found: list[str] = regressions(results, baseline, arguments.threshold)
+
+    if arguments.json:
+        print(json.dumps({"results": results, "threshold": arguments.threshold, "regressions": found}, indent=2))
+
+    else:
+        for regression in found:
+            print(f"Regression: {regression}")
+
+    if arguments.save_baseline:
+        temporary: Path = arguments.baseline.with_name(arguments.baseline.name + ".tmp")
+        temporary.write_text(json.dumps({**baseline, **results}, indent=2), encoding="UTF-8")
+        os.replace(temporary, arguments.baseline)
+
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
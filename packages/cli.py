@@ -0,0 +1,491 @@
+"""
+Command line interface, for running the processing pipeline on machines without a display.
+
+    python -m packages.cli URL [URL ...] [--artist NAME] [--quality 320k] [--jobs 4]
+    python -m packages.cli URL [URL ...] --quality 320k,192k,128k
+    python -m packages.cli URL --start 1:02:30 --end 1:15:00
+    python -m packages.cli --waveform URL [--points 200]
+    python -m packages.cli "https://www.youtube.com/playlist?list=..." [--concurrency 32]
+    python -m packages.cli --input links.jsonl
+    cat links.jsonl | python -m packages.cli --input -
+    python -m packages.cli --retag manifest.csv [--jobs 8]
+    python -m packages.cli --rebuild-archive [--output DIR]
+    python -m packages.cli --index-library [--output DIR]
+    python -m packages.cli --resume
+
+Each line of an input file is either a bare link or a JSON object holding a "url" and any of
+the tags below ("title", "artist", ..., "cover" being the path to an image), plus optionally
+"quality", "streaming", "normalize", "start" and "end". Command line tags and options act as
+defaults for every job. One JSON object is printed per job as soon as it finishes. Heavy modules
+are only imported once the arguments are known to be valid, so asking for help is instant.
+
+Several comma-separated qualities produce one file each, in a folder named after the quality,
+from a single download and decoding of the audio.
+
+With --start and --end, only the audio between these times is kept, and only the part of the stream
+holding it is downloaded (see packages.logic.clips). A link with a start time ("t=90") starts there.
+--waveform prints the peak level of the audio over time, to choose these times from.
+
+Playlist and channel links are expanded into one job per video, submitted as soon as the video
+is resolved. Each job is titled after its video and numbered after its position in the playlist,
+and the album defaults to the title of the playlist.
+
+Videos already downloaded in the requested quality are skipped without any network access,
+unless --no-archive is given (see packages.logic.archive). With --rebuild-archive, the index of
+the downloaded videos is brought in line with the files of the output directory.
+
+The audio of every job is fingerprinted and looked up in the library (see packages.logic.fingerprints):
+other uploads of a track already downloaded are reported in the "duplicate" field of their result,
+or not processed at all with --duplicates skip. With --index-library, the files of the output
+directory are fingerprinted, on every core, so that the library includes what was downloaded before.
+
+With --resume, every job is written down in a journal until it ends (see packages.logic.journal),
+and the jobs an interrupted --resume run or a session of the application left unfinished are
+processed as well, each one from the last stage it completed whose files are still intact.
+
+With --profile, or when the YOUTUBE_MP3_PROFILE environment variable is set, every stage of every
+job is profiled, and the results are written to a folder printed on standard error once the jobs
+are done (see packages.logic.profiling).
+
+With --retag, nothing is downloaded: the existing files listed in a CSV or JSON manifest
+(see packages.logic.retag) are re-tagged in bulk, and one JSON object is printed per file.
+"""
+
+import argparse
+import json
+import sys
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from packages.logic.pipeline import Pipeline
+
+
+TAGS: list[str] = [
+    "title",
+    "artist",
+    "album",
+    "year",
+    "genre",
+    "copyright",
+    "disc_number",
+    "track_number"
+]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the parser of the command line arguments."""
+
+    parser = argparse.ArgumentParser(
+        prog="python -m packages.cli",
+        description="Download and tag MP3 files from YouTube."
+    )
+    parser.add_argument("urls", nargs="*", metavar="URL", help="YouTube links to process")
+    parser.add_argument("-i", "--input", metavar="FILE", help="file of links or JSON lines, '-' for standard input")
+    parser.add_argument("-q", "--quality", default="192k",
+                        help="MP3 bitrate (128k, 192k, 320k) or 'original', several separated by commas")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="number of jobs processed at the same time")
+    parser.add_argument("--concurrency", type=int, default=32, help="number of playlist videos resolved at once")
+    parser.add_argument("-o", "--output", metavar="DIR", help="output directory (default: ~/Downloads)")
+    parser.add_argument("--no-streaming", action="store_true", help="download each file before converting it")
+    parser.add_argument("--normalize", action="store_true", help="level the loudness and trim the silences")
+    parser.add_argument("--start", metavar="TIME", help="keep the audio from this time on, e.g. 90, 1:30 or 1m30s "
+                                                        "(default: the start time of the link)")
+    parser.add_argument("--end", metavar="TIME", help="keep the audio up to this time (default: the end)")
+    parser.add_argument("--waveform", metavar="URL", help="print the waveform of a video, to choose --start and --end")
+    parser.add_argument("--points", type=int, default=0, help="number of points of the waveform (default: 1000)")
+    parser.add_argument("--cover", metavar="IMAGE", help="album cover embedded in every file")
+    parser.add_argument("--metrics", metavar="FILE", help="append the timing of every stage to a JSON lines file")
+    parser.add_argument("--retag", metavar="MANIFEST", help="re-tag the existing files listed in a CSV or JSON manifest")
+    parser.add_argument("--no-archive", action="store_true", help="process videos even if they were already downloaded")
+    parser.add_argument("--rebuild-archive", action="store_true", help="index the files of the output directory")
+    parser.add_argument("--duplicates", choices=("flag", "skip", "ignore"), default="flag",
+                        help="what to do with other uploads of tracks already in the library (default: flag)")
+    parser.add_argument("--index-library", action="store_true", help="fingerprint the files of the output directory")
+    parser.add_argument("--resume", action="store_true", help="journal the jobs, and finish those interrupted in earlier runs")
+    parser.add_argument("--profile", action="store_true", help="write CPU and memory profiles of every stage")
+
+    for tag in TAGS:
+        parser.add_argument(f"--{tag.replace('_', '-')}", dest=tag, metavar="TEXT", help=f"{tag.replace('_', ' ')} tag")
+
+    return parser
+
+
+def read_requests(lines: Iterable[str]) -> Iterator[dict]:
+    """Parse input lines into job requests, skipping blank lines.
+
+    Args:
+        lines (Iterable[str]): Bare links or JSON objects, one per line.
+
+    Yields:
+        dict: The request, holding at least a "url" key (None when the line is unusable).
+    """
+
+    for line in lines:
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if not line.startswith("{"):
+            yield {"url": line}
+            continue
+
+        try:
+            request = json.loads(line)
+
+        except ValueError:
+            yield {"url": None, "error": "The line is not valid JSON."}
+            continue
+
+        yield request if isinstance(request, dict) else {"url": None, "error": "The line is not a JSON object."}
+
+
+def collect_requests(arguments: argparse.Namespace) -> Iterator[dict]:
+    """Gather the requests given as arguments and in the input file.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Yields:
+        dict: The next request.
+    """
+
+    yield from ({"url": url} for url in arguments.urls)
+
+    if arguments.input == "-":
+        yield from read_requests(sys.stdin)
+
+    elif arguments.input and arguments.input.lower().endswith(".csv"):
+        from pathlib import Path
+
+        from packages.logic import links
+
+        result: links.LinkImport = links.import_file(Path(arguments.input))
+        yield from ({"url": link.url} for link in result.links)
+        yield from ({"url": text, "error": f"Line {number}: {reason}"} for number, text, reason in result.rejected)
+
+    elif arguments.input:
+        with open(arguments.input, "r", encoding="UTF-8") as file:
+            yield from read_requests(file)
+
+
+def print_result(result: dict) -> None:
+    """Print the outcome of a job as a single JSON line."""
+
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
+def job_result(pipeline: "Pipeline") -> dict:
+    """Get the outcome of a job that has ended.
+
+    Args:
+        pipeline (Pipeline): The object that processed the job.
+
+    Returns:
+        dict: The result printed for the job.
+    """
+
+    return {
+        "job_id": pipeline.job.job_id,
+        "url": pipeline.job.youtube_link,
+        "status": pipeline.status.value,
+        "skipped": pipeline.skipped,
+        "output": str(pipeline.output_file) if pipeline.output_file else None,
+        "outputs": {quality: str(path) for quality, path in pipeline.outputs.items()},
+        "duplicate": str(pipeline.duplicate.path) if pipeline.duplicate else None,
+        "error": pipeline.error,
+        "seconds": {metrics.stage: round(metrics.seconds, 3) for metrics in pipeline.metrics}
+    }
+
+
+def rejection(url: str | None, error: str) -> dict:
+    """Get the outcome of a request that could not become a job."""
+
+    return {"job_id": None, "url": url, "status": "rejected", "output": None, "error": error}
+
+
+def run_retag(arguments: argparse.Namespace) -> int:
+    """Re-tag the files of a manifest, printing the outcome of each one.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code, 0 if every file was re-tagged or already up to date, 1 otherwise.
+    """
+
+    from pathlib import Path
+
+    from packages.logic import retag
+
+    try:
+        entries: list = list(retag.read_manifest(Path(arguments.retag)))
+
+    except (OSError, ValueError, TypeError, AttributeError) as error:
+        print(f"The manifest could not be read: {error}", file=sys.stderr)
+        return 2
+
+    failures: int = 0
+
+    for result in retag.retag(entries, workers=arguments.jobs):
+        failures += result["status"] == "failed"
+        print_result(result)
+
+    return 1 if failures else 0
+
+
+def run_rebuild_archive(arguments: argparse.Namespace) -> int:
+    """Drop the archived files that no longer exist, then index those of the output directory.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code, always 0.
+    """
+
+    from pathlib import Path
+
+    from packages.constants import constants
+    from packages.logic.archive import Archive
+
+    output: Path = Path(arguments.output).expanduser() if arguments.output else constants.OUTPUT_FOLDER
+    archive = Archive()
+    print_result({"folder": str(output), **archive.rebuild(output), **archive.stats()})
+    archive.close()
+    return 0
+
+
+def run_index_library(arguments: argparse.Namespace) -> int:
+    """Fingerprint the files of the output directory that are new or changed, on a process per core.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code, always 0.
+    """
+
+    from pathlib import Path
+
+    from packages.constants import constants
+    from packages.logic.fingerprints import FingerprintIndex
+
+    output: Path = Path(arguments.output).expanduser() if arguments.output else constants.OUTPUT_FOLDER
+    index = FingerprintIndex()
+    print_result({"folder": str(output), **index.scan(output), **index.stats()})
+    index.close()
+    return 0
+
+
+def run_waveform(arguments: argparse.Namespace) -> int:
+    """Print the peak level of the audio of a video over time, computed once and cached.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code, 0 if the waveform was printed, 1 otherwise.
+    """
+
+    from packages.constants import constants
+    from packages.logic import clips, links
+
+    try:
+        url: str = links.parse_link(arguments.waveform).url
+        waveform: clips.Waveform = clips.preview(url)
+
+    except Exception as error:
+        print_result(rejection(arguments.waveform, str(error)))
+        return 1
+
+    points: int = arguments.points or constants.WAVEFORM_POINTS
+    peaks: list[float] = [round(float(peak), 3) for peak in waveform.downsample(points)]
+    print_result({
+        "url": url,
+        "duration": round(waveform.duration, 2),
+        "seconds_per_point": round(waveform.duration / len(peaks), 3) if peaks else 0.0,
+        "peaks": peaks
+    })
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the command line interface.
+
+    Args:
+        argv (list[str] | None): The arguments, sys.argv[1:] if None.
+
+    Returns:
+        int: The exit code, 0 if every job succeeded, 1 otherwise.
+    """
+
+    parser = build_parser()
+    arguments = parser.parse_args(argv)
+
+    if arguments.retag:
+        return run_retag(arguments)
+
+    if arguments.rebuild_archive:
+        return run_rebuild_archive(arguments)
+
+    if arguments.index_library:
+        return run_index_library(arguments)
+
+    from packages.logic import network
+
+    network.install_pytube()  # Playlists, age gates and file sizes are then requested through the shared loop
+
+    if arguments.waveform:
+        return run_waveform(arguments)
+
+    if not arguments.urls and not arguments.input and not arguments.resume:
+        parser.error("no link given, pass URLs, --input or --resume")
+
+    from pathlib import Path
+    from queue import SimpleQueue
+
+    from packages.constants import constants
+    from packages.logic import links, playlists, profiling, toolkit
+    from packages.logic.archive import Archive
+    from packages.logic.fingerprints import FingerprintIndex
+    from packages.logic.jobs import Job, JobStatus
+    from packages.logic.journal import Journal
+    from packages.logic.metrics import MetricsLog
+    from packages.logic.pipeline import JobRunner, Pipeline
+
+    if arguments.profile:
+        profiling.enable()
+
+    output: Path = Path(arguments.output).expanduser() if arguments.output else constants.OUTPUT_FOLDER
+    metrics_log: MetricsLog | None = MetricsLog(path=Path(arguments.metrics)) if arguments.metrics else None
+    runner = JobRunner(io_workers=arguments.jobs, cpu_workers=min(arguments.jobs, constants.CPU_WORKERS),
+                       output_directory=output, metrics_log=metrics_log,
+                       archive=None if arguments.no_archive else Archive(),
+                       journal=Journal() if arguments.resume else None,
+                       fingerprints=None if arguments.duplicates == "ignore" else FingerprintIndex())
+    finished: SimpleQueue = SimpleQueue()
+    runner.job_finished.connect(finished.put)
+    covers: dict[str, bytes] = {}
+    seen: set[tuple] = set()  # Videos and clips already submitted, each one being processed once per run
+    submitted: int = len(runner.resume()) if arguments.resume else 0
+    reported: int = 0
+    failures: int = 0
+
+    def report(wait: bool) -> None:
+        """Print the results of the jobs that have finished, waiting for the remaining ones if asked to."""
+
+        nonlocal reported, failures
+
+        while reported < submitted and (wait or not finished.empty()):
+            pipeline: Pipeline = finished.get()
+            reported += 1
+            failures += pipeline.status != JobStatus.DONE
+            print_result(job_result(pipeline))
+
+    for request in collect_requests(arguments):
+        report(wait=False)
+        url: str | None = request.get("url")
+        tags: dict = {tag: str(request.get(tag) or getattr(arguments, tag) or "") for tag in TAGS}
+        numbers: list[str] = [tags["year"], *tags["disc_number"].split("/"), *tags["track_number"].split("/")]
+        error: str | None = request.get("error")
+        collection: bool = bool(url) and playlists.is_collection(url)
+        clip: list[str] = [str(request.get(key) or getattr(arguments, key) or "") for key in ("start", "end")]
+        start: float = 0.0
+        end: float | None = None
+
+        try:
+            start, end = links.parse_clock(clip[0]) if clip[0] else 0.0, links.parse_clock(clip[1]) if clip[1] else None
+
+        except ValueError as clip_error:
+            error = error or str(clip_error)
+
+        if error is None and not url:
+            error = "The provided link is not a valid YouTube link."
+
+        elif error is None and not collection:
+            link: links.Link | str = links.read_link(url.strip())
+
+            if isinstance(link, str):
+                error = link
+
+            elif (link.video_id, start or link.start, end) in seen:
+                error = "Duplicate of an earlier link."
+
+            else:
+                seen.add((link.video_id, start or link.start, end))
+                start, url = start or link.start, link.url
+
+        if error is None and end is not None and end <= start:
+            error = "The clip ends before it starts."
+
+        if error is None and not toolkit.check_data(strings=numbers):
+            error = "One or more tags are non-numeric."
+
+        cover_path: str | None = request.get("cover") or arguments.cover
+
+        if error is None and cover_path and cover_path not in covers:
+            from packages.logic.covers import process_cover
+
+            try:
+                covers[cover_path] = process_cover(source=cover_path)
+
+            except (OSError, ValueError) as cover_error:
+                error = f"The album cover could not be read: {cover_error}"
+
+        if error is not None:
+            failures += 1
+            print_result(rejection(url, error))
+            continue
+
+        tags["cover"] = covers.get(cover_path) if cover_path else None
+        quality, *variants = (request.get("quality") or arguments.quality).split(",")
+        options: dict = {
+            "quality": quality,
+            "variants": tuple(variants),
+            "streaming": bool(request.get("streaming", not arguments.no_streaming)),
+            "normalize": bool(request.get("normalize", arguments.normalize)),
+            "skip_duplicates": arguments.duplicates == "skip",
+            "start": start,
+            "end": end
+        }
+
+        if not collection:
+            runner.submit(Job(youtube_link=url, metadata=tags, **options))
+            submitted += 1
+            continue
+
+        try:
+            for entry in playlists.expand(url, concurrency=arguments.concurrency):
+                report(wait=False)
+
+                if entry.error is not None:
+                    failures += 1
+                    print_result(rejection(entry.url, entry.error))
+                    continue
+
+                metadata: dict = playlists.entry_metadata(entry, tags)
+                runner.submit(Job(youtube_link=entry.url, metadata=metadata, **options))
+                submitted += 1
+
+        except Exception as playlist_error:
+            failures += 1
+            print_result(rejection(url, f"The playlist could not be read entirely: {playlist_error}"))
+
+    try:
+        report(wait=True)
+
+    finally:  # On Ctrl+C, the running stages complete and the queued ones are left to --resume
+        runner.shutdown(wait=True)
+
+        if runner.journal is not None:
+            runner.journal.close()
+
+    if profiling.profiler is not None:
+        print(f"Profiles written to {profiling.profiler.folder}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
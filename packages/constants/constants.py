@@ -4,6 +4,7 @@ These constants can be imported and used throughout the project to maintain
 consistency and ease of updates.
 """
 
+import os
 from typing import final
 from pathlib import Path
 
@@ -12,6 +13,69 @@ BASE_FOLDER: final(Path) = Path(__file__).resolve().parent.parent.parent
 RESOURCES_FOLDER: final(Path) = Path.joinpath(BASE_FOLDER, "resources")
 COMPOSERS: final(Path) = Path.joinpath(RESOURCES_FOLDER, "Public Domain Composers.txt")
 IMAGES_FOLDER: final(Path) = Path.joinpath(RESOURCES_FOLDER, "images")
-IMAGES: final(dict) = {image_path.stem: str(image_path) for image_path in IMAGES_FOLDER.iterdir()}
 STYLE_FOLDER: final(Path) = Path.joinpath(RESOURCES_FOLDER, "style")
 STYLE: final(Path) = Path.joinpath(STYLE_FOLDER, "style.qss")
+OUTPUT_FOLDER: final(Path) = Path.home() / "Downloads"
+IO_WORKERS: final(int) = 8
+CPU_WORKERS: final(int) = os.cpu_count() or 1
+FFMPEG: final(str) = "ffmpeg"
+STREAM_CHUNK_SIZE: final(int) = 64 * 1024
+STREAM_RANGE_SIZE: final(int) = 9 * 1024 * 1024
+ORIGINAL_QUALITY: final(str) = "original"
+CACHE_FOLDER: final(Path) = Path.home() / ".cache" / "youtube-mp3-downloader"
+COMPOSERS_INDEX: final(Path) = Path.joinpath(CACHE_FOLDER, "composers.idx")
+VIDEO_CACHE_SIZE: final(int) = 128
+VIDEO_CACHE_TTL: final(float) = 30 * 60
+LEGAL_CHECK_DELAY: final(int) = 400
+METADATA_CACHE: final(Path) = Path.joinpath(CACHE_FOLDER, "metadata.sqlite3")
+METADATA_CACHE_SIZE: final(int) = 10_000
+METADATA_CACHE_TTL: final(float) = 7 * 24 * 60 * 60
+COVERS_FOLDER: final(Path) = Path.joinpath(CACHE_FOLDER, "covers")
+COVER_SIZE: final(tuple) = (200, 200)
+COVER_FORMAT: final(str) = "PNG"
+DOWNLOAD_CONNECTIONS: final(int) = 4
+DOWNLOAD_SEGMENT_SIZE: final(int) = 4 * 1024 * 1024
+DOWNLOAD_RETRIES: final(int) = 3
+ID3_PADDING: final(int) = 16 * 1024
+METRICS_LOG: final(Path) = Path.joinpath(CACHE_FOLDER, "metrics.jsonl")
+METRICS_LOG_SIZE: final(int) = 4 * 1024 * 1024
+PROGRESS_RATE: final(int) = 30
+RESOLVE_CONCURRENCY: final(int) = 32
+ARCHIVE: final(Path) = Path.joinpath(CACHE_FOLDER, "archive.sqlite3")
+PCM_RATE: final(int) = 48000
+PCM_BLOCK_FRAMES: final(int) = 48000
+LOUDNESS_TARGET: final(float) = -14.0
+REPLAYGAIN_REFERENCE: final(float) = -18.0
+PEAK_CEILING: final(float) = -1.0
+SILENCE_THRESHOLD: final(float) = -60.0
+HTTP_HOST_CONNECTIONS: final(int) = 8
+HTTP_TIMEOUT: final(float) = 30.0
+HTTP_RETRIES: final(int) = 3
+HTTP_BACKOFF: final(float) = 0.5
+HTTP_KEEPALIVE: final(float) = 60.0
+JOURNAL: final(Path) = Path.joinpath(CACHE_FOLDER, "journal.sqlite3")
+JOURNAL_HEARTBEAT: final(float) = 30.0
+PROFILE_VARIABLE: final(str) = "YOUTUBE_MP3_PROFILE"
+PROFILE_FOLDER: final(Path) = Path.joinpath(CACHE_FOLDER, "profiles")
+PROFILE_INTERVAL: final(float) = 0.005
+PROFILE_TOP_ALLOCATIONS: final(int) = 20
+FINGERPRINTS: final(Path) = Path.joinpath(CACHE_FOLDER, "fingerprints.sqlite3")
+FINGERPRINT_RATE: final(int) = 8000
+FINGERPRINT_MIN_MATCHES: final(int) = 20
+FINGERPRINT_THRESHOLD: final(float) = 0.03
+CLIP_INDEX_SIZE: final(int) = 256 * 1024
+WAVEFORMS_FOLDER: final(Path) = Path.joinpath(CACHE_FOLDER, "waveforms")
+WAVEFORM_RATE: final(int) = 8000
+WAVEFORM_RESOLUTION: final(int) = 20
+WAVEFORM_POINTS: final(int) = 1000
+
+
+def __getattr__(name: str):
+    """Computes IMAGES the first time it is accessed, so importing this module does not scan the disk."""
+
+    if name == "IMAGES":
+        images: dict = {image_path.stem: str(image_path) for image_path in IMAGES_FOLDER.glob("*.png")}
+        globals()["IMAGES"] = images
+        return images
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
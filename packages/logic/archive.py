@@ -0,0 +1,246 @@
+"""
+This module provides the Archive class, a persistent SQLite index of the files already produced,
+keyed by video ID and quality. A job whose video was already downloaded in the requested quality
+is recognised by a single primary key lookup and one stat call, before anything is asked of YouTube.
+
+Every file records the link of its video in its comment tag, so the index can be rebuilt at any
+time by scanning an output folder, and entries whose file has been deleted are dropped as soon as
+they are looked up, or all at once by Archive.reconcile.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import NamedTuple
+
+import mutagen
+
+from packages.constants import constants
+from packages.logic import toolkit
+
+
+COMMENT_KEYS: dict = {".mp3": "TXXX:comment", ".m4a": "\xa9cmt", ".opus": "description"}  # Where ffmpeg writes it
+CLIP_MARKER: str = " clip="  # Follows the link in the comment of clips, with their start and end times
+
+
+class ArchiveEntry(NamedTuple):
+    """A file produced for a video, in a given quality."""
+
+    video_id: str
+    quality: str
+    path: Path
+    size: int
+    digest: str
+
+
+def read_source(path: Path) -> tuple[str, str] | None:
+    """Get the video and quality a file was produced from, as written in its tags.
+
+    Args:
+        path (Path): The path to an MP3, m4a or opus file.
+
+    Returns:
+        tuple[str, str] | None: The video ID and the quality, or None if the file is not one of ours
+            or holds only part of the video.
+    """
+
+    try:
+        audio = mutagen.File(path)
+
+    except (mutagen.MutagenError, OSError):
+        return None
+
+    if audio is None or audio.tags is None:
+        return None
+
+    suffix: str = path.suffix.lower()
+    value = audio.tags.get(COMMENT_KEYS[suffix])
+    comment: str = str(value[0] if isinstance(value, list) else value) if value else ""
+    identifier: str | None = toolkit.video_id(comment)
+
+    if identifier is None or CLIP_MARKER in comment:
+        return None
+
+    if suffix != ".mp3":
+        return identifier, constants.ORIGINAL_QUALITY
+
+    return identifier, f"{round(audio.info.bitrate / 1000)}k"  # CBR, e.g. 191996 bits per second for "192k"
+
+
+class Archive:
+    """
+    Persistent index of the files produced, keyed by (video ID, quality).
+
+    Along with its path, the size, modification time and SHA-256 hash of each file are recorded,
+    so that reconcile can tell the files that were edited since (re-tagged, for instance) from
+    the ones that are unchanged without hashing them again.
+    """
+
+    def __init__(self, path: Path | str = constants.ARCHIVE):
+
+        if isinstance(path, Path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS archive ("
+            "video_id TEXT, quality TEXT, path TEXT, size INTEGER, mtime INTEGER, digest TEXT, stored REAL, "
+            "PRIMARY KEY (video_id, quality)) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def lookup(self, video_id: str, quality: str) -> ArchiveEntry | None:
+        """Get the file already produced for a video, if it still exists.
+        The entry is dropped if its file has been deleted or moved.
+
+        Args:
+            video_id (str): The ID of the video.
+            quality (str): The quality of the job, e.g. "192k" or constants.ORIGINAL_QUALITY.
+
+        Returns:
+            ArchiveEntry | None: The file, or None if the video has to be processed.
+        """
+
+        with self.lock:
+            row: tuple | None = self.connection.execute(
+                "SELECT path, size, digest FROM archive WHERE video_id = ? AND quality = ?", (video_id, quality)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        if not os.path.isfile(row[0]):
+            self.forget(video_id, quality)
+            return None
+
+        return ArchiveEntry(video_id=video_id, quality=quality, path=Path(row[0]), size=row[1], digest=row[2])
+
+    def record(self, video_id: str, quality: str, path: Path) -> ArchiveEntry:
+        """Add a file to the index, replacing the previous file of the same video and quality.
+
+        Args:
+            video_id (str): The ID of the video.
+            quality (str): The quality the file was produced in.
+            path (Path): The path to the file.
+
+        Returns:
+            ArchiveEntry: The new entry.
+        """
+
+        path = path.absolute()
+        stat: os.stat_result = path.stat()
+        digest: str = toolkit.file_digest(path)
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, quality, str(path), stat.st_size, stat.st_mtime_ns, digest, time())
+            )
+            self.connection.commit()
+
+        return ArchiveEntry(video_id=video_id, quality=quality, path=path, size=stat.st_size, digest=digest)
+
+    def forget(self, video_id: str, quality: str) -> None:
+        """Remove the entry of a video in a given quality, if any."""
+
+        with self.lock:
+            self.connection.execute("DELETE FROM archive WHERE video_id = ? AND quality = ?", (video_id, quality))
+            self.connection.commit()
+
+    def reconcile(self) -> dict:
+        """Bring the index in line with the disk: entries whose file is missing are dropped, and those
+        whose file changed since it was recorded (same size and modification time otherwise) are updated.
+
+        Returns:
+            dict: The number of entries "removed" and "updated".
+        """
+
+        with self.lock:
+            rows: list[tuple] = self.connection.execute(
+                "SELECT video_id, quality, path, size, mtime FROM archive"
+            ).fetchall()
+
+        removed, updated = 0, 0
+
+        for video_id, quality, path, size, mtime in rows:
+            try:
+                stat: os.stat_result = os.stat(path)
+
+            except FileNotFoundError:
+                self.forget(video_id, quality)
+                removed += 1
+                continue
+
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self.record(video_id, quality, Path(path))
+                updated += 1
+
+        return {"removed": removed, "updated": updated}
+
+    def scan(self, folder: Path) -> int:
+        """Index the audio files of a folder and its subfolders, from the video link in their tags.
+        Hidden files, such as the partial outputs of running jobs, are ignored.
+
+        Args:
+            folder (Path): The folder to scan, usually the output folder.
+
+        Returns:
+            int: The number of files indexed.
+        """
+
+        with self.lock:
+            known: dict[str, tuple] = {
+                path: (size, mtime) for path, size, mtime in self.connection.execute(
+                    "SELECT path, size, mtime FROM archive"
+                )
+            }
+
+        count: int = 0
+
+        for path in folder.absolute().rglob("*"):
+            if path.suffix.lower() not in COMMENT_KEYS or path.name.startswith(".") or not path.is_file():
+                continue
+
+            stat: os.stat_result = path.stat()
+
+            if known.get(str(path)) == (stat.st_size, stat.st_mtime_ns):  # Already indexed, and unchanged
+                count += 1
+                continue
+
+            source: tuple[str, str] | None = read_source(path)
+
+            if source is not None:
+                self.record(*source, path=path)
+                count += 1
+
+        return count
+
+    def rebuild(self, folder: Path) -> dict:
+        """Reconcile the index, then add every file of a folder that was produced by the application.
+
+        Args:
+            folder (Path): The folder to scan, usually the output folder.
+
+        Returns:
+            dict: The number of entries "removed", "updated" and "indexed".
+        """
+
+        return {**self.reconcile(), "indexed": self.scan(folder)}
+
+    def stats(self) -> dict:
+        """Get the number of entries of the index."""
+
+        with self.lock:
+            size: int = self.connection.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+
+        return {"entries": size}
+
+    def close(self) -> None:
+        """Close the underlying database."""
+
+        with self.lock:
+            self.connection.close()
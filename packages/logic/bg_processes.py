@@ -1,150 +1,450 @@
 """
-This module provides the DownloadAndProcess class, which is a QThread subclass
-for downloading audio from a YouTube video, converting it to MP3 format, and
-tagging it with user information in the background.
+This module provides the Qt side of the background processing: the DownloadAndProcess class,
+which reports the progress of a single job through signals, the ProgressBus class, which delivers
+the progress of every job to the GUI at a capped rate, the JobScheduler class, which runs
+many of them concurrently in the background (the work itself is done by packages.logic.pipeline),
+the ExpandCollection class, which turns playlists and channels into videos,
+the NetworkBridge class, which delivers the results of network requests,
+the DetectVideoCopyright class, which checks whether a video is in the public domain,
+and the ProcessAlbumCover class, which prepares dropped album covers.
 """
 
-from pathlib import Path
-from time import sleep
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from threading import Lock, Thread
+from typing import Any, Coroutine, Iterable, NamedTuple
 
-import pytube
-from PySide6.QtCore import QThread, Signal
-from pydub import AudioSegment
-from mutagen import id3
+from PySide6.QtCore import QObject, QTimer, Signal
 
 from packages.constants import constants
-from packages.logic.toolkit import qthread_error_handler
-
-
-class DownloadAndProcess(QThread):
-
+from packages.logic import covers, network, playlists, profiling, videos
+from packages.logic.archive import Archive
+from packages.logic.composers import ComposerMatch, ComposerMatcher
+from packages.logic.fingerprints import FingerprintIndex
+from packages.logic.jobs import Job, JobStatus
+from packages.logic.journal import Journal
+from packages.logic.metadata_store import VideoInfo
+from packages.logic.metrics import MetricsLog, Progress
+from packages.logic.pipeline import JobRunner, Pipeline
+
+
+class DownloadAndProcess(QObject):
+    """
+    Qt front of a Pipeline: forwards the events of a single job to signals, so they are
+    delivered in the GUI thread. Every job gets its own instance, and therefore its own signals.
+    """
+
+    status_changed = Signal(object)
+    stage_measured = Signal(object)
+    job_skipped = Signal(object)
+    duplicate_found = Signal(object)
     download_finished = Signal()
     file_converted = Signal()
     file_tagged = Signal()
     error_happened = Signal()
 
-    def __init__(self):
+    def __init__(self, pipeline: Pipeline):
+        super().__init__()
+
+        self.pipeline: Pipeline = pipeline
+        self.job: Job = pipeline.job
+        pipeline.status_changed.connect(self.status_changed.emit)
+        pipeline.stage_measured.connect(self.stage_measured.emit)
+        pipeline.job_skipped.connect(self.job_skipped.emit)
+        pipeline.duplicate_found.connect(self.duplicate_found.emit)
+        pipeline.download_finished.connect(self.download_finished.emit)
+        pipeline.file_converted.connect(self.file_converted.emit)
+        pipeline.file_tagged.connect(self.file_tagged.emit)
+        pipeline.error_happened.connect(self.error_happened.emit)
+
+    @property
+    def status(self) -> JobStatus:
+        """The stage the job has reached."""
+
+        return self.pipeline.status
+
+
+class JobUpdate(NamedTuple):
+    """The latest known state of a job, as delivered by ProgressBus."""
+
+    job_id: int
+    status: JobStatus | None = None
+    progress: Progress | None = None
+
+
+class ProgressBus(QObject):
+    """
+    Collects the status and progress of every job from the worker threads, and delivers them
+    to the GUI thread in batches, at most constants.PROGRESS_RATE times per second.
+
+    Only the latest update of each job is kept until the next batch, so the number of events
+    reaching the Qt event loop does not depend on the number of chunks processed nor on the
+    number of jobs: posting costs a dictionary assignment, and a single queued event wakes
+    the delivery timer up when the bus was idle. Nothing runs at all while no job is active.
+    """
+
+    updated = Signal(object)
+    wake_up = Signal()
+
+    def __init__(self, rate: int = constants.PROGRESS_RATE):
         super().__init__()
 
-        self.output_directory: Path = Path.home() / "Downloads"
-        self.output_directory.mkdir(exist_ok=True, parents=True)
-        self.youtube_link = None
-        self.metadata = None
-        self.quality = None
+        self.pending: dict[int, JobUpdate] = {}
+        self.lock = Lock()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(1000 // rate)
+        self.timer.timeout.connect(self.flush)
+        self.wake_up.connect(self.timer.start)
 
-    @qthread_error_handler
-    def convert_file(self, file: Path) -> Path:
-        """Converts the downloaded audio file to MP3 format.
+    def post(self, job_id: int, status: JobStatus | None = None, progress: Progress | None = None) -> None:
+        """Records an update of a job. Safe to call from any thread.
 
         Args:
-            file (Path): The path to the downloaded audio file.
+            job_id (int): The ID of the job.
+            status (JobStatus | None): The new status of the job, if it changed.
+            progress (Progress | None): The new progress of the job, if it changed.
+        """
+
+        with self.lock:
+            idle: bool = not self.pending
+            update: JobUpdate = self.pending.get(job_id) or JobUpdate(job_id=job_id)
+            self.pending[job_id] = update._replace(
+                status=status or update.status,
+                progress=progress or update.progress
+            )
+
+        if idle:
+            self.wake_up.emit()
+
+    def flush(self) -> None:
+        """Delivers the pending updates, keyed by job ID, through the updated signal."""
+
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        if pending:
+            self.updated.emit(pending)
+
+
+class JobScheduler(QObject):
+    """
+    Qt front of a JobRunner, which runs jobs concurrently on an I/O pool and a CPU pool.
+
+    The job_submitted signal is emitted synchronously before any work is queued,
+    so listeners can connect to the per-job signals without missing any of them.
+    The status and progress of every job are also delivered, throttled, by the progress bus.
+    Videos already downloaded in the requested quality are skipped, see packages.logic.archive,
+    and the jobs left unfinished by earlier sessions can be resumed, see packages.logic.journal.
+    Jobs whose audio is already in the library are flagged, see packages.logic.fingerprints.
+    """
+
+    job_submitted = Signal(object)
+    job_finished = Signal(object)
+
+    def __init__(self, io_workers: int = constants.IO_WORKERS, cpu_workers: int = constants.CPU_WORKERS):
+        super().__init__()
+
+        self.runner = JobRunner(io_workers=io_workers, cpu_workers=cpu_workers, metrics_log=MetricsLog(),
+                                archive=Archive(), journal=Journal(),
+                                fingerprints=FingerprintIndex())
+        self.processors: dict[int, DownloadAndProcess] = {}
+        self.submitted: dict[int, DownloadAndProcess] = {}
+        self.closer: Thread | None = None
+        self.progress = ProgressBus()
+        self.runner.job_submitted.connect(self.on_job_submitted)
+        self.runner.job_finished.connect(self.on_job_finished)
+
+    def submit(self, job: Job) -> DownloadAndProcess:
+        """Queues a job for processing.
+
+        Args:
+            job (Job): The job to process.
+
+        Returns:
+            DownloadAndProcess: The object processing the job, which carries its status and signals.
+        """
+
+        self.runner.submit(job)
+        return self.submitted.pop(job.job_id)  # Even if the job already ended, its video being archived
+
+    def submit_many(self, jobs: Iterable[Job]) -> list[DownloadAndProcess]:
+        """Queues several jobs at once, see JobRunner.submit_many.
+
+        Args:
+            jobs (Iterable[Job]): The jobs to process.
 
         Returns:
-            Path: The path to the converted MP3 file.
+            list[DownloadAndProcess]: The objects processing the jobs, in the same order.
         """
 
-        mp3_file: Path = file.with_suffix('.mp3')
-        audio = AudioSegment.from_file(file)
-        audio.export(mp3_file, format="mp3", bitrate=self.quality)
-        self.file_converted.emit()
-        sleep(0.7)  # Delay to allow the progress to be seen
-        return mp3_file
+        return [self.submitted.pop(pipeline.job.job_id) for pipeline in self.runner.submit_many(jobs)]
 
-    @qthread_error_handler
-    def download_file(self) -> Path:
-        """Downloads the audio from the YouTube video.
+    def resume(self) -> list[DownloadAndProcess]:
+        """Queues the jobs that earlier sessions left unfinished, from the last stage each one completed.
 
         Returns:
-            Path: The path to the downloaded audio file.
+            list[DownloadAndProcess]: The objects processing the jobs that have not already ended.
         """
 
-        target: pytube.YouTube = pytube.YouTube(self.youtube_link)
-        audio_stream = target.streams.filter(only_audio=True).first()
-        audio_file: Path = Path(audio_stream.download(output_path=self.output_directory))
-        self.download_finished.emit()
-        return audio_file
+        pipelines: list[Pipeline] = self.runner.resume()
+        processors: list[DownloadAndProcess] = [self.submitted.pop(pipeline.job.job_id) for pipeline in pipelines]
+        return [processor for processor in processors if processor.job.job_id in self.processors]
+
+    def on_job_submitted(self, pipeline: Pipeline) -> None:
+        """Wraps a new pipeline before it starts, in the thread that submitted the job."""
+
+        processor = DownloadAndProcess(pipeline=pipeline)
+        job_id: int = pipeline.job.job_id
+        pipeline.status_changed.connect(lambda status: self.progress.post(job_id, status=status))
+        pipeline.progress_changed.connect(lambda progress: self.progress.post(job_id, progress=progress))
+        self.processors[job_id] = processor
+        self.submitted[job_id] = processor  # Handed back by submit or resume, once the runner returns
+        self.job_submitted.emit(processor)
+
+    def on_job_finished(self, pipeline: Pipeline) -> None:
+
+        processor: DownloadAndProcess | None = self.processors.pop(pipeline.job.job_id, None)
+
+        if processor is not None:
+            self.job_finished.emit(processor)
+
+    def shutdown(self) -> None:
+        """Cancels the queued stages and lets the running ones finish in the background. The cancelled jobs
+        are kept in the journal, to be resumed by the next session, which is closed once the running stages
+        have finished, so that the jobs they complete are removed from it."""
+
+        if self.closer is not None:
+            return
+
+        self.runner.shutdown()
+        self.closer = Thread(target=self.close_journal, name="journal-closer")  # Not a daemon, the process waits
+        self.closer.start()
+
+    def close_journal(self) -> None:
+
+        self.runner.shutdown(wait=True)
+        self.runner.journal.close()
+
+
+class ExpandCollection(QObject):
+    """
+    Expands playlists and channels in the background. Their videos are resolved concurrently,
+    at most constants.RESOLVE_CONCURRENCY at a time, and each one is reported through
+    entry_resolved as soon as it is ready, along with the tags and job options the user asked for,
+    so it can be submitted right away. Expansions run one after the other.
+    """
+
+    entry_resolved = Signal(object, object, object)
+    error_happened = Signal()
+
+    def __init__(self, concurrency: int = constants.RESOLVE_CONCURRENCY):
+        super().__init__()
+
+        self.concurrency: int = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist")
 
-    @qthread_error_handler
-    def tag_file(self, file: Path) -> None:
-        """Tags the given MP3 file with metadata and cover image if available.
+    def expand(self, url: str, template: dict, options: dict) -> None:
+        """Starts expanding the given playlist or channel.
 
         Args:
-            file (Path): The path to the MP3 file to be tagged.
+            url (str): The link of the playlist or channel.
+            template (dict): The tags entered by the user, see playlists.entry_metadata.
+            options (dict): The keyword arguments of every job, such as its quality.
         """
 
-        metadata = id3.ID3(file)
-        cover: bytes | None = self.metadata.popitem()[1]
+        self.executor.submit(self.run, url, template, options)
+
+    def run(self, url: str, template: dict, options: dict) -> None:
+
+        try:
+            for entry in playlists.expand(url, concurrency=self.concurrency):
+                if entry.error is None:  # Unavailable videos (private, removed...) are skipped
+                    self.entry_resolved.emit(entry, playlists.entry_metadata(entry, template), options)
+
+        except Exception:
+            self.error_happened.emit()
+
+    def shutdown(self) -> None:
+        """Cancels the pending expansions and stops the background thread."""
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class NetworkBridge(QObject):
+    """
+    Runs coroutines on the network loop (see packages.logic.network) and delivers their outcome
+    through signals, in the thread of the receivers, without any thread waiting for the network.
+    Each request carries a tag, given back with its outcome, so stale answers can be told apart.
+    """
+
+    finished = Signal(object, object)
+    failed = Signal(object, object)
+
+    def submit(self, tag: Any, coroutine: Coroutine) -> Future:
+        """Starts a request.
+
+        Args:
+            tag (Any): Given back with the outcome of the request.
+            coroutine (Coroutine): The request, usually using network.shared().client.
 
-        metadata.add(id3.TIT2(encoding=3, text=self.metadata.get("title")))
-        metadata.add(id3.TPE1(encoding=3, text=self.metadata.get("artist")))
-        metadata.add(id3.TALB(encoding=3, text=self.metadata.get("album")))
-        metadata.add(id3.TDRC(encoding=3, text=self.metadata.get("year")))
-        metadata.add(id3.TCON(encoding=3, text=self.metadata.get("genre")))
-        metadata.add(id3.TCOP(encoding=3, text=self.metadata.get("copyright")))
-        metadata.add(id3.TPOS(encoding=3, text=self.metadata.get("disc_number")))
-        metadata.add(id3.TRCK(encoding=3, text=self.metadata.get("track_number")))
+        Returns:
+            Future: The outcome of the request, which can be cancelled.
+        """
 
-        if cover:
-            apic = id3.APIC(encoding=3, mime="image/png", type=3, desc=u"Cover", data=cover)
-            metadata.delall("APIC")
-            metadata.add(apic)
+        future: Future = network.shared().submit(coroutine)
+        future.add_done_callback(partial(self.deliver, tag))
+        return future
 
-        metadata.save()
-        self.file_tagged.emit()
+    def deliver(self, tag: Any, future: Future) -> None:
 
-    def run(self) -> None:
+        if future.cancelled():
+            return
 
-        file: Path = self.download_file()
-        mp3_file: Path = self.convert_file(file=file)
+        error: BaseException | None = future.exception()
 
-        if isinstance(file, Path) and file.is_file():
-            file.unlink()
+        if error is None:
+            self.finished.emit(tag, future.result())
 
-        self.tag_file(file=mp3_file)
-        data: bool = self.metadata.get("artist") and self.metadata.get("title")
-        filename: str = f"{self.metadata["artist"]} - {self.metadata["title"]}.mp3" if data else ""
+        else:
+            self.failed.emit(tag, error)
 
-        if filename:
-            mp3_file.rename(Path.joinpath(mp3_file.parent, filename))
 
+class DetectVideoCopyright(QObject):
+    """
+    Checks in the background whether a video is the work of a public domain composer.
 
-class DetectVideoCopyright(QThread):
+    Videos are described on the network loop, and the answer is matched against the composers
+    in the GUI thread once it arrives, so no thread waits for YouTube. Requesting a new check
+    cancels the previous one: its request is abandoned, and its answer discarded if it already came.
+    The resolved video is cached so that downloading it costs no extra request.
+    """
 
     this_is_ok_signal = Signal()
     this_is_not_ok_signal = Signal()
-    composers = set()
+    matcher: ComposerMatcher | None = None
 
     def __init__(self):
         super().__init__()
 
         self.youtube_url = None
         self.video_title = None
-        self.load_composers()
+        self.matches: list[ComposerMatch] = []
+        self.generation: int = 0
+        self.request: Future | None = None
+        self.network = NetworkBridge(self)
+        self.network.finished.connect(self.on_described)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="legal")
+        self.executor.submit(self.load_composers)  # Checks are queued behind it on the same thread
 
     @classmethod
     def load_composers(cls) -> None:
-        """Load composers from the file specified in constants.COMPOSERS."""
+        """Load the composer matcher for the file specified in constants.COMPOSERS,
+        from the cache in constants.COMPOSERS_INDEX when it is up-to-date."""
+
+        if cls.matcher is None:
+            with profiling.section("copyright", "load"):
+                cls.matcher = ComposerMatcher.load(source=constants.COMPOSERS, cache=constants.COMPOSERS_INDEX)
+
+    def cancel(self) -> None:
+        """Cancels the pending check, if any."""
+
+        self.generation += 1
 
-        with open(constants.COMPOSERS, "r", encoding="UTF-8") as file:
-            cls.composers = {line.strip().lower() for line in file}
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
 
-    def run(self) -> None:
+    def check(self, youtube_url: str) -> None:
+        """Starts checking the given video, cancelling the previous check.
 
-        if not self.youtube_url:
+        Args:
+            youtube_url (str): The link of the video to check.
+        """
+
+        self.cancel()
+        self.youtube_url = youtube_url
+        self.executor.submit(self.run, youtube_url, self.generation)
+
+    def run(self, youtube_url: str, generation: int) -> None:
+
+        if not youtube_url or generation != self.generation:
             return
 
-        try:
-            self.video_title: str = pytube.YouTube(self.youtube_url).streams[0].title
+        self.request = self.network.submit(generation, videos.describe_async(youtube_url))
+
+    def on_described(self, generation: int, info: VideoInfo) -> None:
+        """Matches the title of the described video against the composers. Failed requests,
+        such as those for unavailable videos, are not reported."""
 
-        except pytube.exceptions.RegexMatchError:  # type: ignore
+        if generation != self.generation:  # A newer link was entered in the meantime
             return
 
+        self.request = None
+        self.video_title = info.title
+
         if not (self.video_title and isinstance(self.video_title, str)):
             self.this_is_not_ok_signal.emit()
             return
 
-        if any(composer in self.video_title.lower() for composer in self.composers):
+        with profiling.section(f"copyright-{generation}", "match", wait=False):  # In the GUI thread
+            self.matches = self.matcher.find(self.video_title)
+
+        if self.matches:
             self.this_is_ok_signal.emit()
 
         else:
             self.this_is_not_ok_signal.emit()
+
+    def shutdown(self) -> None:
+        """Cancels the pending check and stops the background thread."""
+
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessAlbumCover(QObject):
+    """
+    Prepares album covers on a background thread, so dropping a huge image does not freeze the window.
+    Only the most recently dropped image is reported, older ones still being processed are discarded.
+    """
+
+    cover_ready = Signal(object)
+    error_happened = Signal()
+
+    def __init__(self):
+        super().__init__()
+
+        self.generation: int = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cover")
+
+    def process(self, image: str) -> None:
+        """Starts preparing the cover made from the given image.
+
+        Args:
+            image (str): The file path to the album cover image.
+        """
+
+        self.generation += 1
+        self.executor.submit(self.run, image, self.generation)
+
+    def run(self, image: str, generation: int) -> None:
+
+        if generation != self.generation:
+            return
+
+        try:
+            with profiling.section(f"cover-{generation}", "process"):
+                data: bytes = covers.process_cover(source=image)
+
+        except (OSError, ValueError):
+            self.error_happened.emit()
+            return
+
+        if generation == self.generation:
+            self.cover_ready.emit(data)
+
+    def shutdown(self) -> None:
+        """Stops the background thread."""
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,444 @@
+"""
+This module extracts clips: the part of a video between a start and an end time. YouTube serves
+its audio streams as fragmented MP4 (m4a) or WebM files whose head holds an index of the fragments,
+a "sidx" box or "Cues" element giving the time and the byte range of each of them. That index is
+read from the first bytes of the stream, and only the fragments overlapping the clip are downloaded,
+right after the head of the file (less the index, which no longer matches). ffmpeg then cuts the clip
+out of the fragments without re-encoding anything, so the later stages only decode and encode the clip.
+Streams without a usable index are downloaded whole, then cut the same way.
+
+It also provides waveform previews to choose the cut points from: the peak level of every short
+window of the track, computed with NumPy from a decoding of the smallest audio stream at a low
+sample rate, and cached on disk per video so that the user can look at it again instantly.
+Unlike clips, previews download and decode the whole stream, the index being left unused: the first
+preview of a video costs a full decoding, only the later ones are free. The user interface only takes
+the start time from the "t" parameter of the link; choosing the end, or seeing the waveform, is only
+possible from the command line (--end, --waveform).
+"""
+
+import shutil
+import struct
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Iterable, NamedTuple
+
+import numpy as np
+
+from packages.constants import constants
+from packages.logic import downloader, encoding, network, videos
+from packages.logic.metadata_store import AudioStreamInfo, VideoInfo
+
+
+EBML_HEADER: int = 0x1A45DFA3
+EBML_SEGMENT: int = 0x18538067
+EBML_INFO: int = 0x1549A966
+EBML_TIMECODE_SCALE: int = 0x2AD7B1
+EBML_CUES: int = 0x1C53BB6B
+EBML_CUE_POINT: int = 0xBB
+EBML_CUE_TIME: int = 0xB3
+EBML_CUE_TRACK_POSITIONS: int = 0xB7
+EBML_CUE_CLUSTER_POSITION: int = 0xF1
+EBML_CLUSTER: int = 0x1F43B675
+
+
+class Fragment(NamedTuple):
+    """A fragment of a stream: its first second, and its first and last bytes, the last one included."""
+
+    time: float
+    first: int
+    last: int
+
+
+class ContainerIndex(NamedTuple):
+    """What a stream needs to be read from any of its fragments: the bytes preceding the first one,
+    the index aside, and the fragments in order."""
+
+    header: bytes
+    fragments: list[Fragment]
+
+    def span(self, start: float, end: float | None) -> tuple[int, int, float]:
+        """Get the bytes holding the audio between two times.
+
+        Args:
+            start (float): The first second of the clip.
+            end (float | None): The last second of the clip, None for the end of the stream.
+
+        Returns:
+            tuple[int, int, float]: The first and last bytes (included) of the fragments overlapping
+                the clip, and the time their audio starts at.
+        """
+
+        times: np.ndarray = np.array([fragment.time for fragment in self.fragments])
+        first: int = max(int(np.searchsorted(times, start, side="right")) - 1, 0)
+        last: int = len(times) - 1 if end is None else max(int(np.searchsorted(times, end, side="left")) - 1, first)
+        return self.fragments[first].first, self.fragments[last].last, self.fragments[first].time
+
+
+def mp4_index(head: bytes, size: int) -> ContainerIndex | None:
+    """Read the index of a fragmented MP4 file from its first bytes.
+
+    Args:
+        head (bytes): The first bytes of the file, up to the first fragment at least.
+        size (int): The size of the whole file.
+
+    Returns:
+        ContainerIndex | None: The index, or None if the file has no single "sidx" box in its head.
+    """
+
+    position: int = 0
+    boxes: list[tuple[int, int]] = []
+    fragments: list[Fragment] = []
+
+    while position + 8 <= len(head) and not fragments:
+        length, kind = struct.unpack_from(">I4s", head, position)
+        header_length: int = 8
+
+        if length == 1 and position + 16 <= len(head):
+            length, header_length = struct.unpack_from(">Q", head, position + 8)[0], 16
+
+        if length < header_length or position + length > len(head):
+            return None
+
+        if kind == b"sidx":
+            version: int = head[position + header_length]
+            offset: int = position + header_length + 8  # Version, flags and reference ID
+            timescale: int = struct.unpack_from(">I", head, offset)[0]
+            earliest, first_offset = struct.unpack_from(">II" if version == 0 else ">QQ", head, offset + 4)
+            offset += 12 if version == 0 else 20
+            count: int = struct.unpack_from(">H", head, offset + 2)[0]
+            references: np.ndarray = np.frombuffer(head, dtype=">u4", count=3 * count, offset=offset + 4).reshape(-1, 3)
+
+            if not timescale or not count or (references[:, 0] >> 31).any():  # Indexes of indexes are not supported
+                return None
+
+            sizes: np.ndarray = (references[:, 0] & 0x7FFFFFFF).astype(np.int64)
+            ends: np.ndarray = position + length + first_offset + np.cumsum(sizes)
+            times: np.ndarray = (earliest + np.cumsum(references[:, 1], dtype=np.int64) - references[:, 1]) / timescale
+            fragments = [Fragment(float(time), int(end - fragment), int(end) - 1)
+                         for time, fragment, end in zip(times, sizes, ends) if end <= size]
+
+        elif kind == b"moof":
+            return None
+
+        else:
+            boxes.append((position, position + length))
+
+        position += length
+
+    if not fragments:
+        return None
+
+    return ContainerIndex(header=b"".join(head[first:end] for first, end in boxes if end <= fragments[0].first),
+                          fragments=fragments)
+
+
+def read_vint(data: bytes, position: int, marker: bool) -> tuple[int, int]:
+    """Read an EBML variable-length integer.
+
+    Args:
+        data (bytes): The bytes to read from.
+        position (int): Where the integer starts.
+        marker (bool): Whether to keep the length marker, as element IDs do.
+
+    Raises:
+        ValueError: If the integer is malformed or truncated.
+
+    Returns:
+        tuple[int, int]: The integer, -1 for an unknown size, and the position following it.
+    """
+
+    if position >= len(data) or not data[position]:
+        raise ValueError("Malformed EBML integer.")
+
+    length: int = 9 - data[position].bit_length()
+
+    if position + length > len(data):
+        raise ValueError("Truncated EBML integer.")
+
+    value: int = int.from_bytes(data[position:position + length], "big")
+
+    if marker:
+        return value, position + length
+
+    value &= (1 << (7 * length)) - 1
+    return -1 if value == (1 << (7 * length)) - 1 else value, position + length
+
+
+def ebml_elements(data: bytes, start: int, end: int) -> Iterable[tuple[int, int, int]]:
+    """Iterate over the (ID, data start, data end) of the elements between two positions,
+    stopping at the first element that does not fit in the data."""
+
+    position: int = start
+
+    while position < end:
+        element, position = read_vint(data, position, marker=True)
+        length, position = read_vint(data, position, marker=False)
+
+        if length < 0 or position + length > len(data):
+            yield element, position, -1
+            return
+
+        yield element, position, position + length
+        position += length
+
+
+def webm_index(head: bytes, size: int) -> ContainerIndex | None:
+    """Read the index of a WebM file from its first bytes.
+
+    Args:
+        head (bytes): The first bytes of the file, up to the first cluster at least.
+        size (int): The size of the whole file.
+
+    Returns:
+        ContainerIndex | None: The index, or None if the cues of the file are not in its head.
+    """
+
+    try:
+        elements: Iterable = ebml_elements(head, 0, len(head))
+        element, _, header_end = next(elements)
+        element, segment, _ = next(elements)
+
+        if element != EBML_SEGMENT or header_end < 0:
+            return None
+
+        scale: int = 1_000_000
+        cues: list[tuple[int, int]] = []
+        element_start: int = segment
+        index_bytes: tuple[int, int] = (0, 0)
+
+        for element, start, end in ebml_elements(head, segment, len(head)):
+            if element == EBML_CLUSTER or end < 0:
+                break
+
+            if element == EBML_INFO:
+                for child, child_start, child_end in ebml_elements(head, start, end):
+                    if child == EBML_TIMECODE_SCALE:
+                        scale = int.from_bytes(head[child_start:child_end], "big")
+
+            elif element == EBML_CUES:
+                for _, point_start, point_end in ebml_elements(head, start, end):
+                    cue: dict[int, int] = {}
+
+                    for child, child_start, child_end in ebml_elements(head, point_start, point_end):
+                        if child == EBML_CUE_TRACK_POSITIONS:
+                            cue.update((grandchild, int.from_bytes(head[grandchild_start:grandchild_end], "big"))
+                                       for grandchild, grandchild_start, grandchild_end
+                                       in ebml_elements(head, child_start, child_end))
+
+                        elif child == EBML_CUE_TIME:
+                            cue[child] = int.from_bytes(head[child_start:child_end], "big")
+
+                    if EBML_CUE_TIME in cue and EBML_CUE_CLUSTER_POSITION in cue:
+                        cues.append((cue[EBML_CUE_TIME], segment + cue[EBML_CUE_CLUSTER_POSITION]))
+
+                index_bytes = (element_start, end)
+
+            element_start = end
+
+    except (ValueError, StopIteration):
+        return None
+
+    positions: list[int] = sorted(dict.fromkeys(position for _, position in cues if position < size))
+
+    if not positions or positions[0] > len(head):
+        return None
+
+    times: dict[int, int] = {position: time for time, position in reversed(cues)}
+    fragments: list[Fragment] = [
+        Fragment(times[position] * scale / 1e9, position, following - 1)
+        for position, following in zip(positions, [*positions[1:], size])
+    ]
+    return ContainerIndex(header=head[:index_bytes[0]] + head[index_bytes[1]:positions[0]], fragments=fragments)
+
+
+def read_index(url: str, size: int, head_size: int = constants.CLIP_INDEX_SIZE) -> ContainerIndex | None:
+    """Read the index of a stream from its first bytes, with a single ranged request.
+
+    Args:
+        url (str): The URL of the stream.
+        size (int): The size of the stream in bytes.
+        head_size (int): How many bytes to read, the index having to fit in them.
+
+    Returns:
+        ContainerIndex | None: The index, or None if the stream has none that can be read.
+    """
+
+    if not size:
+        return None
+
+    response: network.Response = network.shared().request(
+        "GET", url, headers={**network.HEADERS, "Range": f"bytes=0-{min(head_size, size) - 1}"}
+    )
+
+    if response.status != 206:
+        return None
+
+    return mp4_index(response.body, size) or webm_index(response.body, size)
+
+
+def download_clip(url: str, size: int, destination: Path, start: float, end: float | None, partial: Path,
+                  on_progress: Callable[[int, int], None] | None = None) -> Path:
+    """Download the audio of a stream between two times. Only the fragments overlapping the clip
+    are downloaded if the stream has an index, the whole stream otherwise, and either way the clip
+    is then cut out of them without re-encoding, see encoding.cut.
+
+    Args:
+        url (str): The URL of the stream.
+        size (int): The size of the stream in bytes.
+        destination (Path): The path of the clip, with the extension of the stream.
+        start (float): The first second of the clip.
+        end (float | None): The last second of the clip, None for the end of the stream.
+        partial (Path): The partial file the stream would be downloaded to, see SegmentedDownloader.
+            The fragments are downloaded to one named after it and their bytes, so they can be resumed too.
+        on_progress (Callable[[int, int], None] | None): Called with the number of bytes downloaded so far
+            and the number of bytes to download.
+
+    Returns:
+        Path: The path to the clip.
+    """
+
+    index: ContainerIndex | None = read_index(url, size)
+    source: Path = destination.with_name(f"{destination.stem}.source{destination.suffix}")
+    origin: float = 0.0
+
+    if index is None:
+        downloader.download(url=url, destination=source, size=size, partial=partial, on_progress=on_progress)
+
+    else:
+        first, last, origin = index.span(start, end)
+        fragments: Path = downloader.download(
+            url=url, destination=destination.with_name(f"{destination.name}.fragments"), size=last - first + 1,
+            offset=first, partial=partial.with_name(f"{partial.stem}-{first}-{last}.part"), on_progress=on_progress
+        )
+
+        with open(source, "wb") as file, open(fragments, "rb") as content:
+            file.write(index.header)
+            shutil.copyfileobj(content, file)
+
+        fragments.unlink()
+
+    try:
+        return encoding.cut(source=source, destination=destination, start=start - origin,
+                            duration=None if end is None else end - start)
+
+    finally:
+        source.unlink(missing_ok=True)
+
+
+class Waveform(NamedTuple):
+    """The peak level (1.0 being full scale) of each window of a track, constants.WAVEFORM_RESOLUTION
+    windows per second, the last window being shorter."""
+
+    peaks: np.ndarray
+    resolution: int
+
+    @property
+    def duration(self) -> float:
+        """The length of the track in seconds, to the window."""
+
+        return len(self.peaks) / self.resolution
+
+    def downsample(self, points: int = constants.WAVEFORM_POINTS) -> np.ndarray:
+        """Get the peak level of a given number of windows of the same length covering the whole track,
+        as drawn by a waveform of that width.
+
+        Args:
+            points (int): The number of windows.
+
+        Returns:
+            np.ndarray: The peak of each window, fewer than points if the track is shorter.
+        """
+
+        if len(self.peaks) <= points:
+            return self.peaks
+
+        edges: np.ndarray = np.linspace(0, len(self.peaks), points, endpoint=False).astype(np.int64)
+        return np.maximum.reduceat(self.peaks, edges)
+
+
+def peak_levels(blocks: Iterable[bytes], window: int) -> np.ndarray:
+    """Get the peak level of each window of mono PCM audio.
+
+    Args:
+        blocks (Iterable[bytes]): 32-bit float samples, see encoding.decode_pcm.
+        window (int): The number of samples of a window.
+
+    Returns:
+        np.ndarray: The peak of each window.
+    """
+
+    peaks: list[np.ndarray] = []
+    rest: np.ndarray = np.zeros(0, dtype=np.float32)
+
+    for block in blocks:
+        samples: np.ndarray = np.concatenate((rest, np.abs(np.frombuffer(block, dtype=np.float32))))
+        whole: int = len(samples) - len(samples) % window
+        peaks.append(samples[:whole].reshape(-1, window).max(axis=1))
+        rest = samples[whole:]
+
+    if len(rest):
+        peaks.append(rest.max(keepdims=True))
+
+    return np.concatenate(peaks).astype(np.float32) if peaks else np.zeros(0, dtype=np.float32)
+
+
+def waveform(source: Path, rate: int = constants.WAVEFORM_RATE,
+             resolution: int = constants.WAVEFORM_RESOLUTION) -> Waveform:
+    """Compute the waveform of an audio file, from a mono decoding at a low sample rate.
+
+    Args:
+        source (Path): The path to the audio file.
+        rate (int): The sample rate the audio is decoded at.
+        resolution (int): The number of windows per second.
+
+    Returns:
+        Waveform: The waveform of the file.
+    """
+
+    window: int = rate // resolution
+    blocks: Iterable[bytes] = encoding.decode_pcm(source, block_frames=window * resolution * 10, rate=rate, channels=1)
+    return Waveform(peaks=peak_levels(blocks, window), resolution=resolution)
+
+
+def preview(youtube_link: str, folder: Path = constants.WAVEFORMS_FOLDER) -> Waveform:
+    """Get the waveform of a video, computed from its smallest audio stream the first time,
+    and read from the cache afterwards. The stream is downloaded and decoded whole the first time.
+
+    Args:
+        youtube_link (str): The link of the video.
+        folder (Path): The folder of the cached waveforms, one file per video.
+
+    Returns:
+        Waveform: The waveform of the video.
+    """
+
+    identifier: str | None = videos.video_id(youtube_link)
+    cached: Path = Path.joinpath(folder, f"{identifier}-{constants.WAVEFORM_RESOLUTION}.npy")
+
+    if identifier is not None and cached.is_file():
+        try:
+            return Waveform(peaks=np.load(cached), resolution=constants.WAVEFORM_RESOLUTION)
+
+        except (OSError, ValueError):  # Written by a session that stopped halfway
+            cached.unlink(missing_ok=True)
+
+    info: VideoInfo = videos.describe(youtube_link)
+    chosen: AudioStreamInfo | None = min(info.streams, key=lambda stream: stream.size or float("inf"), default=None)
+
+    if chosen is None:
+        raise ValueError(f"No audio stream is available for {youtube_link}.")
+
+    url: str = videos.resolve(youtube_link).streams.get_by_itag(chosen.itag).url
+
+    with TemporaryDirectory() as temporary:
+        audio: Path = downloader.download(url=url, destination=Path.joinpath(Path(temporary), "audio"),
+                                          size=chosen.size)
+        result: Waveform = waveform(audio)
+
+    if identifier is not None:
+        folder.mkdir(parents=True, exist_ok=True)
+        written: Path = cached.with_name(f"{cached.stem}.tmp.npy")
+        np.save(written, result.peaks)
+        written.replace(cached)
+
+    return result
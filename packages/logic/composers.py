@@ -0,0 +1,195 @@
+"""
+This module provides the ComposerMatcher class, an Aho-Corasick automaton built from
+the list of public domain composers. It finds every composer mentioned in a title in
+a single pass over the title, whatever the number of composers, and is cached on disk
+so it only has to be built again when the list changes.
+"""
+
+import os
+import pickle
+from collections import deque
+from hashlib import sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Iterable, NamedTuple
+
+
+class ComposerMatch(NamedTuple):
+    """A composer found in a title, with the position of the match in the (lowercased) title."""
+
+    composer: str
+    start: int
+    end: int
+
+
+class ComposerMatcher:
+    """
+    Multi-pattern matcher for composer names.
+
+    Names are matched as lowercase substrings, exactly like `composer in title.lower()` would,
+    but the title is only read once: each character follows at most one transition of the
+    automaton, plus failure transitions whose total number is bounded by the title length.
+    """
+
+    VERSION: int = 1
+
+    def __init__(self, composers: Iterable[str]):
+
+        self.patterns: list[str] = sorted({composer.strip().lower() for composer in composers} - {""})
+        self.goto: list[dict[str, int]] = [{}]
+        self.output: list[int] = [-1]  # Index of the pattern ending at each node, -1 if none
+        self.fail: list[int] = [0]
+        self.link: list[int] = [-1]  # Nearest node on the failure chain that ends a pattern
+        self.build()
+
+    def build(self) -> None:
+        """Builds the trie of the patterns, then its failure and dictionary links breadth-first."""
+
+        for index, pattern in enumerate(self.patterns):
+            node: int = 0
+
+            for character in pattern:
+                child: int | None = self.goto[node].get(character)
+
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][character] = child
+                    self.goto.append({})
+                    self.output.append(-1)
+
+                node = child
+
+            self.output[node] = index
+
+        self.fail = [0] * len(self.goto)
+        self.link = [-1] * len(self.goto)
+        queue: deque = deque(self.goto[0].values())
+
+        while queue:
+            node: int = queue.popleft()
+
+            for character, child in self.goto[node].items():
+                queue.append(child)
+                fallback: int = self.fail[node]
+
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+
+                target: int = self.goto[fallback].get(character, 0)
+                self.fail[child] = target if target != child else 0
+                suffix: int = self.fail[child]
+                self.link[child] = suffix if self.output[suffix] >= 0 else self.link[suffix]
+
+    def iter_matches(self, title: str):
+        """Yield every composer found in the title, overlapping matches included.
+
+        Args:
+            title (str): The title to scan.
+
+        Yields:
+            ComposerMatch: The next composer found, in order of end position.
+        """
+
+        goto, fail, output, link, patterns = self.goto, self.fail, self.output, self.link, self.patterns
+        node: int = 0
+
+        for position, character in enumerate(title.lower()):
+
+            while node and character not in goto[node]:
+                node = fail[node]
+
+            node = goto[node].get(character, 0)
+            hit: int = node if output[node] >= 0 else link[node]
+
+            while hit >= 0:
+                composer: str = patterns[output[hit]]
+                yield ComposerMatch(composer, position + 1 - len(composer), position + 1)
+                hit = link[hit]
+
+    def find(self, title: str) -> list[ComposerMatch]:
+        """Find every composer mentioned in a title.
+
+        Args:
+            title (str): The title to scan.
+
+        Returns:
+            list[ComposerMatch]: The composers found and where, empty if there are none.
+        """
+
+        return list(self.iter_matches(title))
+
+    def find_all(self, titles: Iterable[str]) -> list[list[ComposerMatch]]:
+        """Find the composers mentioned in each of the given titles.
+
+        Args:
+            titles (Iterable[str]): The titles to scan.
+
+        Returns:
+            list[list[ComposerMatch]]: The matches of each title, in the same order.
+        """
+
+        return [self.find(title) for title in titles]
+
+    def matches(self, title: str) -> bool:
+        """Check whether a title mentions at least one composer, stopping at the first one found.
+
+        Args:
+            title (str): The title to scan.
+
+        Returns:
+            bool: True if a composer is mentioned in the title; False otherwise.
+        """
+
+        return next(self.iter_matches(title), None) is not None
+
+    @classmethod
+    def load(cls, source: Path, cache: Path | None = None) -> "ComposerMatcher":
+        """Load the matcher from the cache, or build it from the source file (and cache it)
+        if the cache is missing, unreadable or was built from a different version of the file.
+
+        Args:
+            source (Path): The text file listing one composer per line.
+            cache (Path | None): The cache file, no caching is done if None.
+
+        Returns:
+            ComposerMatcher: The matcher for the composers listed in the source file.
+        """
+
+        content: bytes = source.read_bytes()
+        digest: str = f"{cls.VERSION}:{sha256(content).hexdigest()}"
+
+        if cache is not None and cache.is_file():
+            try:
+                with open(cache, "rb") as file:
+                    if pickle.load(file) == digest:
+                        return pickle.load(file)
+
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+                pass
+
+        matcher = cls(content.decode("UTF-8").splitlines())
+
+        if cache is not None:
+            matcher.save(cache, digest)
+
+        return matcher
+
+    def save(self, cache: Path, digest: str) -> None:
+        """Write the matcher to the cache file, atomically so a concurrent reader never sees half of it.
+
+        Args:
+            cache (Path): The cache file.
+            digest (str): The fingerprint of the source file the matcher was built from.
+        """
+
+        try:
+            cache.parent.mkdir(parents=True, exist_ok=True)
+
+            with NamedTemporaryFile("wb", dir=cache.parent, delete=False) as file:
+                pickle.dump(digest, file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(file.name, cache)
+
+        except OSError:
+            pass  # The cache is an optimisation, the matcher works without it
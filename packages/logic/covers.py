@@ -0,0 +1,93 @@
+"""
+This module prepares album covers for tagging. Images are shrunk while they are decoded
+(JPEG draft mode, then Pillow's reducing resize), their metadata is dropped by simply not
+writing it back, and the result is cached under the hash of the source file so dropping
+the same artwork again costs no decoding at all.
+"""
+
+import os
+from io import BytesIO
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from PIL import Image
+
+from packages.constants import constants
+from packages.logic.toolkit import file_digest
+
+
+EXTENSIONS: dict = {"PNG": ".png", "JPEG": ".jpg"}
+
+
+def render_cover(source: Path, size: tuple[int, int], image_format: str) -> bytes:
+    """Decode, resize and re-encode an image, without any of its metadata.
+
+    Args:
+        source (Path): The path to the image.
+        size (tuple[int, int]): The size of the cover in pixels.
+        image_format (str): "PNG" or "JPEG".
+
+    Returns:
+        bytes: The encoded cover.
+    """
+
+    with Image.open(source) as image:
+        image.draft("RGB", size)  # JPEG only: lets the decoder downscale by up to 8 for free
+
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.mode else "RGB")
+
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        cover: Image.Image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    cover.info = {}  # Drops the EXIF data, ICC profile and text chunks of the source
+
+    byte_array: BytesIO = BytesIO()
+    cover.save(byte_array, format=image_format, **({"quality": 90} if image_format == "JPEG" else {}))
+    return byte_array.getvalue()
+
+
+def process_cover(source: Path | str, size: tuple[int, int] = constants.COVER_SIZE,
+                  image_format: str = constants.COVER_FORMAT,
+                  cache_folder: Path | None = constants.COVERS_FOLDER) -> bytes:
+    """Get the cover made from an image, from the cache when the same image was processed before.
+
+    Args:
+        source (Path | str): The path to the image.
+        size (tuple[int, int]): The size of the cover in pixels.
+        image_format (str): "PNG" or "JPEG".
+        cache_folder (Path | None): Where processed covers are cached, no caching is done if None.
+
+    Returns:
+        bytes: The encoded cover.
+    """
+
+    source = Path(source)
+
+    if cache_folder is None:
+        return render_cover(source, size, image_format)
+
+    cached: Path = cache_folder / f"{file_digest(source)}-{size[0]}x{size[1]}{EXTENSIONS[image_format]}"
+
+    try:
+        return cached.read_bytes()
+
+    except OSError:
+        pass
+
+    data: bytes = render_cover(source, size, image_format)
+
+    try:
+        cache_folder.mkdir(parents=True, exist_ok=True)
+
+        with NamedTemporaryFile("wb", dir=cache_folder, delete=False) as file:
+            file.write(data)
+
+        os.replace(file.name, cached)
+
+    except OSError:
+        pass  # The cache is an optimisation, the cover is usable without it
+
+    return data
@@ -0,0 +1,277 @@
+"""
+This module provides the SegmentedDownloader class, which downloads a file as a set of
+byte ranges fetched in parallel over the keep-alive connections of the shared network loop. Ranges are written
+in place into a preallocated file, and a small state file records which ones are complete,
+so an interrupted download resumes where it stopped instead of starting over.
+"""
+
+import http.client
+import json
+import os
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from threading import Event, Lock, Thread
+from time import sleep
+from typing import Callable, Iterator
+
+from packages.constants import constants
+from packages.logic import network
+
+
+active_downloads: dict[Path, tuple[Lock, int]] = {}  # Lock of each partial file, and the downloads holding it
+active_downloads_lock = Lock()
+
+
+class DownloadError(Exception):
+    """Raised when a range cannot be downloaded, even after retrying."""
+
+    def __init__(self, message: str):
+
+        super().__init__(message)
+
+
+class SegmentedDownloader:
+    """
+    Downloads a URL into a file using parallel Range requests.
+
+    The partial file and its state are kept next to the destination as "<name>.part" and
+    "<name>.part.json" unless another partial path is given (callers resuming across sessions
+    pass one that does not depend on anything but the file being downloaded). Both are reused
+    by the next attempt as long as the size of the remote file has not changed, and the
+    partial file is renamed to the destination once every range is complete.
+    A part of the remote file can be downloaded on its own, given the byte it starts at and its size.
+    """
+
+    def __init__(self, url: str, destination: Path, size: int = 0, partial: Path | None = None, offset: int = 0,
+                 connections: int = constants.DOWNLOAD_CONNECTIONS,
+                 segment_size: int = constants.DOWNLOAD_SEGMENT_SIZE,
+                 retries: int = constants.DOWNLOAD_RETRIES,
+                 on_progress: Callable[[int, int], None] | None = None):
+
+        self.url: str = url
+        self.destination: Path = destination
+        self.partial: Path = partial or destination.with_name(destination.name + ".part")
+        self.state_file: Path = self.partial.with_name(self.partial.name + ".json")
+        self.size: int = size
+        self.offset: int = offset
+        self.connections: int = connections
+        self.segment_size: int = segment_size
+        self.retries: int = retries
+        self.on_progress: Callable[[int, int], None] | None = on_progress
+        self.completed: set[int] = set()
+        self.downloaded: int = 0
+        self.lock = Lock()
+        self.failed = Event()
+        self.errors: list[Exception] = []
+
+    def request(self, start: int, end: int) -> Iterator[bytes]:
+        """Stream a range of the file.
+
+        Args:
+            start (int): The first byte requested, from the offset.
+            end (int): The last byte requested, included.
+
+        Raises:
+            network.HttpError: If the server does not answer with the range (HTTP 206).
+
+        Returns:
+            Iterator[bytes]: The content of the range, chunk by chunk.
+        """
+
+        headers: dict = {**network.HEADERS, "Range": f"bytes={self.offset + start}-{self.offset + end}"}
+        return network.shared().stream(self.url, headers=headers, expected=(206,))
+
+    def fetch_size(self) -> int:
+        """Ask the server for the size of the file with a one-byte range request."""
+
+        response: network.Response = network.shared().request(
+            "GET", self.url, headers={**network.HEADERS, "Range": "bytes=0-0"}
+        )
+
+        if response.status == 206:
+            return int(response.headers.get("content-range", "/0").rsplit("/", 1)[1])
+
+        raise DownloadError(f"The server does not support range requests (HTTP {response.status}).")
+
+    def segments(self) -> list[tuple[int, int, int]]:
+        """List the (index, first byte, last byte) of every range of the file."""
+
+        count: int = -(-self.size // self.segment_size)
+        return [
+            (index, index * self.segment_size, min((index + 1) * self.segment_size, self.size) - 1)
+            for index in range(count)
+        ]
+
+    def load_state(self) -> None:
+        """Reuse the ranges completed by a previous attempt, if the partial file still matches."""
+
+        try:
+            state: dict = json.loads(self.state_file.read_text(encoding="UTF-8"))
+
+        except (OSError, ValueError):
+            return
+
+        valid: bool = (
+            state.get("size") == self.size
+            and state.get("segment_size") == self.segment_size
+            and self.partial.is_file()
+            and self.partial.stat().st_size == self.size
+        )
+
+        if valid:
+            self.completed = set(state.get("completed", []))
+            self.downloaded = sum(end - start + 1 for index, start, end in self.segments() if index in self.completed)
+
+    def save_state(self) -> None:
+        """Record the completed ranges. The file is replaced atomically so it is never half written."""
+
+        state: dict = {"size": self.size, "segment_size": self.segment_size, "completed": sorted(self.completed)}
+        temporary: Path = self.state_file.with_name(self.state_file.name + ".tmp")
+        temporary.write_text(json.dumps(state), encoding="UTF-8")
+        os.replace(temporary, self.state_file)
+
+    def preallocate(self) -> None:
+        """Create the partial file at its final size, unless a previous attempt already did."""
+
+        if self.completed:
+            return
+
+        with open(self.partial, "wb") as file:
+            file.truncate(self.size)
+
+    def download_segment(self, index: int, start: int, end: int) -> None:
+        """Download one range into the partial file, retrying on failure.
+
+        Args:
+            index (int): The index of the range.
+            start (int): The first byte of the range.
+            end (int): The last byte of the range, included.
+        """
+
+        for attempt in range(self.retries + 1):
+            written: int = 0
+
+            try:
+                with open(self.partial, "r+b") as file:
+                    file.seek(start)
+
+                    for chunk in self.request(start, end):
+                        file.write(chunk)
+                        written += len(chunk)
+                        self.report(len(chunk))
+
+                    file.flush()
+                    os.fsync(file.fileno())
+
+                if written != end - start + 1:
+                    raise DownloadError(f"Range {start}-{end} ended after {written} bytes.")
+
+                with self.lock:
+                    self.completed.add(index)
+                    self.save_state()
+
+                return
+
+            except (OSError, http.client.HTTPException, DownloadError) as error:
+                self.report(-written)
+
+                if attempt == self.retries or self.failed.is_set():
+                    raise DownloadError(f"Range {start}-{end} could not be downloaded: {error}")
+
+                sleep(0.5 * 2 ** attempt)
+
+    def report(self, count: int) -> None:
+        """Add to the number of downloaded bytes and notify the progress callback."""
+
+        with self.lock:
+            self.downloaded += count
+            downloaded: int = self.downloaded
+
+        if self.on_progress is not None:
+            self.on_progress(downloaded, self.size)
+
+    def worker(self, queue: SimpleQueue) -> None:
+        """Download ranges from the queue until it is empty, one at a time."""
+
+        try:
+            while not self.failed.is_set():
+                try:
+                    index, start, end = queue.get_nowait()
+
+                except Empty:
+                    return
+
+                self.download_segment(index, start, end)
+
+        except Exception as error:
+            self.errors.append(error)
+            self.failed.set()
+
+    def download(self) -> Path:
+        """Download the file, resuming a previous attempt if possible.
+
+        Returns:
+            Path: The path to the downloaded file.
+        """
+
+        with active_downloads_lock:
+            lock, users = active_downloads.get(self.partial, (Lock(), 0))
+            active_downloads[self.partial] = (lock, users + 1)
+
+        try:
+            with lock:  # Two jobs downloading the same stream must not write the same partial file
+                return self.run()
+
+        finally:
+            with active_downloads_lock:
+                lock, users = active_downloads.pop(self.partial)
+
+                if users > 1:  # Still awaited by another download of the same file
+                    active_downloads[self.partial] = (lock, users - 1)
+
+    def run(self) -> Path:
+
+        if not self.size:
+            self.size = self.fetch_size()
+
+        self.load_state()
+        self.preallocate()
+        queue: SimpleQueue = SimpleQueue()
+
+        for segment in self.segments():
+            if segment[0] not in self.completed:
+                queue.put(segment)
+
+        workers: list[Thread] = [
+            Thread(target=self.worker, args=(queue,), daemon=True)
+            for _ in range(min(self.connections, max(queue.qsize(), 1)))
+        ]
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        os.replace(self.partial, self.destination)
+        self.state_file.unlink(missing_ok=True)
+        return self.destination
+
+
+def download(url: str, destination: Path, size: int = 0, **options) -> Path:
+    """Download a URL into a file using parallel Range requests, resuming any previous attempt.
+
+    Args:
+        url (str): The URL of the file.
+        destination (Path): The path of the file to create.
+        size (int): The size of the file in bytes, asked to the server if 0, that of the part if an offset is given.
+        **options: Any other argument of SegmentedDownloader.
+
+    Returns:
+        Path: The path to the downloaded file.
+    """
+
+    return SegmentedDownloader(url=url, destination=destination, size=size, **options).download()
@@ -0,0 +1,446 @@
+"""
+This module drives ffmpeg directly, without decoding the audio into Python objects first.
+Audio is either encoded to MP3 or, for the "original quality" option, copied as is into
+a container that can be tagged. Streamed input is piped into ffmpeg as it arrives,
+so the output file is written progressively and memory use does not depend on
+the length of the track. Tags and the album cover are written by the same ffmpeg pass,
+so the output file does not have to be rewritten afterwards to be tagged.
+Audio that is processed in Python (see packages.logic.loudness), or encoded in several
+bitrates, goes through ffmpeg twice: decoded to raw PCM blocks first, then encoded from them.
+"""
+
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from queue import Queue
+from tempfile import TemporaryFile
+from threading import Thread
+from typing import Callable, IO, Iterable, Iterator, Mapping
+
+from packages.constants import constants
+
+
+class EncoderError(Exception):
+    """Raised when ffmpeg fails or exits before all the data could be encoded."""
+
+    def __init__(self, message: str):
+
+        super().__init__(message)
+
+
+def output_suffix(quality: str, codec: str | None) -> str:
+    """Get the extension of the file produced for the given quality.
+
+    Args:
+        quality (str): A bitrate such as "192k", or constants.ORIGINAL_QUALITY.
+        codec (str | None): The audio codec of the source stream, e.g. "mp4a.40.2" or "opus".
+
+    Returns:
+        str: The extension of the output file.
+    """
+
+    if quality != constants.ORIGINAL_QUALITY:
+        return ".mp3"
+
+    return ".opus" if codec and codec.startswith("opus") else ".m4a"
+
+
+METADATA_KEYS: dict = {
+    "title": "title",
+    "artist": "artist",
+    "album": "album",
+    "year": "date",
+    "genre": "genre",
+    "copyright": "copyright",
+    "disc_number": "disc",
+    "track_number": "track",
+    "comment": "comment",
+    "replaygain_track_gain": "REPLAYGAIN_TRACK_GAIN",
+    "replaygain_track_peak": "REPLAYGAIN_TRACK_PEAK"
+}
+COVER_SUFFIXES: set = {".mp3", ".m4a"}  # The Ogg muxer of ffmpeg cannot embed pictures
+FREEFORM_KEYS: set = {"replaygain_track_gain", "replaygain_track_peak"}  # Dropped by the MP4 muxer of ffmpeg
+PCM_ARGUMENTS: list[str] = ["-f", "f32le", "-ac", "2", "-ar", str(constants.PCM_RATE)]
+
+
+def audio_arguments(quality: str) -> list[str]:
+    """Get the ffmpeg arguments producing the given quality.
+
+    Args:
+        quality (str): A bitrate such as "192k", or constants.ORIGINAL_QUALITY to copy the stream.
+
+    Returns:
+        list[str]: The output arguments.
+    """
+
+    if quality == constants.ORIGINAL_QUALITY:
+        return ["-codec:a", "copy"]
+
+    return ["-codec:a", "libmp3lame", "-b:a", quality]
+
+
+def embeds_cover(destination: Path) -> bool:
+    """Check if ffmpeg can embed an album cover in the given output file.
+
+    Args:
+        destination (Path): The path of the file to create.
+
+    Returns:
+        bool: True if the cover can be written while encoding; False if it must be added afterwards.
+    """
+
+    return destination.suffix.lower() in COVER_SUFFIXES
+
+
+def embeds_tags(destination: Path, metadata: Mapping | None, cover: bytes | None) -> bool:
+    """Check if ffmpeg writes every given tag in the given output file, the album cover included.
+
+    Args:
+        destination (Path): The path of the file to create.
+        metadata (Mapping | None): The tags to write.
+        cover (bytes | None): The album cover in PNG or JPEG format.
+
+    Returns:
+        bool: True if the file is complete once encoded; False if it must be tagged afterwards.
+    """
+
+    if cover and not embeds_cover(destination):
+        return False
+
+    return destination.suffix.lower() != ".m4a" or not any(metadata and metadata.get(key) for key in FREEFORM_KEYS)
+
+
+def tag_arguments(metadata: Mapping | None, cover: bool) -> list[str]:
+    """Get the ffmpeg arguments mapping the streams and writing the tags. The tags of the
+    source are dropped, so YouTube's own container metadata does not end up in the file.
+
+    Args:
+        metadata (Mapping | None): The tags entered by the user.
+        cover (bool): Whether the album cover is given as the second input.
+
+    Returns:
+        list[str]: The output arguments.
+    """
+
+    arguments: list[str] = ["-map", "0:a", "-map_metadata", "-1"]
+
+    if cover:
+        arguments += [
+            "-map", "1:v", "-codec:v", "copy", "-disposition:v", "attached_pic",
+            "-metadata:s:v", "title=Cover", "-metadata:s:v", "comment=Cover (front)"
+        ]
+
+    for key, name in METADATA_KEYS.items():
+        if metadata and metadata.get(key):
+            arguments += ["-metadata", f"{name}={metadata[key]}"]
+
+    return arguments
+
+
+@contextmanager
+def cover_file(cover: bytes | None, destination: Path) -> Iterator[Path | None]:
+    """Write the cover next to the output file for the time of the encoding, as ffmpeg
+    can only read one input from its standard input and that one is used by the audio.
+
+    Args:
+        cover (bytes | None): The album cover in PNG or JPEG format.
+        destination (Path): The path of the file being created.
+
+    Yields:
+        Path | None: The path to the cover, None if there is no cover or it cannot be embedded.
+    """
+
+    if not cover or not embeds_cover(destination):
+        yield None
+        return
+
+    extension: str = ".jpg" if cover.startswith(b"\xff\xd8") else ".png"
+    path: Path = destination.with_name(f"{destination.stem}.cover{extension}")
+    path.write_bytes(cover)
+
+    try:
+        yield path
+
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def read_progress(output: IO[bytes], on_progress: Callable[[float], None]) -> None:
+    """Parse the "-progress" reports of ffmpeg, until it closes its output.
+
+    Args:
+        output (IO[bytes]): The standard output of ffmpeg.
+        on_progress (Callable[[float], None]): Called with the number of seconds of audio encoded so far.
+    """
+
+    for line in output:
+        key, _, value = line.partition(b"=")
+
+        if key == b"out_time_us" and value.strip().isdigit():
+            on_progress(int(value) / 1_000_000)
+
+
+def run_ffmpeg(source: str, destination: Path, arguments: list[str], chunks: Iterable[bytes] | None = None,
+               extra_inputs: Iterable[str] = (), on_progress: Callable[[float], None] | None = None,
+               input_arguments: Iterable[str] = ()) -> Path:
+    """Run ffmpeg, feeding it the given chunks if the source is a pipe.
+
+    Args:
+        source (str): The input of ffmpeg, a file path or "pipe:0".
+        destination (Path): The path of the file to create.
+        arguments (list[str]): The output arguments.
+        chunks (Iterable[bytes] | None): The content to write to ffmpeg's standard input.
+        extra_inputs (Iterable[str]): Paths to further inputs, such as the album cover.
+        on_progress (Callable[[float], None] | None): Called from another thread with the number
+            of seconds of audio encoded so far, about twice a second.
+        input_arguments (Iterable[str]): Options describing the source, such as the format of raw PCM.
+
+    Returns:
+        Path: The path to the created file.
+    """
+
+    command: list[str] = [
+        constants.FFMPEG, "-hide_banner", "-loglevel", "error", "-xerror", "-y",
+        *(["-nostats", "-progress", "pipe:1"] if on_progress else []),
+        *input_arguments, "-i", source,
+        *(argument for path in extra_inputs for argument in ("-i", path)),
+        *arguments,
+        str(destination)
+    ]
+
+    with TemporaryFile() as errors:
+        stdin = subprocess.PIPE if chunks is not None else subprocess.DEVNULL
+        stdout = subprocess.PIPE if on_progress else subprocess.DEVNULL
+        process = subprocess.Popen(command, stdin=stdin, stdout=stdout, stderr=errors)
+        reader: Thread | None = None
+
+        if on_progress:
+            reader = Thread(target=read_progress, args=(process.stdout, on_progress), daemon=True)
+            reader.start()
+
+        if chunks is not None:
+            try:
+                for chunk in chunks:
+                    process.stdin.write(chunk)
+
+            except BrokenPipeError:
+                pass  # ffmpeg gave up, its exit code and messages tell why
+
+            except BaseException:
+                process.kill()
+                process.wait()
+                destination.unlink(missing_ok=True)
+                raise
+
+            finally:
+                try:
+                    process.stdin.close()
+
+                except BrokenPipeError:
+                    pass
+
+        exit_code: int = process.wait()
+
+        if reader is not None:
+            reader.join()
+            process.stdout.close()
+
+        if exit_code != 0:
+            errors.seek(0)
+            destination.unlink(missing_ok=True)
+            raise EncoderError(errors.read().decode(errors="replace").strip() or "ffmpeg failed.")
+
+    return destination
+
+
+def encode_stream(chunks: Iterable[bytes], destination: Path, quality: str, metadata: Mapping | None = None,
+                  cover: bytes | None = None, on_progress: Callable[[float], None] | None = None) -> Path:
+    """Encode (or copy) an audio stream while it is being received, tagging it at the same time.
+
+    Args:
+        chunks (Iterable[bytes]): The content of the source stream, in any container ffmpeg can read from a pipe.
+        destination (Path): The path of the file to create.
+        quality (str): A bitrate such as "192k", or constants.ORIGINAL_QUALITY.
+        metadata (Mapping | None): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format, ignored if embeds_cover is False.
+        on_progress (Callable[[float], None] | None): Called with the number of seconds of audio encoded so far.
+
+    Returns:
+        Path: The path to the created file.
+    """
+
+    with cover_file(cover, destination) as picture:
+        arguments: list[str] = [*tag_arguments(metadata, picture is not None), *audio_arguments(quality)]
+        inputs: list[str] = [str(picture)] if picture else []
+        return run_ffmpeg("pipe:0", destination, arguments, chunks=chunks, extra_inputs=inputs,
+                          on_progress=on_progress)
+
+
+def transcode(source: Path, destination: Path, quality: str, metadata: Mapping | None = None,
+              cover: bytes | None = None, on_progress: Callable[[float], None] | None = None) -> Path:
+    """Encode (or copy) and tag an audio file in a single ffmpeg pass.
+
+    Args:
+        source (Path): The path to the downloaded audio file.
+        destination (Path): The path of the file to create.
+        quality (str): A bitrate such as "192k", or constants.ORIGINAL_QUALITY.
+        metadata (Mapping | None): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format, ignored if embeds_cover is False.
+        on_progress (Callable[[float], None] | None): Called with the number of seconds of audio encoded so far.
+
+    Returns:
+        Path: The path to the created file.
+    """
+
+    with cover_file(cover, destination) as picture:
+        arguments: list[str] = [*tag_arguments(metadata, picture is not None), *audio_arguments(quality)]
+        inputs: list[str] = [str(picture)] if picture else []
+        return run_ffmpeg(str(source), destination, arguments, extra_inputs=inputs, on_progress=on_progress)
+
+
+def cut(source: Path, destination: Path, start: float, duration: float | None = None) -> Path:
+    """Copy part of an audio file into a file of the same container, without re-encoding it.
+    The cut falls on the boundary of an audio frame, some 20 ms long.
+
+    Args:
+        source (Path): The path to the audio file.
+        destination (Path): The path of the file to create.
+        start (float): The second the part starts at, from the start of the file.
+        duration (float | None): The length of the part in seconds, None for the rest of the file.
+
+    Returns:
+        Path: The path to the created file.
+    """
+
+    length: list[str] = ["-t", f"{duration:.3f}"] if duration is not None else []
+    arguments: list[str] = ["-ss", f"{max(start, 0.0):.3f}", *length, "-map", "0:a:0", "-codec:a", "copy"]
+    return run_ffmpeg(str(source), destination, arguments)
+
+
+def encode_pcm(chunks: Iterable[bytes], destination: Path, quality: str, metadata: Mapping | None = None,
+               cover: bytes | None = None, on_progress: Callable[[float], None] | None = None) -> Path:
+    """Encode and tag raw PCM audio, as produced by decode_pcm, while it is being generated.
+
+    Args:
+        chunks (Iterable[bytes]): Interleaved stereo 32-bit float samples at constants.PCM_RATE.
+        destination (Path): The path of the file to create.
+        quality (str): A bitrate such as "192k", the audio cannot be copied.
+        metadata (Mapping | None): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format, ignored if embeds_cover is False.
+        on_progress (Callable[[float], None] | None): Called with the number of seconds of audio encoded so far.
+
+    Returns:
+        Path: The path to the created file.
+    """
+
+    with cover_file(cover, destination) as picture:
+        arguments: list[str] = [*tag_arguments(metadata, picture is not None), *audio_arguments(quality)]
+        inputs: list[str] = [str(picture)] if picture else []
+        return run_ffmpeg("pipe:0", destination, arguments, chunks=chunks, extra_inputs=inputs,
+                          on_progress=on_progress, input_arguments=PCM_ARGUMENTS)
+
+
+def encode_many(chunks: Iterable[bytes], destinations: Mapping[str, Path], metadata: Mapping | None = None,
+                cover: bytes | None = None, on_progress: Callable[[float], None] | None = None) -> dict[str, Path]:
+    """Encode and tag the same raw PCM audio in several bitrates at once. Each block is handed to one
+    ffmpeg process per bitrate through a short queue, so the encoders run in parallel on separate
+    cores while the audio is only decoded once, and memory use is bounded by the queues.
+
+    Args:
+        chunks (Iterable[bytes]): Interleaved stereo 32-bit float samples at constants.PCM_RATE.
+        destinations (Mapping[str, Path]): The path of the file to create for each bitrate, such as "192k".
+        metadata (Mapping | None): The tags entered by the user, the same for every file.
+        cover (bytes | None): The album cover in PNG or JPEG format, ignored if embeds_cover is False.
+        on_progress (Callable[[float], None] | None): Called with the number of seconds of audio
+            encoded so far in the first bitrate.
+
+    Returns:
+        dict[str, Path]: The paths to the created files.
+    """
+
+    queues: dict[str, Queue] = {quality: Queue(maxsize=4) for quality in destinations}
+    errors: list[BaseException] = []
+
+    def encode(quality: str, reporter: Callable[[float], None] | None) -> None:
+
+        blocks: Iterator[bytes] = iter(queues[quality].get, None)
+
+        try:
+            encode_pcm(blocks, destinations[quality], quality, metadata, cover, reporter)
+
+        except BaseException as error:
+            errors.append(error)
+
+            for _ in blocks:  # Keeps taking blocks so the other encoders are not held up
+                pass
+
+    threads: list[Thread] = [
+        Thread(target=encode, args=(quality, on_progress if index == 0 else None), daemon=True)
+        for index, quality in enumerate(destinations)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        for chunk in chunks:
+            for queue in queues.values():
+                queue.put(chunk)
+
+    except BaseException as error:
+        errors.append(error)
+
+    finally:
+        for queue in queues.values():
+            queue.put(None)
+
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        for path in destinations.values():
+            path.unlink(missing_ok=True)
+
+        raise errors[0]
+
+    return dict(destinations)
+
+
+def decode_pcm(source: Path, block_frames: int = constants.PCM_BLOCK_FRAMES, rate: int = constants.PCM_RATE,
+               channels: int = 2) -> Iterator[bytes]:
+    """Decode an audio file into raw PCM blocks of a fixed size, so memory use does not depend
+    on the length of the track.
+
+    Args:
+        source (Path): The path to the audio file.
+        block_frames (int): The number of frames (one sample per channel) of each block, the last one being shorter.
+        rate (int): The sample rate, ffmpeg resampling the audio if needed.
+        channels (int): The number of channels, ffmpeg mixing the audio down or up if needed.
+
+    Yields:
+        bytes: Interleaved 32-bit float samples, stereo at constants.PCM_RATE by default.
+    """
+
+    command: list[str] = [
+        constants.FFMPEG, "-hide_banner", "-loglevel", "error", "-xerror", "-i", str(source), "-map", "0:a:0",
+        "-f", "f32le", "-ac", str(channels), "-ar", str(rate), "pipe:1"
+    ]
+
+    with TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=errors)
+
+        try:
+            while block := process.stdout.read(block_frames * channels * 4):
+                yield block
+
+        except BaseException:  # The consumer stopped early, or failed
+            process.kill()
+            raise
+
+        finally:
+            process.stdout.close()
+            exit_code: int = process.wait()
+
+        if exit_code != 0:
+            errors.seek(0)
+            raise EncoderError(errors.read().decode(errors="replace").strip() or "ffmpeg failed.")
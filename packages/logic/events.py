@@ -0,0 +1,75 @@
+"""
+This module provides the Event class, a minimal Qt-free counterpart of Signal.
+It lets the processing core report progress without depending on PySide6,
+the GUI simply forwarding events to real signals.
+"""
+
+from threading import Lock
+from typing import Callable
+
+
+class Event:
+    """
+    A list of callbacks called, in the emitting thread, every time the event is emitted.
+
+    Like Signal, it is meant to be declared as a class attribute: each instance then gets
+    its own list of callbacks, so connecting to one job's event does not affect another job.
+    """
+
+    def __init__(self):
+
+        self.name: str = ""
+
+    def __set_name__(self, owner, name: str):
+
+        self.name = f"_{name}_callbacks"
+
+    def __get__(self, instance, owner=None):
+
+        if instance is None:
+            return self
+
+        bound: BoundEvent | None = instance.__dict__.get(self.name)
+
+        if bound is None:
+            bound = instance.__dict__.setdefault(self.name, BoundEvent())
+
+        return bound
+
+
+class BoundEvent:
+    """The event of a given instance, holding its callbacks."""
+
+    def __init__(self):
+
+        self.callbacks: list[Callable] = []
+        self.lock = Lock()
+
+    def connect(self, callback: Callable) -> None:
+        """Call the given function every time the event is emitted.
+
+        Args:
+            callback (Callable): The function, receiving the arguments given to emit.
+        """
+
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def disconnect(self, callback: Callable) -> None:
+        """Stop calling the given function.
+
+        Args:
+            callback (Callable): A function previously connected.
+        """
+
+        with self.lock:
+            self.callbacks.remove(callback)
+
+    def emit(self, *args) -> None:
+        """Call every connected function with the given arguments."""
+
+        with self.lock:
+            callbacks: list[Callable] = list(self.callbacks)
+
+        for callback in callbacks:
+            callback(*args)
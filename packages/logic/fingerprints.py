@@ -0,0 +1,348 @@
+"""
+This module recognises the same recording across different uploads (lyric videos, re-uploads,
+remasters), which have nothing in common but their audio. Tracks are fingerprinted with NumPy the
+way landmark-based audio identification does it:
+    - the audio is decoded to mono at constants.FINGERPRINT_RATE, and its spectrogram is computed
+      block by block (short-time Fourier transform), so memory use does not depend on its length;
+    - the loudest frequency of each band of each frame is kept when it is a peak in time, and louder
+      than the band usually is;
+    - each peak is grouped with two of the next few ones, and every group is hashed from the frequencies
+      of its three peaks and the times between them, which neither the level, the codec nor the start
+      of the upload change. Groups of three make hashes much rarer than pairs would, which keeps the
+      number of candidates of a lookup low as the library grows.
+
+The FingerprintIndex class stores the hashes in an SQLite inverted index, clustered by hash, so a
+track is looked up with one index search per hash, whatever the size of the library. Two tracks are
+the same recording when many of their hashes match at the same time offset.
+"""
+
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+
+from packages.constants import constants
+from packages.logic import encoding
+
+
+WINDOW: int = 1024  # 128 ms, 7.8 Hz per frequency bin
+HOP: int = 512
+BANDS: tuple = (10, 20, 40, 80, 160, 320, 513)  # Frequency bins delimiting the bands, an octave each up to 2.5 kHz
+FAN_OUT: int = 5  # Number of later peaks each peak is grouped with, two at a time
+MAX_DELTA: int = 63  # Frames, about 4 seconds
+AUDIO_SUFFIXES: tuple = (".mp3", ".m4a", ".opus", ".ogg", ".webm", ".flac", ".wav")
+OFFSET_BIAS: int = 1 << 31  # Keeps time offsets positive, so that SQLite rounds them down
+
+
+class Fingerprint(NamedTuple):
+    """The hashes of a track and the frame each one starts at, in the same order, and its duration in seconds."""
+
+    hashes: np.ndarray
+    times: np.ndarray
+    duration: float
+
+
+class FingerprintMatch(NamedTuple):
+    """A track of the library with the same recording: its path, the share of the hashes that matched,
+    and how many seconds later the recording starts in it."""
+
+    path: Path
+    score: float
+    offset: float
+
+
+def band_peaks(blocks: Iterable[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Get the loudest frequency of each band of each frame of a track, computing its spectrogram block by block.
+
+    Args:
+        blocks (Iterable[np.ndarray]): The mono samples of the track, in consecutive blocks.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The log magnitude and the frequency bin of each peak, of shape (frames, bands).
+    """
+
+    window: np.ndarray = np.hanning(WINDOW).astype(np.float32)
+    pending: np.ndarray = np.zeros(0, dtype=np.float32)
+    levels: list[np.ndarray] = []
+    bins: list[np.ndarray] = []
+
+    for block in blocks:
+        samples: np.ndarray = np.concatenate((pending, block))
+        count: int = (len(samples) - WINDOW) // HOP + 1 if len(samples) >= WINDOW else 0
+        pending = samples[count * HOP:]
+
+        if not count:
+            continue
+
+        frames: np.ndarray = np.lib.stride_tricks.sliding_window_view(samples, WINDOW)[::HOP][:count]
+        spectrum: np.ndarray = np.abs(np.fft.rfft(frames * window, axis=1))
+        loudest: np.ndarray = np.stack([spectrum[:, low:high].argmax(axis=1) + low
+                                        for low, high in zip(BANDS, BANDS[1:])], axis=1)
+        levels.append(np.log(np.take_along_axis(spectrum, loudest, axis=1) + 1e-6))
+        bins.append(loudest)
+
+    if not levels:
+        return np.zeros((0, len(BANDS) - 1)), np.zeros((0, len(BANDS) - 1), dtype=np.int64)
+
+    return np.concatenate(levels), np.concatenate(bins)
+
+
+def hash_peaks(levels: np.ndarray, bins: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pick the peaks of a track and hash them in groups of three, see the module documentation.
+
+    Args:
+        levels (np.ndarray): The log magnitude of the loudest frequency of each band of each frame.
+        bins (np.ndarray): Those frequencies, as bins of the spectrum.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The hashes, and the frame of the first peak of each one.
+    """
+
+    if len(levels) < 3:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    middle: np.ndarray = levels[1:-1]
+    peaks: np.ndarray = np.zeros(levels.shape, dtype=bool)
+    peaks[1:-1] = (middle > levels[:-2]) & (middle >= levels[2:]) & (middle > levels.mean(axis=0))
+    times, bands = np.nonzero(peaks)  # Sorted by time
+    frequencies: np.ndarray = bins[times, bands].astype(np.int64)
+    hashes: list[np.ndarray] = []
+    starts: list[np.ndarray] = []
+
+    for second, third in combinations(range(1, FAN_OUT + 1), 2):
+        anchors: int = len(times) - third
+
+        if anchors <= 0:
+            continue
+
+        first_delta: np.ndarray = times[second:second + anchors] - times[:anchors]
+        second_delta: np.ndarray = times[third:third + anchors] - times[:anchors]
+        kept: np.ndarray = (first_delta > 0) & (second_delta > first_delta) & (second_delta <= MAX_DELTA)
+        group: tuple = (frequencies[:anchors], frequencies[second:second + anchors], frequencies[third:third + anchors])
+        hashes.append((group[0][kept] << 32) | (group[1][kept] << 22) | (group[2][kept] << 12)
+                      | (first_delta[kept] << 6) | second_delta[kept])  # 10 bits per frequency, 6 per time
+        starts.append(times[:anchors][kept])
+
+    if not hashes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    return np.concatenate(hashes), np.concatenate(starts)
+
+
+def fingerprint_file(source: Path) -> Fingerprint:
+    """Fingerprint an audio file.
+
+    Args:
+        source (Path): The path to the audio file.
+
+    Raises:
+        EncoderError: If ffmpeg cannot decode the file.
+
+    Returns:
+        Fingerprint: Its hashes.
+    """
+
+    chunks: Iterator[bytes] = encoding.decode_pcm(source, block_frames=constants.FINGERPRINT_RATE * 10,
+                                                  rate=constants.FINGERPRINT_RATE, channels=1)
+    levels, bins = band_peaks(np.frombuffer(chunk, dtype=np.float32) for chunk in chunks)
+    hashes, times = hash_peaks(levels, bins)
+    return Fingerprint(hashes=hashes, times=times, duration=(len(levels) * HOP + WINDOW) / constants.FINGERPRINT_RATE)
+
+
+def read_fingerprint(source: Path) -> Fingerprint | None:
+    """Fingerprint an audio file, returning None if it cannot be decoded. Run in worker processes by scan."""
+
+    try:
+        return fingerprint_file(source)
+
+    except (encoding.EncoderError, OSError):
+        return None
+
+
+class FingerprintIndex:
+    """
+    Persistent inverted index of the fingerprints of the library, see the module documentation.
+
+    The hashes of a track are kept in a table clustered by hash, the tracks in another one with the size and
+    modification time of their file, so that scan only fingerprints the files that are new or changed.
+    Tracks whose file is gone are dropped with their hashes when they are matched or scanned, and the number
+    of a dropped track is never given to a new one, so no hash can be mistaken for one of another track.
+    """
+
+    def __init__(self, path: Path | str = constants.FINGERPRINTS, min_matches: int = constants.FINGERPRINT_MIN_MATCHES,
+                 threshold: float = constants.FINGERPRINT_THRESHOLD):
+
+        if isinstance(path, Path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.min_matches: int = min_matches
+        self.threshold: float = threshold
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tracks (track INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "path TEXT UNIQUE, size INTEGER, mtime INTEGER, duration REAL, hashes INTEGER)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes (hash INTEGER, track INTEGER, time INTEGER, "
+            "PRIMARY KEY (hash, track, time)) WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE TEMP TABLE query (hash INTEGER, time INTEGER)")
+        self.connection.commit()
+
+    def add(self, path: Path, fingerprint: Fingerprint) -> None:
+        """Add a track to the index, replacing the previous fingerprint of the same file.
+
+        Args:
+            path (Path): The path to the audio file.
+            fingerprint (Fingerprint): Its fingerprint.
+        """
+
+        path = path.absolute()
+        stat: os.stat_result = path.stat()
+        rows: Iterator[tuple] = zip(fingerprint.hashes.tolist(), fingerprint.times.tolist())
+
+        with self.lock:
+            self.delete(path)
+            track: int = self.connection.execute(
+                "INSERT INTO tracks (path, size, mtime, duration, hashes) VALUES (?, ?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, fingerprint.duration, len(fingerprint.hashes))
+            ).lastrowid
+            self.connection.executemany("INSERT OR IGNORE INTO hashes VALUES (?, ?, ?)",
+                                        ((value, track, start) for value, start in rows))
+            self.connection.commit()
+
+    def match(self, fingerprint: Fingerprint) -> FingerprintMatch | None:
+        """Find the track of the library with the same recording, if any.
+
+        Args:
+            fingerprint (Fingerprint): The fingerprint of the track to look up.
+
+        Returns:
+            FingerprintMatch | None: The best match, or None if no track matches well enough.
+        """
+
+        if not len(fingerprint.hashes):
+            return None
+
+        with self.lock:
+            self.connection.execute("DELETE FROM query")
+            self.connection.executemany("INSERT INTO query VALUES (?, ?)",
+                                        zip(fingerprint.hashes.tolist(), fingerprint.times.tolist()))
+            # Offsets are counted in pairs of frames, as the frames of two uploads rarely line up exactly
+            rows: list[tuple] = self.connection.execute(
+                "SELECT tracks.path, votes, offset FROM ("
+                "SELECT hashes.track, (hashes.time - query.time + ?) / 2 AS offset, COUNT(*) AS votes "
+                "FROM query JOIN hashes ON hashes.hash = query.hash GROUP BY hashes.track, offset "
+                "HAVING votes >= ? ORDER BY votes DESC LIMIT 8"
+                ") AS candidates JOIN tracks ON tracks.track = candidates.track ORDER BY votes DESC",
+                (OFFSET_BIAS, self.min_matches)
+            ).fetchall()
+
+        for path, votes, offset in rows:
+            if votes < self.threshold * len(fingerprint.hashes):
+                break
+
+            if not os.path.isfile(path):
+                self.forget(Path(path))
+                continue
+
+            seconds: float = (offset * 2 - OFFSET_BIAS) * HOP / constants.FINGERPRINT_RATE
+            return FingerprintMatch(path=Path(path), score=votes / len(fingerprint.hashes), offset=seconds)
+
+        return None
+
+    def forget(self, path: Path) -> None:
+        """Remove a track and its hashes from the index."""
+
+        with self.lock:
+            self.delete(path.absolute())
+            self.connection.commit()
+
+    def delete(self, path: Path) -> None:
+        """Delete the track of a file and its hashes, if it is indexed, the lock being held by the caller.
+        The hashes are clustered by hash, so deleting those of a track reads the whole table: it is only done
+        for files that are indexed, never when a new file is added."""
+
+        row: tuple | None = self.connection.execute("SELECT track FROM tracks WHERE path = ?", (str(path),)).fetchone()
+
+        if row is not None:
+            self.connection.execute("DELETE FROM hashes WHERE track = ?", row)
+            self.connection.execute("DELETE FROM tracks WHERE track = ?", row)
+
+    def scan(self, folder: Path, workers: int = constants.CPU_WORKERS) -> dict:
+        """Index the audio files of a folder and its subfolders on a pool of processes, the files being
+        decoded by ffmpeg and analysed with NumPy in parallel. Unchanged files are not fingerprinted again,
+        hidden files (the partial outputs of running jobs) are ignored, and tracks whose file is gone are dropped.
+
+        Args:
+            folder (Path): The folder to scan, usually the output folder.
+            workers (int): The number of worker processes.
+
+        Returns:
+            dict: The number of files "indexed" and "unchanged", and the number of tracks "removed".
+        """
+
+        with self.lock:
+            known: dict[str, tuple] = {
+                path: (size, mtime) for path, size, mtime in self.connection.execute(
+                    "SELECT path, size, mtime FROM tracks"
+                )
+            }
+
+        removed: int = 0
+
+        for path in known:
+            if not os.path.isfile(path):
+                self.forget(Path(path))
+                removed += 1
+
+        if removed:  # Indexes written before forget deleted the hashes may still hold some without a track
+            with self.lock:
+                self.connection.execute("DELETE FROM hashes WHERE track NOT IN (SELECT track FROM tracks)")
+                self.connection.commit()
+
+        paths: list[Path] = []
+        unchanged: int = 0
+
+        for path in folder.absolute().rglob("*"):
+            if path.suffix.lower() not in AUDIO_SUFFIXES or path.name.startswith(".") or not path.is_file():
+                continue
+
+            stat: os.stat_result = path.stat()
+
+            if known.get(str(path)) == (stat.st_size, stat.st_mtime_ns):
+                unchanged += 1
+
+            else:
+                paths.append(path)
+
+        indexed: int = 0
+
+        with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+            for path, fingerprint in zip(paths, executor.map(read_fingerprint, paths, chunksize=4)):
+                if fingerprint is not None:
+                    self.add(path, fingerprint)
+                    indexed += 1
+
+        return {"indexed": indexed, "unchanged": unchanged, "removed": removed}
+
+    def stats(self) -> dict:
+        """Get the number of tracks and hashes of the index."""
+
+        with self.lock:
+            tracks, hashes = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(hashes), 0) FROM tracks").fetchone()
+
+        return {"tracks": tracks, "hashes": hashes}
+
+    def close(self) -> None:
+        """Close the underlying database."""
+
+        with self.lock:
+            self.connection.close()
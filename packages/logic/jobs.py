@@ -0,0 +1,86 @@
+"""
+This module provides the Job class, an immutable description of a single
+download request, and the JobStatus enumeration used to report its progress.
+Nothing in here depends on Qt, so jobs can be built and passed between threads freely.
+"""
+
+from dataclasses import dataclass, field
+from enum import Enum
+from itertools import count
+from types import MappingProxyType
+from typing import Mapping
+
+
+_job_ids = count(1)
+
+
+class JobStatus(Enum):
+    """The stages a job goes through, in order, plus the two terminal states."""
+
+    QUEUED = "queued"
+    DOWNLOADING = "downloading"
+    CONVERTING = "converting"
+    TAGGING = "tagging"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class Job:
+    """
+    An immutable download request.
+
+    Once created, neither the link, the tags nor the quality of a job can change,
+    which allows several jobs to be processed at the same time without racing each other.
+    Streaming jobs encode the audio while it is being downloaded instead of saving it first.
+    Normalised jobs have their loudness levelled and their leading and trailing silences trimmed,
+    the audio being read twice for that, so they are never streamed. Jobs with variants produce
+    the same track in further qualities from a single decoding, each quality in a folder of its own,
+    and are not streamed either. Jobs skipping duplicates end without producing anything when their
+    audio turns out to be a track of the library already, see packages.logic.fingerprints.
+    Clipped jobs only keep the audio between their start and end times (in seconds, the end being
+    None for the end of the video), and only download that part of it, see packages.logic.clips.
+    They are not streamed either, and not archived, as the file does not hold the whole video.
+    """
+
+    youtube_link: str
+    metadata: Mapping = field(default_factory=dict)
+    quality: str = "192k"
+    streaming: bool = True
+    normalize: bool = False
+    variants: tuple[str, ...] = ()
+    skip_duplicates: bool = False
+    start: float = 0.0
+    end: float | None = None
+    job_id: int = field(default_factory=lambda: next(_job_ids))
+
+    def __post_init__(self):
+
+        object.__setattr__(self, "metadata", MappingProxyType(dict(self.metadata)))
+        object.__setattr__(self, "variants", tuple(
+            quality for quality in dict.fromkeys(self.variants) if quality != self.quality
+        ))
+
+    @property
+    def streamed(self) -> bool:
+        """Whether the audio is encoded while it is being downloaded."""
+
+        return self.streaming and not self.normalize and not self.variants and not self.clipped
+
+    @property
+    def clipped(self) -> bool:
+        """Whether only part of the video is kept."""
+
+        return self.start > 0 or self.end is not None
+
+    @property
+    def qualities(self) -> tuple[str, ...]:
+        """Every quality the job produces, its main quality first."""
+
+        return self.quality, *self.variants
+
+    @property
+    def cover(self) -> bytes | None:
+        """The album cover in PNG or JPEG format, if one was provided."""
+
+        return self.metadata.get("cover")
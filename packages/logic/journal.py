@@ -0,0 +1,314 @@
+"""
+This module provides the Journal class, a persistent SQLite record of the jobs in progress.
+Every job is written down when it is submitted, then each stage it completes (resolved, downloaded,
+encoded, tagged, finalised) is recorded along with the files it produced, their size and their
+SHA-256 hash, the files being flushed to disk first. A job ends its life in the journal when it
+succeeds or fails, so whatever is left in it was interrupted: the application or the machine
+stopped while it was running.
+
+Each session of the application keeps a heartbeat in the journal, so that the jobs of a session that
+is still running are never taken for interrupted ones. Interrupted jobs are claimed by the next
+session, and picked up from the last stage whose files are still intact (see JobRunner.resume)
+instead of being downloaded and encoded again.
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import fields
+from pathlib import Path
+from sqlite3 import Error as DatabaseError
+from threading import Event, Lock, Thread
+from time import time
+from typing import Iterator, NamedTuple
+from uuid import uuid4
+
+from packages.constants import constants
+from packages.logic.jobs import Job
+from packages.logic.toolkit import file_digest
+
+
+STAGES: tuple = ("resolved", "downloaded", "encoded", "tagged", "finalised")
+
+
+class Checkpoint(NamedTuple):
+    """A stage completed by a job: the files it produced, keyed by role or quality,
+    and what the later stages need to know about the earlier ones, see Pipeline.state."""
+
+    stage: str
+    files: dict[str, Path]
+    state: dict
+
+
+class Artefact(NamedTuple):
+    """A file produced by a stage, as it was when the stage completed."""
+
+    path: Path
+    size: int
+    digest: str
+
+    def intact(self) -> bool:
+        """Check that the file still exists, unchanged."""
+
+        try:
+            return self.path.stat().st_size == self.size and file_digest(self.path) == self.digest
+
+        except OSError:
+            return False
+
+
+class JournalEntry(NamedTuple):
+    """A job of the journal, with the last stage it completed and the files of each completed stage."""
+
+    entry_id: int
+    job: Job
+    output_directory: Path
+    stage: str | None
+    state: dict
+    artefacts: dict[str, dict[str, Artefact]]
+
+    def resume_point(self) -> tuple[str | None, dict[str, Path]]:
+        """Get the last completed stage whose files are all intact. Resolving the video again is
+        needed anyway, the links of its streams expiring, so "resolved" is never resumed from.
+
+        Returns:
+            tuple[str | None, dict[str, Path]]: The stage and its files, or None and nothing if the job starts over.
+        """
+
+        for stage in reversed(STAGES[1:STAGES.index(self.stage) + 1] if self.stage else ()):
+            artefacts: dict[str, Artefact] = self.artefacts.get(stage, {})
+
+            if artefacts and all(artefact.intact() for artefact in artefacts.values()):
+                return stage, {name: artefact.path for name, artefact in artefacts.items()}
+
+        return None, {}
+
+    def obsolete(self, stage: str | None) -> list[Path]:
+        """Get the files of the stages before the given one that it no longer needs,
+        such as a download whose conversion was recorded just before it could be deleted."""
+
+        kept: set[Path] = {artefact.path for artefact in self.artefacts.get(stage, {}).values()}
+        earlier: tuple = STAGES[:STAGES.index(stage)] if stage else ()
+        return [artefact.path for name in earlier for artefact in self.artefacts.get(name, {}).values()
+                if artefact.path not in kept]
+
+
+def job_record(job: Job) -> str:
+    """Serialise a job, its cover aside, as JSON."""
+
+    record: dict = {field.name: getattr(job, field.name) for field in fields(job) if field.name != "job_id"}
+    record["metadata"] = {key: value for key, value in job.metadata.items() if key != "cover"}
+    return json.dumps(record)
+
+
+def restore_job(record: str, cover: bytes | None) -> Job:
+    """Rebuild a job serialised by job_record. It gets a new ID, job IDs only being unique within a session."""
+
+    data: dict = json.loads(record)
+    data["metadata"] = {**data["metadata"], "cover": cover}
+    data["variants"] = tuple(data.get("variants", ()))
+    return Job(**data)
+
+
+class Journal:
+    """
+    Persistent record of the jobs in progress and of the stages they completed, see the module documentation.
+    Recording is best effort: a job never fails because the journal could not be written.
+    """
+
+    def __init__(self, path: Path | str = constants.JOURNAL, heartbeat: float = constants.JOURNAL_HEARTBEAT):
+
+        if isinstance(path, Path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.session: str = uuid4().hex
+        self.heartbeat: float = heartbeat
+        self.lock = Lock()
+        self.stopped = Event()
+        self.batches: int = 0  # Number of open batches, see batch
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")  # A recorded stage must survive a power loss
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sessions (session TEXT PRIMARY KEY, seen REAL)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "entry_id INTEGER PRIMARY KEY, session TEXT, job TEXT, cover BLOB, output_directory TEXT, "
+            "stage TEXT, state TEXT, artefacts TEXT, updated REAL)"
+        )
+        self.connection.commit()
+        self.beat()
+        Thread(target=self.keep_alive, name="journal", daemon=True).start()
+
+    def beat(self) -> None:
+        """Record that the session is still running."""
+
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?)", (self.session, time()))
+            self.connection.commit()
+
+    def keep_alive(self) -> None:
+
+        while not self.stopped.wait(self.heartbeat):
+            try:
+                self.beat()
+
+            except DatabaseError:
+                pass
+
+    def start(self, job: Job, output_directory: Path) -> int | None:
+        """Write down a newly submitted job.
+
+        Args:
+            job (Job): The job.
+            output_directory (Path): The folder its files are written to.
+
+        Returns:
+            int | None: The ID of its entry, or None if it could not be written.
+        """
+
+        try:
+            with self.lock:
+                cursor: sqlite3.Cursor = self.connection.execute(
+                    "INSERT INTO jobs (session, job, cover, output_directory, state, artefacts, updated) "
+                    "VALUES (?, ?, ?, ?, '{}', '{}', ?)",
+                    (self.session, job_record(job), job.cover, str(output_directory.absolute()), time())
+                )
+
+                if not self.batches:
+                    self.connection.commit()
+
+                return cursor.lastrowid
+
+        except DatabaseError:
+            return None
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Write down the jobs started meanwhile in a single transaction, flushed to disk once when the batch
+        ends rather than once per job. The stages recorded by running jobs are still committed right away."""
+
+        with self.lock:
+            self.batches += 1
+
+        try:
+            yield
+
+        finally:
+            try:
+                with self.lock:
+                    self.batches -= 1
+
+                    if not self.batches:
+                        self.connection.commit()
+
+            except DatabaseError:
+                pass
+
+    def record(self, entry_id: int | None, checkpoint: Checkpoint) -> None:
+        """Record a stage completed by a job, once its files are safely on disk.
+
+        Args:
+            entry_id (int | None): The ID of the entry of the job.
+            checkpoint (Checkpoint): The stage and its files.
+        """
+
+        if entry_id is None:
+            return
+
+        try:
+            artefacts: dict[str, list] = {}
+
+            for name, path in checkpoint.files.items():
+                with open(path, "rb+") as file:
+                    os.fsync(file.fileno())
+
+                artefacts[name] = [str(path.absolute()), path.stat().st_size, file_digest(path)]
+
+            with self.lock:
+                row: tuple | None = self.connection.execute(
+                    "SELECT artefacts FROM jobs WHERE entry_id = ?", (entry_id,)
+                ).fetchone()
+
+                if row is None:
+                    return
+
+                recorded: dict = {**json.loads(row[0]), checkpoint.stage: artefacts}
+                self.connection.execute(
+                    "UPDATE jobs SET stage = ?, state = ?, artefacts = ?, updated = ? WHERE entry_id = ?",
+                    (checkpoint.stage, json.dumps(checkpoint.state), json.dumps(recorded), time(), entry_id)
+                )
+                self.connection.commit()
+
+        except (DatabaseError, OSError, TypeError, ValueError):
+            pass
+
+    def finish(self, entry_id: int | None) -> None:
+        """Remove a job that succeeded or failed from the journal."""
+
+        if entry_id is None:
+            return
+
+        try:
+            with self.lock:
+                self.connection.execute("DELETE FROM jobs WHERE entry_id = ?", (entry_id,))
+                self.connection.commit()
+
+        except DatabaseError:
+            pass
+
+    def interrupted(self) -> list[JournalEntry]:
+        """Claim the jobs of the sessions that stopped without finishing them. A session is considered
+        stopped once it has missed three heartbeats, or as soon as it was closed.
+
+        Returns:
+            list[JournalEntry]: The claimed jobs, which now belong to this session, oldest first.
+        """
+
+        deadline: float = time() - 3 * self.heartbeat
+        entries: list[JournalEntry] = []
+
+        with self.lock:
+            self.connection.execute("DELETE FROM sessions WHERE seen < ?", (deadline,))
+            rows: list[tuple] = self.connection.execute(
+                "SELECT entry_id, session, job, cover, output_directory, stage, state, artefacts FROM jobs "
+                "WHERE session NOT IN (SELECT session FROM sessions) ORDER BY entry_id"
+            ).fetchall()
+
+            for entry_id, session, record, cover, output_directory, stage, state, artefacts in rows:
+                claimed: int = self.connection.execute(
+                    "UPDATE jobs SET session = ? WHERE entry_id = ? AND session = ?", (self.session, entry_id, session)
+                ).rowcount
+
+                if not claimed:  # Another session got there first
+                    continue
+
+                try:
+                    job: Job = restore_job(record, cover)
+
+                except (TypeError, ValueError):  # Written by an incompatible version
+                    self.connection.execute("DELETE FROM jobs WHERE entry_id = ?", (entry_id,))
+                    continue
+
+                entries.append(JournalEntry(
+                    entry_id=entry_id, job=job, output_directory=Path(output_directory),
+                    stage=stage if stage in STAGES else None, state=json.loads(state),
+                    artefacts={
+                        name: {key: Artefact(Path(path), size, digest) for key, (path, size, digest) in files.items()}
+                        for name, files in json.loads(artefacts).items()
+                    }
+                ))
+
+            self.connection.commit()
+
+        return entries
+
+    def close(self) -> None:
+        """Close the session, its unfinished jobs becoming resumable at once, and the underlying database."""
+
+        self.stopped.set()
+
+        with self.lock:
+            self.connection.execute("DELETE FROM sessions WHERE session = ?", (self.session,))
+            self.connection.commit()
+            self.connection.close()
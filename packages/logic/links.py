@@ -0,0 +1,225 @@
+"""
+This module parses YouTube links into canonical video links. Every form a video link is pasted in
+(youtube.com, m., music. and youtube-nocookie.com hosts, youtu.be short links, shorts, embed and
+live pages, with or without a scheme) is recognised by a single precompiled expression, reduced to
+the ID of the video, its start time and the playlist it was opened from, and written back as a
+plain watch link. Bulk imports of text or CSV files are parsed line by line into unique videos,
+each rejected line coming with the reason why.
+"""
+
+import csv
+import re
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+
+LINK_PATTERN: re.Pattern = re.compile(
+    r"(?:https?://)?(?:(?:www|m|music)\.)?(?P<host>youtube\.com|youtube-nocookie\.com|youtu\.be)"
+    r"(?P<path>/[^?#\s]*)?(?:\?(?P<query>[^#\s]*))?(?:#(?P<fragment>\S*))?",
+    re.IGNORECASE
+)
+PATH_PATTERN: re.Pattern = re.compile(r"/(?:shorts|embed|live|v|e)/([^/]+)/?")
+VIDEO_ID_PATTERN: re.Pattern = re.compile(r"[\w-]{11}")
+TIME_PATTERN: re.Pattern = re.compile(r"(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s?)?")
+CLOCK_PATTERN: re.Pattern = re.compile(r"(?:(?:(\d+):)?(\d+):)?(\d+(?:\.\d*)?)")
+COLLECTION_PATHS: tuple = ("/playlist", "/channel/", "/c/", "/user/", "/@")
+LINK_COLUMNS: tuple = ("url", "link", "youtube_link")
+
+
+class LinkError(ValueError):
+    """Raised when a text is not a link to a YouTube video, its message giving the reason."""
+
+    def __init__(self, message: str):
+
+        super().__init__(message)
+
+
+class Link(NamedTuple):
+    """A YouTube video, with the time the link starts at and the playlist it comes from, if any."""
+
+    video_id: str
+    start: int = 0
+    playlist: str | None = None
+
+    @property
+    def url(self) -> str:
+        """The canonical link of the video, keeping its start time."""
+
+        start: str = f"&t={self.start}s" if self.start else ""
+        return f"https://www.youtube.com/watch?v={self.video_id}{start}"
+
+
+class LinkImport(NamedTuple):
+    """The outcome of a bulk import: the unique videos in order of first appearance,
+    the number of lines repeating an earlier video, and the rejected lines."""
+
+    links: list[Link]
+    duplicates: int
+    rejected: list[tuple[int, str, str]]  # Line number, text and reason
+
+
+def parse_time(value: str) -> int:
+    """Convert a start time such as "90", "90s", "1m30s" or "1h2m3s" to seconds, 0 if it is missing or malformed."""
+
+    if value.isdigit():
+        return int(value)
+
+    match: re.Match | None = TIME_PATTERN.fullmatch(value) if value else None
+
+    if match is None:
+        return 0
+
+    hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_clock(value: str) -> float:
+    """Convert a time such as "90", "90.5", "1:30", "1:02:03.5" or "1m30s" to seconds.
+
+    Args:
+        value (str): The time, as entered by the user.
+
+    Raises:
+        ValueError: If the text is not a time.
+
+    Returns:
+        float: The number of seconds.
+    """
+
+    text: str = value.strip()
+
+    if match := CLOCK_PATTERN.fullmatch(text):
+        hours, minutes, seconds = match.groups()
+        return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds)
+
+    if text and TIME_PATTERN.fullmatch(text):
+        return float(parse_time(text))
+
+    raise ValueError(f"{value!r} is not a time, such as 90, 1:30 or 1m30s.")
+
+
+def read_link(text: str) -> Link | str:
+    """Parse a link to a YouTube video, without raising, as bulk imports reject many lines.
+
+    Args:
+        text (str): The link, as pasted by the user.
+
+    Returns:
+        Link | str: The video, its start time and its playlist, or the reason why the text was rejected.
+    """
+
+    match: re.Match | None = LINK_PATTERN.fullmatch(text)
+
+    if match is None:
+        return "The provided link is not a valid YouTube link."
+
+    host, path, query, fragment = match.group("host", "path", "query", "fragment")
+    path = path or "/"
+    parameters: dict[str, str] = {}
+
+    if query:
+        for parameter in query.split("&"):
+            key, _, value = parameter.partition("=")
+            parameters.setdefault(key, value)
+
+    if host.lower() == "youtu.be":
+        identifier: str = path[1:].rstrip("/")
+
+    elif path == "/watch" or path == "/watch/":
+        identifier = parameters.get("v", "")
+
+    elif shortcut := PATH_PATTERN.fullmatch(path):
+        identifier = shortcut.group(1)
+
+    elif path.startswith(COLLECTION_PATHS):
+        return "The link points to a playlist or a channel, not to a video."
+
+    else:
+        return "The link does not point to a video."
+
+    if not VIDEO_ID_PATTERN.fullmatch(identifier):
+        return "The link does not contain a valid video ID."
+
+    start: str = parameters.get("t") or parameters.get("start") or (fragment or "").removeprefix("t=")
+    return Link(video_id=identifier, start=parse_time(start) if start else 0, playlist=parameters.get("list") or None)
+
+
+def parse_link(text: str) -> Link:
+    """Parse a link to a YouTube video.
+
+    Args:
+        text (str): The link, as pasted by the user.
+
+    Raises:
+        LinkError: If the text is not a link to a YouTube video.
+
+    Returns:
+        Link: The video, its start time and its playlist.
+    """
+
+    link: Link | str = read_link(text.strip())
+
+    if isinstance(link, str):
+        raise LinkError(link)
+
+    return link
+
+
+def import_lines(lines: Iterable[str]) -> LinkImport:
+    """Parse many links at once, keeping the first occurrence of each video. Blank lines and lines
+    starting with "#" are ignored.
+
+    Args:
+        lines (Iterable[str]): The links, one per line.
+
+    Returns:
+        LinkImport: The unique videos, the number of duplicates and the rejected lines.
+    """
+
+    links: dict[str, Link] = {}
+    rejected: list[tuple[int, str, str]] = []
+    duplicates: int = 0
+
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+
+        if not line or line.startswith("#"):
+            continue
+
+        link: Link | str = read_link(line)
+
+        if isinstance(link, str):
+            rejected.append((number, line, link))
+
+        elif link.video_id in links:
+            duplicates += 1
+
+        else:
+            links[link.video_id] = link
+
+    return LinkImport(links=list(links.values()), duplicates=duplicates, rejected=rejected)
+
+
+def import_file(path: Path) -> LinkImport:
+    """Parse the links of a text file (one per line) or of a CSV file. The links of a CSV file are
+    read from its "url" or "link" column if it has a header, from its first column otherwise.
+
+    Args:
+        path (Path): The path to the file, its format being given by its extension.
+
+    Returns:
+        LinkImport: The unique videos, the number of duplicates and the rejected lines.
+    """
+
+    with open(path, "r", encoding="UTF-8-sig", newline="") as file:
+        if path.suffix.lower() != ".csv":
+            return import_lines(file)
+
+        rows: list[list[str]] = list(csv.reader(file))
+
+    header: list[str] = [cell.strip().lower() for cell in rows[0]] if rows else []
+    column: int = next((header.index(name) for name in LINK_COLUMNS if name in header), 0)
+    skipped: int = 1 if any(name in header for name in LINK_COLUMNS) else 0
+    result: LinkImport = import_lines(row[column] if len(row) > column else "" for row in rows[skipped:])
+    rejected: list[tuple] = [(number + skipped, text, reason) for number, text, reason in result.rejected]
+    return result._replace(rejected=rejected)
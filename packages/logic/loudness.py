@@ -0,0 +1,270 @@
+"""
+This module measures and normalises the loudness of audio with NumPy, following ITU-R BS.1770
+(the measure behind EBU R128 and ReplayGain 2.0): the audio is K-weighted, its energy measured
+over 400 ms blocks overlapping by 75 %, and the blocks quieter than -70 LUFS, then those more than
+10 LU below the mean of the remaining ones, are left out of the integrated loudness.
+
+Audio is processed as decoded PCM blocks of a fixed size, see encoding.decode_pcm. The gated
+blocks are counted in a histogram of 0.01 LU bins rather than kept, and silence is tracked as
+the first and last audible 100 ms sub-blocks, so memory use does not depend on the length
+of the track. A first pass measures the track, a second one applies the gain and trims the
+leading and trailing silence while the result is being encoded.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+from packages.constants import constants
+from packages.logic import encoding
+
+
+HOP: int = constants.PCM_RATE // 10  # 100 ms sub-blocks, four of them making a gating block
+TAPS: int = 8192  # The K-weighting response has decayed by more than 100 dB after 170 ms
+HISTOGRAM_FLOOR: float = -70.0  # Absolute gate
+HISTOGRAM_STEP: float = 0.01
+HISTOGRAM_BINS: int = 8000  # Up to +10 LUFS
+K_WEIGHTING: tuple = (  # Biquads (b, a) of BS.1770 at 48 kHz: high shelf, then high pass
+    ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+    ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621))
+)
+
+
+class Analysis(NamedTuple):
+    """The measurements of a track: its integrated loudness in LUFS (-inf if it is silent),
+    its sample peak (1.0 being full scale) and the frames where the audible part starts and ends."""
+
+    loudness: float
+    peak: float
+    start: int
+    end: int
+
+    def gain(self, target: float = constants.LOUDNESS_TARGET, ceiling: float = constants.PEAK_CEILING) -> float:
+        """Get the gain bringing the track to the target loudness, reduced if the peak would exceed the ceiling.
+
+        Args:
+            target (float): The loudness to reach, in LUFS.
+            ceiling (float): The highest peak allowed, in dBFS.
+
+        Returns:
+            float: The gain in dB.
+        """
+
+        if not np.isfinite(self.loudness) or self.peak <= 0:
+            return 0.0
+
+        return min(target - self.loudness, ceiling - 20 * np.log10(self.peak))
+
+    def replaygain(self, gain: float = 0.0) -> dict:
+        """Get the ReplayGain 2.0 tags of the track, once the given gain is applied.
+
+        Args:
+            gain (float): The gain applied to the track, in dB.
+
+        Returns:
+            dict: The "replaygain_track_gain" and "replaygain_track_peak" tags, empty if the track is silent.
+        """
+
+        if not np.isfinite(self.loudness):
+            return {}
+
+        return {
+            "replaygain_track_gain": f"{constants.REPLAYGAIN_REFERENCE - self.loudness - gain:.2f} dB",
+            "replaygain_track_peak": f"{self.peak * 10 ** (gain / 20):.6f}"
+        }
+
+
+@lru_cache(maxsize=1)
+def weighting_response() -> np.ndarray:
+    """Get the impulse response of the K-weighting filter, computed once."""
+
+    response: np.ndarray = np.zeros(TAPS)
+    response[0] = 1.0
+
+    for b, a in K_WEIGHTING:
+        filtered: np.ndarray = np.zeros(TAPS)
+        x1 = x2 = y1 = y2 = 0.0
+
+        for index, x in enumerate(response):
+            y = b[0] * x + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2
+            filtered[index] = y
+            x1, x2, y1, y2 = x, x1, y, y1
+
+        response = filtered
+
+    return response
+
+
+class KWeighting:
+    """
+    Applies the K-weighting filter to consecutive blocks of a stream, by FFT convolution with its
+    impulse response. The end of each convolution is carried over to the next block (overlap-add).
+    """
+
+    def __init__(self, channels: int = 2):
+
+        self.tail: np.ndarray = np.zeros((TAPS - 1, channels))
+        self.spectra: dict[int, np.ndarray] = {}
+
+    def __call__(self, block: np.ndarray) -> np.ndarray:
+
+        length: int = len(block) + TAPS - 1
+        size: int = 1 << (length - 1).bit_length()
+
+        if size not in self.spectra:
+            self.spectra[size] = np.fft.rfft(weighting_response(), size)[:, None]
+
+        full: np.ndarray = np.fft.irfft(np.fft.rfft(block, size, axis=0) * self.spectra[size], size, axis=0)[:length]
+        full[:TAPS - 1] += self.tail
+        self.tail = full[len(block):]
+        return full[:len(block)]
+
+
+class LoudnessMeter:
+    """Measures a track fed block by block, see the module documentation."""
+
+    def __init__(self, silence: float = constants.SILENCE_THRESHOLD):
+
+        self.silence: float = 10 ** (silence / 10)  # As a mean square
+        self.weighting = KWeighting()
+        self.pending: np.ndarray = np.zeros((0, 2), dtype=np.float32)
+        self.pending_weighted: np.ndarray = np.zeros((0, 2))
+        self.previous: np.ndarray = np.zeros(0)
+        self.counts: np.ndarray = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.energies: np.ndarray = np.zeros(HISTOGRAM_BINS)
+        self.peak: float = 0.0
+        self.frames: int = 0
+        self.hops: int = 0
+        self.first: int | None = None
+        self.last: int | None = None
+
+    def feed(self, block: np.ndarray) -> None:
+        """Measure the next block of the track.
+
+        Args:
+            block (np.ndarray): Stereo samples, of shape (frames, 2).
+        """
+
+        if not len(block):
+            return
+
+        self.peak = max(self.peak, float(np.abs(block).max()))
+        self.frames += len(block)
+        raw: np.ndarray = np.concatenate((self.pending, block))
+        weighted: np.ndarray = np.concatenate((self.pending_weighted, self.weighting(block)))
+        count: int = len(raw) // HOP
+        used: int = count * HOP
+        self.pending, self.pending_weighted = raw[used:], weighted[used:]
+
+        if not count:
+            return
+
+        # Silence, from the unweighted level of each sub-block
+        levels: np.ndarray = np.square(raw[:used], dtype=np.float64).reshape(count, -1).mean(axis=1)
+        audible: np.ndarray = np.flatnonzero(levels > self.silence)
+
+        if len(audible):
+            self.first = self.hops + int(audible[0]) if self.first is None else self.first
+            self.last = self.hops + int(audible[-1])
+
+        # Loudness, from the K-weighted energy of each gating block (the channels being summed)
+        hops: np.ndarray = np.square(weighted[:used]).reshape(count, HOP, 2).mean(axis=1).sum(axis=1)
+        energies: np.ndarray = np.concatenate((self.previous, hops))
+        self.previous = energies[-3:]
+        self.hops += count
+
+        if len(energies) >= 4:
+            blocks: np.ndarray = np.convolve(energies, np.full(4, 0.25), mode="valid")
+            self.count_blocks(blocks)
+
+    def count_blocks(self, blocks: np.ndarray) -> None:
+        """Add gating blocks to the histogram, those under the absolute gate being dropped."""
+
+        with np.errstate(divide="ignore"):
+            loudness: np.ndarray = -0.691 + 10 * np.log10(blocks)
+
+        kept: np.ndarray = loudness > HISTOGRAM_FLOOR
+        bins: np.ndarray = np.minimum(((loudness[kept] - HISTOGRAM_FLOOR) / HISTOGRAM_STEP).astype(np.int64),
+                                      HISTOGRAM_BINS - 1)
+        self.counts += np.bincount(bins, minlength=HISTOGRAM_BINS)
+        self.energies += np.bincount(bins, weights=blocks[kept], minlength=HISTOGRAM_BINS)
+
+    def result(self) -> Analysis:
+        """Get the measurements of the track fed so far."""
+
+        last: int | None = self.last
+
+        if len(self.pending) and np.square(self.pending, dtype=np.float64).mean() > self.silence:
+            last = self.hops  # The incomplete sub-block at the end is audible
+
+        if self.first is None and last is None:  # Nothing to keep, so nothing is trimmed
+            start, end = 0, self.frames
+
+        else:
+            start, end = (self.first if self.first is not None else last) * HOP, min((last + 1) * HOP, self.frames)
+
+        if not self.counts.sum():
+            return Analysis(loudness=float("-inf"), peak=self.peak, start=start, end=end)
+
+        relative: float = -0.691 + 10 * np.log10(self.energies.sum() / self.counts.sum()) - 10
+        first_bin: int = max(int(np.ceil((relative - HISTOGRAM_FLOOR) / HISTOGRAM_STEP)), 0)
+        energy: float = self.energies[first_bin:].sum() / max(self.counts[first_bin:].sum(), 1)
+        loudness: float = -0.691 + 10 * np.log10(energy) if energy > 0 else float("-inf")
+        return Analysis(loudness=float(loudness), peak=self.peak, start=start, end=end)
+
+
+def blocks(source: Path) -> Iterator[np.ndarray]:
+    """Decode an audio file into stereo blocks of constants.PCM_BLOCK_FRAMES frames.
+
+    Args:
+        source (Path): The path to the audio file.
+
+    Yields:
+        np.ndarray: The samples of the next block, of shape (frames, 2).
+    """
+
+    for chunk in encoding.decode_pcm(source):
+        yield np.frombuffer(chunk, dtype=np.float32).reshape(-1, 2)
+
+
+def analyse(source: Path) -> Analysis:
+    """Measure the loudness, peak and silences of an audio file.
+
+    Args:
+        source (Path): The path to the audio file.
+
+    Returns:
+        Analysis: The measurements.
+    """
+
+    meter = LoudnessMeter()
+
+    for block in blocks(source):
+        meter.feed(block)
+
+    return meter.result()
+
+
+def render(source: Path, analysis: Analysis, gain: float) -> Iterator[bytes]:
+    """Decode an audio file again, applying the gain and trimming the silences found by analyse.
+
+    Args:
+        source (Path): The path to the audio file.
+        analysis (Analysis): The measurements of the file.
+        gain (float): The gain to apply, in dB.
+
+    Yields:
+        bytes: Interleaved stereo 32-bit float samples at constants.PCM_RATE, see encoding.encode_pcm.
+    """
+
+    factor: np.float32 = np.float32(10 ** (gain / 20))
+    position: int = 0
+
+    for block in blocks(source):
+        start, end = max(analysis.start - position, 0), min(analysis.end - position, len(block))
+        position += len(block)
+
+        if end > start:
+            yield (block[start:end] * factor).tobytes()
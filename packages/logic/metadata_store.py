@@ -0,0 +1,176 @@
+"""
+This module provides the MetadataStore class, a persistent SQLite cache of what YouTube
+tells us about each video: its title, duration and available audio streams. Videos that
+come back often are then checked and prepared without asking YouTube again.
+Stream URLs expire within hours, so they are deliberately not stored.
+"""
+
+import json
+import sqlite3
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class AudioStreamInfo:
+    """An audio stream offered by YouTube for a video."""
+
+    itag: int
+    mime_type: str
+    codec: str | None
+    bitrate: int | None
+    size: int
+
+
+@dataclass(frozen=True)
+class VideoInfo:
+    """What is known about a video, its audio streams being listed in the order YouTube gives them."""
+
+    video_id: str
+    title: str
+    duration: int
+    streams: tuple[AudioStreamInfo, ...] = ()
+
+    @classmethod
+    def from_youtube(cls, video_id: str, video) -> "VideoInfo":
+        """Describe a video resolved by pytube.
+
+        Args:
+            video_id (str): The ID of the video.
+            video (pytube.YouTube): The video, with its streams loaded.
+
+        Returns:
+            VideoInfo: The description of the video.
+        """
+
+        streams: tuple = tuple(
+            AudioStreamInfo(
+                itag=stream.itag,
+                mime_type=stream.mime_type,
+                codec=stream.audio_codec,
+                bitrate=stream.bitrate,
+                size=stream.filesize
+            ) for stream in video.streams.filter(only_audio=True)
+        )
+        return cls(video_id=video_id, title=video.title, duration=video.length or 0, streams=streams)
+
+    def best_stream(self) -> AudioStreamInfo | None:
+        """The audio stream with the highest bitrate, if any."""
+
+        return max(self.streams, key=lambda stream: stream.bitrate or 0, default=None)
+
+
+class MetadataStore:
+    """
+    Persistent cache of VideoInfo objects keyed by video ID.
+
+    Entries expire `ttl` seconds after they were stored, and once there are more than
+    `max_entries` of them the least recently read ones are evicted. Hits and misses
+    are counted so the effectiveness of the cache can be checked.
+    """
+
+    def __init__(self, path: Path | str, ttl: float, max_entries: int, clock: Callable[[], float] = time):
+
+        if isinstance(path, Path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.ttl: float = ttl
+        self.max_entries: int = max_entries
+        self.clock: Callable[[], float] = clock
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            "video_id TEXT PRIMARY KEY, title TEXT, duration INTEGER, streams TEXT, stored REAL, accessed REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS videos_accessed ON videos (accessed)")
+        self.connection.commit()
+
+    def get(self, video_id: str) -> VideoInfo | None:
+        """Get the description of a video.
+
+        Args:
+            video_id (str): The ID of the video.
+
+        Returns:
+            VideoInfo | None: The description, or None if the video is unknown or its entry has expired.
+        """
+
+        now: float = self.clock()
+
+        with self.lock:
+            row: tuple | None = self.connection.execute(
+                "SELECT title, duration, streams, stored FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+
+            if row is None or row[3] + self.ttl <= now:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute("UPDATE videos SET accessed = ? WHERE video_id = ?", (now, video_id))
+            self.connection.commit()
+
+        streams: tuple = tuple(AudioStreamInfo(**stream) for stream in json.loads(row[2]))
+        return VideoInfo(video_id=video_id, title=row[0], duration=row[1], streams=streams)
+
+    def put(self, info: VideoInfo) -> None:
+        """Store the description of a video, then evict expired and excess entries.
+
+        Args:
+            info (VideoInfo): The description of the video.
+        """
+
+        now: float = self.clock()
+        streams: str = json.dumps([asdict(stream) for stream in info.streams])
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?)",
+                (info.video_id, info.title, info.duration, streams, now, now)
+            )
+            self.connection.execute("DELETE FROM videos WHERE stored <= ?", (now - self.ttl,))
+            self.connection.execute(
+                "DELETE FROM videos WHERE video_id IN "
+                "(SELECT video_id FROM videos ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+            self.connection.commit()
+
+    def get_or_resolve(self, video_id: str, resolver: Callable[[str], VideoInfo]) -> VideoInfo:
+        """Get the description of a video, asking the resolver and storing its answer on a miss.
+
+        Args:
+            video_id (str): The ID of the video.
+            resolver (Callable[[str], VideoInfo]): Describes a video from its ID, usually by asking YouTube.
+
+        Returns:
+            VideoInfo: The description of the video.
+        """
+
+        info: VideoInfo | None = self.get(video_id)
+
+        if info is None:
+            info = resolver(video_id)
+            self.put(info)
+
+        return info
+
+    def stats(self) -> dict:
+        """Get the hit and miss counters along with the number of stored entries."""
+
+        with self.lock:
+            size: int = self.connection.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+    def close(self) -> None:
+        """Close the underlying database."""
+
+        with self.lock:
+            self.connection.close()
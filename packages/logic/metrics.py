@@ -0,0 +1,83 @@
+"""
+This module measures where the time of a job goes. Every stage of a pipeline (resolving the
+video, downloading, encoding, tagging...) produces a StageMetrics record holding its wall time
+and the number of bytes it processed, and the MetricsLog class appends these records to a
+JSON lines file, one object per line, so they can be analysed with any tool.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import NamedTuple
+
+from packages.constants import constants
+
+
+class Progress(NamedTuple):
+    """The progress of a job: how far its current stage has gone, and the job as a whole."""
+
+    stage: str
+    done: float
+    total: float
+    percent: int
+
+
+@dataclass
+class StageMetrics:
+    """The measurements of one stage of a job."""
+
+    job_id: int
+    stage: str
+    seconds: float = 0.0
+    bytes: int = 0
+    failed: bool = False
+    started: float = field(default_factory=time)
+
+    @property
+    def throughput(self) -> float:
+        """The number of bytes processed per second, 0 if unknown."""
+
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        """Get the record as written to the log, with its throughput."""
+
+        return {**asdict(self), "throughput": round(self.throughput)}
+
+
+class MetricsLog:
+    """
+    Appends stage measurements to a JSON lines file. Writes are serialised, as stages of
+    different jobs finish in different threads, and the file is rotated once it reaches
+    max_size bytes so that it does not grow forever.
+    """
+
+    def __init__(self, path: Path = constants.METRICS_LOG, max_size: int = constants.METRICS_LOG_SIZE):
+
+        self.path: Path = path
+        self.max_size: int = max_size
+        self.lock = Lock()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+
+    def write(self, metrics: StageMetrics) -> None:
+        """Append a record to the log.
+
+        Args:
+            metrics (StageMetrics): The measurements of a finished stage.
+        """
+
+        line: str = json.dumps(metrics.to_dict()) + "\n"
+
+        with self.lock:
+            try:
+                if self.path.stat().st_size >= self.max_size:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+
+            except FileNotFoundError:
+                pass
+
+            with open(self.path, "a", encoding="UTF-8") as file:
+                file.write(line)
@@ -0,0 +1,607 @@
+"""
+This module provides the network layer shared by every request of the application: an asyncio
+HTTP/1.1 client running on a dedicated event-loop thread. Connections are kept alive and pooled
+per host, the number of requests in flight to each host is capped, and requests time out and are
+retried with an exponential backoff. Waiting for an answer costs a coroutine rather than a thread,
+so hundreds of concurrent lookups share a handful of sockets.
+
+Other threads reach the client through the loop returned by shared(): submit gives back a
+concurrent.futures.Future (see bg_processes.NetworkBridge for the Qt side), while request and
+stream only block the calling thread. The requests pytube makes itself go through the same pool
+once install_pytube has been called, which the application and the command line do when they start.
+"""
+
+import asyncio
+import http.client
+import io
+import json
+import ssl
+from concurrent.futures import Future
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, AsyncIterator, Coroutine, Iterator, NamedTuple
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+
+from packages.constants import constants
+
+
+HEADERS: dict = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+RETRY_STATUSES: frozenset = frozenset({429, 500, 502, 503, 504})
+REDIRECT_STATUSES: frozenset = frozenset({301, 302, 303, 307, 308})
+MAX_REDIRECTS: int = 5
+
+
+class HttpError(OSError):
+    """Raised when a server answers with an unexpected status."""
+
+    def __init__(self, status: int, url: str):
+
+        super().__init__(f"HTTP {status} for {url}")
+        self.status: int = status
+        self.url: str = url
+
+
+class StaleConnection(ConnectionError):
+    """Raised when a pooled connection turns out to have been closed by the server in the meantime."""
+
+
+class Origin(NamedTuple):
+    """The scheme, host and port connections are pooled by."""
+
+    scheme: str
+    host: str
+    port: int
+
+
+class Response(NamedTuple):
+    """A response read entirely, its header names being lowercase."""
+
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+    def text(self) -> str:
+        """The body, decoded as UTF-8."""
+
+        return self.body.decode("UTF-8", errors="replace")
+
+    def json(self) -> Any:
+        """The body, parsed as JSON."""
+
+        return json.loads(self.body)
+
+
+def split_url(url: str) -> tuple[Origin, str]:
+    """Split a URL into the origin to connect to and the target of the request line.
+
+    Args:
+        url (str): An http or https URL.
+
+    Raises:
+        ValueError: If the URL is not an http or https URL.
+
+    Returns:
+        tuple[Origin, str]: The origin, and the path with its query string.
+    """
+
+    parts = urlsplit(url)
+
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid URL: {url}")
+
+    port: int = parts.port or (443 if parts.scheme == "https" else 80)
+    target: str = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    return Origin(scheme=parts.scheme, host=parts.hostname, port=port), target
+
+
+class Connection:
+    """A connection to an origin, along with the time it was last returned to the pool."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+        self.idle_since: float = monotonic()
+        self.reused: bool = False
+
+    def expired(self, keepalive: float) -> bool:
+        """Check if the connection was closed by the server or has been idle for too long."""
+
+        return self.reader.at_eof() or self.writer.is_closing() or monotonic() - self.idle_since > keepalive
+
+    def close(self) -> None:
+
+        self.writer.close()
+
+
+class StreamedResponse:
+    """
+    A response whose body is read as it arrives. Its connection goes back to the pool once the body
+    has been read entirely, and is closed if the response is released before that.
+    """
+
+    def __init__(self, client: "HttpClient", origin: Origin, connection: Connection, status: int,
+                 headers: dict[str, str], reusable: bool, length: int | None, chunked: bool):
+
+        self.client: HttpClient = client
+        self.origin: Origin = origin
+        self.connection: Connection | None = connection
+        self.status: int = status
+        self.headers: dict[str, str] = headers
+        self.reusable: bool = reusable
+        self.length: int | None = length  # None if the body lasts until the connection is closed
+        self.chunked: bool = chunked
+        self.complete: bool = False
+
+    async def chunks(self, size: int = constants.STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield the body as it is received, at most size bytes at a time.
+
+        Args:
+            size (int): The maximum size of the yielded chunks.
+
+        Yields:
+            bytes: The next chunk of the body.
+        """
+
+        reader: asyncio.StreamReader = self.connection.reader
+        wait = self.client.wait
+
+        try:
+            if self.chunked:
+                while length := await self.chunk_size():
+                    while length:
+                        data: bytes = await wait(reader.read(min(size, length)))
+
+                        if not data:
+                            raise http.client.IncompleteRead(b"", length)
+
+                        length -= len(data)
+                        yield data
+
+                    await wait(reader.readexactly(2))
+
+                while (await wait(reader.readline())).strip():  # Trailers
+                    pass
+
+            else:
+                remaining: int | None = self.length
+
+                while remaining is None or remaining > 0:
+                    data = await wait(reader.read(size if remaining is None else min(size, remaining)))
+
+                    if not data:
+                        if remaining is None:
+                            break
+
+                        raise http.client.IncompleteRead(b"", remaining)
+
+                    remaining = None if remaining is None else remaining - len(data)
+                    yield data
+
+            self.complete = True
+
+        finally:
+            self.release()
+
+    async def chunk_size(self) -> int:
+        """Read the line announcing the size of the next chunk of a chunked body.
+
+        Raises:
+            http.client.IncompleteRead: If the connection was closed before the whole line was received.
+            http.client.HTTPException: If the line does not hold a chunk size.
+
+        Returns:
+            int: The size of the chunk, 0 for the last one.
+        """
+
+        line: bytes = await self.client.wait(self.connection.reader.readline())
+
+        if not line.endswith(b"\n"):  # readline returns what it got when the connection closes
+            raise http.client.IncompleteRead(line)
+
+        try:
+            return int(line.split(b";")[0], 16)
+
+        except ValueError:
+            raise http.client.HTTPException(f"Malformed chunk size: {line!r}") from None
+
+    async def read(self) -> bytes:
+        """Read the whole body."""
+
+        return b"".join([chunk async for chunk in self.chunks()])
+
+    def release(self) -> None:
+        """Give the connection back to the pool if the body was read entirely, close it otherwise."""
+
+        if self.connection is None:
+            return
+
+        connection, self.connection = self.connection, None
+        self.client.release(self.origin, connection, reusable=self.complete and self.reusable)
+
+
+class HttpClient:
+    """
+    Asyncio HTTP/1.1 client with a keep-alive connection pool.
+
+    At most host_connections requests are in flight to the same origin, the others waiting for
+    one of them to complete, so the number of sockets stays bounded however many requests are made.
+    Connection failures, timeouts and the statuses of RETRY_STATUSES are retried with an exponential
+    backoff, and redirects are followed. The timeout applies to every read and write, so a large body
+    can take as long as it needs as long as data keeps coming.
+    """
+
+    def __init__(self, host_connections: int = constants.HTTP_HOST_CONNECTIONS,
+                 timeout: float = constants.HTTP_TIMEOUT, retries: int = constants.HTTP_RETRIES,
+                 backoff: float = constants.HTTP_BACKOFF, keepalive: float = constants.HTTP_KEEPALIVE):
+
+        self.host_connections: int = host_connections
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.keepalive: float = keepalive
+        self.idle: dict[Origin, list[Connection]] = {}
+        self.slots: dict[Origin, asyncio.Semaphore] = {}
+        self.ssl_context: ssl.SSLContext = ssl.create_default_context()
+        self.opened: int = 0  # Connections opened so far, to check that they are reused
+
+    async def wait(self, awaitable) -> Any:
+        """Await a read or a write, failing with TimeoutError if it takes longer than the timeout."""
+
+        return await asyncio.wait_for(awaitable, self.timeout)
+
+    async def connect(self, origin: Origin) -> Connection:
+        """Get an idle connection to an origin, or open a new one."""
+
+        idle: list[Connection] = self.idle.get(origin, [])
+
+        while idle:
+            connection: Connection = idle.pop()
+
+            if not connection.expired(self.keepalive):
+                connection.reused = True
+                return connection
+
+            connection.close()
+
+        reader, writer = await self.wait(asyncio.open_connection(
+            origin.host, origin.port, ssl=self.ssl_context if origin.scheme == "https" else None
+        ))
+        self.opened += 1
+        return Connection(reader=reader, writer=writer)
+
+    def release(self, origin: Origin, connection: Connection, reusable: bool) -> None:
+        """Give a connection back, keeping it for the next request to the origin if it can be reused."""
+
+        if reusable and not connection.expired(self.keepalive):
+            connection.idle_since = monotonic()
+            self.idle.setdefault(origin, []).append(connection)
+
+        else:
+            connection.close()
+
+        self.slots[origin].release()
+
+    async def send(self, method: str, url: str, headers: dict, body: bytes | None) -> StreamedResponse:
+        """Send a request once and read the head of its response, without retrying.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            headers (dict): The headers of the request.
+            body (bytes | None): The body of the request, if any.
+
+        Raises:
+            StaleConnection: If a pooled connection was closed by the server before it answered.
+
+        Returns:
+            StreamedResponse: The response, its body not read yet.
+        """
+
+        origin, target = split_url(url)
+        slots: asyncio.Semaphore = self.slots.setdefault(origin, asyncio.Semaphore(self.host_connections))
+        await slots.acquire()
+        connection: Connection | None = None
+
+        try:
+            connection = await self.connect(origin)
+            default_port: bool = origin.port == (443 if origin.scheme == "https" else 80)
+            lines: list[str] = [f"{method} {target} HTTP/1.1", f"Host: {origin.host}"
+                                + ("" if default_port else f":{origin.port}")]
+            lines += [f"{name}: {value}" for name, value in headers.items()]
+
+            if body is not None:
+                lines.append(f"Content-Length: {len(body)}")
+
+            connection.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+
+            try:
+                await self.wait(connection.writer.drain())
+                status_line: bytes = await self.wait(connection.reader.readline())
+
+            except (ConnectionResetError, BrokenPipeError) as error:
+                raise StaleConnection(str(error)) if connection.reused else error
+
+            if not status_line:
+                raise (StaleConnection if connection.reused else http.client.RemoteDisconnected)(
+                    "The server closed the connection without answering."
+                )
+
+            version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+            response_headers: dict[str, str] = {}
+
+            while (line := await self.wait(connection.reader.readline())).strip():
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+
+        except BaseException:
+            if connection is not None:
+                connection.close()
+
+            slots.release()
+            raise
+
+        status_code: int = int(status)
+        keep_alive: str = response_headers.get("connection", "").lower()
+        reusable: bool = "close" not in keep_alive and (version == "HTTP/1.1" or "keep-alive" in keep_alive)
+        chunked: bool = "chunked" in response_headers.get("transfer-encoding", "").lower()
+        length: int | None = None if chunked else int(response_headers.get("content-length", -1))
+
+        if method == "HEAD" or status_code in (204, 304) or 100 <= status_code < 200:
+            length = 0
+
+        return StreamedResponse(
+            client=self, origin=origin, connection=connection, status=status_code, headers=response_headers,
+            reusable=reusable and (chunked or length >= 0), length=None if length == -1 else length, chunked=chunked
+        )
+
+    async def open(self, method: str, url: str, headers: dict | None = None,
+                   body: bytes | None = None) -> StreamedResponse:
+        """Send a request, retrying and following redirects as needed.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            headers (dict | None): The headers of the request, HEADERS if None.
+            body (bytes | None): The body of the request, if any.
+
+        Returns:
+            StreamedResponse: The response, its body not read yet. The last response is returned when
+            its status is still one to retry once the retries are exhausted.
+        """
+
+        headers = HEADERS if headers is None else headers
+        attempt: int = 0
+        redirects: int = 0
+
+        while True:
+            try:
+                response: StreamedResponse = await self.send(method, url, headers, body)
+
+            except StaleConnection:  # Not the fault of the server, the request is sent again at once
+                continue
+
+            except (OSError, http.client.HTTPException):
+                if attempt >= self.retries:
+                    raise
+
+            else:
+                location: str | None = response.headers.get("location")
+
+                if response.status in REDIRECT_STATUSES and location and redirects < MAX_REDIRECTS:
+                    response.release()
+                    url, redirects = urljoin(url, location), redirects + 1
+
+                    if response.status == 303 or (response.status in (301, 302) and method == "POST"):
+                        method, body = "GET", None
+
+                    continue
+
+                if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+
+                response.release()
+
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    async def request(self, method: str, url: str, headers: dict | None = None,
+                      body: bytes | None = None) -> Response:
+        """Send a request and read its whole response.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            headers (dict | None): The headers of the request, HEADERS if None.
+            body (bytes | None): The body of the request, if any.
+
+        Returns:
+            Response: The response, whatever its status.
+        """
+
+        response: StreamedResponse = await self.open(method, url, headers, body)
+        return Response(status=response.status, headers=response.headers, body=await response.read())
+
+    async def stream(self, url: str, headers: dict | None = None, chunk_size: int = constants.STREAM_CHUNK_SIZE,
+                     expected: tuple = (200, 206)) -> AsyncIterator[bytes]:
+        """Download a URL chunk by chunk.
+
+        Args:
+            url (str): The URL.
+            headers (dict | None): The headers of the request, HEADERS if None.
+            chunk_size (int): The maximum size of the yielded chunks.
+            expected (tuple): The statuses of a successful response.
+
+        Raises:
+            HttpError: If the server answers with another status.
+
+        Yields:
+            bytes: The next chunk of the body.
+        """
+
+        response: StreamedResponse = await self.open("GET", url, headers)
+
+        if response.status not in expected:
+            response.release()
+            raise HttpError(status=response.status, url=url)
+
+        try:
+            async for chunk in response.chunks(chunk_size):
+                yield chunk
+
+        finally:  # Also when the caller stops early, so the connection is not left to the garbage collector
+            response.release()
+
+    async def close(self) -> None:
+        """Close the idle connections."""
+
+        for connections in self.idle.values():
+            for connection in connections:
+                connection.close()
+
+        self.idle.clear()
+
+
+class NetworkLoop:
+    """
+    Runs an HttpClient on a dedicated event-loop thread, for the other threads to use.
+    None of its blocking methods may be called from the loop thread itself.
+    """
+
+    def __init__(self, **options):
+
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.client = HttpClient(**options)
+        self.thread = Thread(target=self.loop.run_forever, name="network", daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """Schedule a coroutine on the loop.
+
+        Args:
+            coroutine (Coroutine): The coroutine, usually using self.client.
+
+        Returns:
+            Future: Its outcome, which can be waited for or given a callback.
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """Run a coroutine on the loop and wait for its result."""
+
+        return self.submit(coroutine).result()
+
+    def request(self, method: str, url: str, headers: dict | None = None, body: bytes | None = None) -> Response:
+        """Send a request and wait for its whole response, see HttpClient.request."""
+
+        return self.run(self.client.request(method, url, headers, body))
+
+    def stream(self, url: str, headers: dict | None = None, chunk_size: int = constants.STREAM_CHUNK_SIZE,
+               expected: tuple = (200, 206)) -> Iterator[bytes]:
+        """Download a URL chunk by chunk, see HttpClient.stream. Nothing is read ahead of the consumer,
+        and the connection is given back as soon as the iteration stops.
+
+        Yields:
+            bytes: The next chunk of the body.
+        """
+
+        chunks: AsyncIterator[bytes] = self.client.stream(url, headers, chunk_size, expected)
+
+        async def next_chunk() -> bytes | None:
+
+            return await anext(chunks, None)
+
+        try:
+            while (chunk := self.run(next_chunk())) is not None:
+                yield chunk
+
+        finally:
+            self.run(chunks.aclose())
+
+    def shutdown(self) -> None:
+        """Close the idle connections and stop the loop."""
+
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+shared_loop: NetworkLoop | None = None
+shared_lock = Lock()
+
+
+def shared() -> NetworkLoop:
+    """Get the network loop of the application, starting it on first use."""
+
+    global shared_loop
+
+    with shared_lock:
+        if shared_loop is None:
+            shared_loop = NetworkLoop()
+
+    return shared_loop
+
+
+def shutdown() -> None:
+    """Stop the network loop of the application, if it was started."""
+
+    global shared_loop
+
+    with shared_lock:
+        if shared_loop is not None:
+            shared_loop.shutdown()
+            shared_loop = None
+
+
+class PytubeResponse(io.BytesIO):
+    """A response read entirely, with the interface of the urlopen responses pytube expects."""
+
+    def __init__(self, response: Response):
+        super().__init__(response.body)
+
+        self.status: int = response.status
+        self.headers = http.client.HTTPMessage()
+
+        for name, value in response.headers.items():
+            self.headers[name] = value
+
+    def info(self) -> http.client.HTTPMessage:
+
+        return self.headers
+
+    def getcode(self) -> int:
+
+        return self.status
+
+
+def pytube_request(url: str, method: str | None = None, headers: dict | None = None, data=None,
+                   timeout: Any = None) -> PytubeResponse:
+    """Replacement of pytube.request._execute_request sending its requests through the shared loop.
+
+    Raises:
+        HTTPError: If the server answers with an error status, as urlopen does.
+    """
+
+    if data and not isinstance(data, bytes):
+        data = json.dumps(data).encode("UTF-8")
+
+    if not url.lower().startswith("http"):
+        raise ValueError("Invalid URL")
+
+    response: Response = shared().request(method or ("POST" if data else "GET"), url,
+                                          {**HEADERS, **(headers or {})}, data or None)
+
+    if response.status >= 400:
+        reason: str = http.client.responses.get(response.status, "")
+        raise HTTPError(url, response.status, reason, PytubeResponse(response).info(), None)
+
+    return PytubeResponse(response)
+
+
+def install_pytube() -> None:
+    """Route the requests pytube makes by itself (playlists, age gates, file sizes...) through the shared loop."""
+
+    from pytube import request
+
+    request._execute_request = pytube_request
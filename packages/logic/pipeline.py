@@ -0,0 +1,889 @@
+"""
+This module is the processing core of the application, and does not depend on Qt.
+It provides the Pipeline class, which downloads the audio of a single job, converts it
+to MP3 format (or keeps the original stream) while tagging it with user information,
+and the JobRunner class, which runs many of them concurrently, skipping the jobs
+whose file was already produced (see packages.logic.archive), flagging those whose audio
+is already in the library (see packages.logic.fingerprints) and resuming the jobs
+an earlier session left unfinished (see packages.logic.journal).
+Both the GUI and the command line interface are built on top of it.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from sqlite3 import Error as DatabaseError
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Iterable, Iterator
+
+import pytube
+
+from packages.constants import constants
+from packages.logic import clips, downloader, encoding, loudness, profiling, streaming, tagging, videos
+from packages.logic.archive import CLIP_MARKER, Archive, ArchiveEntry
+from packages.logic.encoding import EncoderError
+from packages.logic.events import Event
+from packages.logic.fingerprints import Fingerprint, FingerprintIndex, FingerprintMatch, fingerprint_file
+from packages.logic.jobs import Job, JobStatus
+from packages.logic.journal import Checkpoint, Journal, JournalEntry
+from packages.logic.metadata_store import AudioStreamInfo, VideoInfo
+from packages.logic.metrics import MetricsLog, Progress, StageMetrics
+from packages.logic.toolkit import move_to_free_name, qthread_error_handler
+
+
+class Pipeline:
+    """
+    Processes a single job. Each stage is a separate method so that the runner
+    can run downloads and tagging on the I/O pool and conversions on the CPU pool.
+    Every job gets its own instance, and therefore its own status and events.
+
+    Progress is reported as it really happens (bytes downloaded, seconds of audio encoded),
+    each stage being given a share of the whole job in PROGRESS_RANGES. Events are only
+    emitted when the overall percentage changes, however many chunks go through.
+    Every completed stage is announced through checkpoint, along with the files it produced,
+    so that a journal can resume the job from there, see resume.
+    When a fingerprint index is given, the audio is fingerprinted and looked up in the library
+    before it is converted (after it is encoded for streaming jobs), see find_duplicate.
+    Clipped jobs download and convert their clip only, see download_file.
+    """
+
+    PROGRESS_RANGES: dict = {"download": (0, 60), "encode": (60, 95), "stream": (0, 95)}
+
+    status_changed = Event()
+    progress_changed = Event()
+    stage_measured = Event()
+    job_skipped = Event()
+    download_finished = Event()
+    file_converted = Event()
+    file_tagged = Event()
+    error_happened = Event()
+    checkpoint = Event()
+    duplicate_found = Event()
+
+    def __init__(self, job: Job, output_directory: Path = constants.OUTPUT_FOLDER,
+                 fingerprints: FingerprintIndex | None = None):
+
+        self.job: Job = job
+        self.status: JobStatus = JobStatus.QUEUED
+        self.audio_codec: str | None = None
+        self.output_file: Path | None = None
+        self.default_name: str | None = None
+        self.temporary: Path | None = None
+        self.variant_files: dict[str, Path] = {}
+        self.outputs: dict[str, Path] = {}
+        self.tagged: bool = False
+        self.skipped: bool = False
+        self.analysis: loudness.Analysis | None = None
+        self.gain: float = 0.0
+        self.duration: float = 0.0
+        self.percent: int = 0
+        self.metrics: list[StageMetrics] = []
+        self.error: str | None = None
+        self.fingerprints: FingerprintIndex | None = fingerprints
+        self.fingerprint: Fingerprint | None = None
+        self.duplicate: FingerprintMatch | None = None
+        self.output_directory: Path = output_directory
+        self.output_directory.mkdir(exist_ok=True, parents=True)
+
+    def set_status(self, status: JobStatus) -> None:
+        """Records the new status of the job and notifies listeners.
+
+        Args:
+            status (JobStatus): The stage the job has reached.
+        """
+
+        self.status = status
+        self.status_changed.emit(status)
+
+    @property
+    def tags(self) -> dict:
+        """The tags written to the output file in the main quality of the job, see quality_tags."""
+
+        return self.quality_tags(self.job.quality)
+
+    def quality_tags(self, quality: str) -> dict:
+        """Gets the tags written to the output file in the given quality: those of the job, plus
+        the link of the video in the comment tag, which allows the archive to be rebuilt from the
+        files themselves, and the ReplayGain tags of normalised jobs. The link of a clip is followed
+        by its start and end times, so that the archive does not take it for the whole video.
+
+        Args:
+            quality (str): One of the qualities of the job.
+
+        Returns:
+            dict: The tags of the file.
+        """
+
+        identifier: str | None = videos.video_id(self.job.youtube_link)
+        source: str = videos.watch_url(identifier) if identifier else self.job.youtube_link
+
+        if self.job.clipped:
+            end: str = "" if self.job.end is None else f"{self.job.end:g}"
+            source += f"{CLIP_MARKER}{self.job.start:g}-{end}"
+
+        gain: float = 0.0 if quality == constants.ORIGINAL_QUALITY else self.gain  # Copies are not levelled
+        replaygain: dict = self.analysis.replaygain(gain) if self.analysis else {}
+        return {**self.job.metadata, "comment": source, **replaygain}
+
+    @property
+    def state(self) -> dict:
+        """What the later stages need to know about the earlier ones, as plain JSON values."""
+
+        return {
+            "audio_codec": self.audio_codec, "duration": self.duration, "default_name": self.default_name,
+            "analysis": list(self.analysis) if self.analysis else None, "gain": self.gain, "tagged": self.tagged
+        }
+
+    def reach(self, stage: str, files: dict[str, Path] | None = None) -> None:
+        """Notifies listeners that a stage is complete.
+
+        Args:
+            stage (str): One of journal.STAGES.
+            files (dict[str, Path] | None): The files the stage produced, keyed by role or quality.
+        """
+
+        self.checkpoint.emit(Checkpoint(stage=stage, files=files or {}, state=self.state))
+
+    def resume(self, stage: str, files: dict[str, Path], state: dict) -> None:
+        """Picks the job up after a stage completed by an earlier session, see journal.JournalEntry.resume_point.
+        The remaining stages are then run as usual, on the files of that stage.
+
+        Args:
+            stage (str): The last stage completed.
+            files (dict[str, Path]): The files it produced.
+            state (dict): The state of the pipeline at the time, see state.
+        """
+
+        self.audio_codec = state.get("audio_codec")
+        self.duration = state.get("duration", 0.0)
+        self.default_name = state.get("default_name")
+        self.analysis = loudness.Analysis(*state["analysis"]) if state.get("analysis") else None
+        self.gain = state.get("gain", 0.0)
+        self.tagged = state.get("tagged", False)
+
+        if stage in ("encoded", "tagged"):
+            self.temporary = files[self.job.quality]
+            self.variant_files = {quality: path for quality, path in files.items() if quality != self.job.quality}
+
+        elif stage == "finalised":
+            self.outputs = files
+            self.output_file = files[self.job.quality]
+            self.percent = 100
+            self.progress_changed.emit(Progress(stage="finalize", done=0, total=0, percent=100))
+            self.set_status(JobStatus.DONE)
+
+    def report_progress(self, stage: str, done: float, total: float) -> None:
+        """Notifies listeners of the progress of a stage, if the job as a whole has moved on.
+
+        Args:
+            stage (str): A key of PROGRESS_RANGES.
+            done (float): The bytes or seconds of audio processed so far.
+            total (float): The bytes or seconds of audio to process, 0 if unknown.
+        """
+
+        start, end = self.PROGRESS_RANGES[stage]
+        percent: int = start + int((end - start) * min(done / total, 1)) if total > 0 else start
+
+        if percent != self.percent:
+            self.percent = percent
+            self.progress_changed.emit(Progress(stage=stage, done=done, total=total, percent=percent))
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[StageMetrics]:
+        """Measures the wall time of a stage, the caller filling in the number of bytes processed.
+        The stage is profiled as well in the profiling mode, see packages.logic.profiling.
+
+        Args:
+            stage (str): The name of the stage.
+
+        Yields:
+            StageMetrics: The measurements, emitted through stage_measured once the stage is over.
+        """
+
+        metrics = StageMetrics(job_id=self.job.job_id, stage=stage)
+
+        with profiling.section(f"job-{self.job.job_id}", stage):
+            started: float = perf_counter()
+
+            try:
+                yield metrics
+
+            except BaseException:
+                metrics.failed = True
+                raise
+
+            finally:
+                metrics.seconds = perf_counter() - started
+                self.metrics.append(metrics)
+                self.stage_measured.emit(metrics)
+
+    def count_chunks(self, chunks: Iterable[bytes], metrics: StageMetrics, size: int) -> Iterator[bytes]:
+        """Passes chunks through, recording their size and reporting the progress of the stream.
+
+        Args:
+            chunks (Iterable[bytes]): The content of the stream.
+            metrics (StageMetrics): The measurements of the streaming stage.
+            size (int): The size of the stream in bytes, 0 if unknown.
+
+        Yields:
+            bytes: The next chunk.
+        """
+
+        for chunk in chunks:
+            metrics.bytes += len(chunk)
+            self.report_progress("stream", metrics.bytes, size)
+            yield chunk
+
+    def select_stream(self) -> pytube.Stream:
+        """Selects the audio stream to download. The original quality option keeps the stream
+        as is, so the one with the highest bitrate is chosen in that case, as well as when
+        several qualities are produced. The choice is made
+        from the persistent description of the video when it is known.
+
+        Returns:
+            pytube.Stream: The audio stream of the YouTube video.
+        """
+
+        with self.measure("resolve"):
+            info: VideoInfo = videos.describe(self.job.youtube_link)
+            # Copies keep the stream as is, and several bitrates are better made from the best one
+            original: bool = self.job.quality == constants.ORIGINAL_QUALITY or bool(self.job.variants)
+            chosen: AudioStreamInfo | None = info.best_stream() if original else next(iter(info.streams), None)
+
+            if chosen is None:
+                raise ValueError(f"No audio stream is available for {self.job.youtube_link}.")
+
+            self.duration = info.duration
+            return videos.resolve(self.job.youtube_link).streams.get_by_itag(chosen.itag)
+
+    def temporary_file(self, name: str) -> Path:
+        """Gets the path under which an output file is written until it is complete and tagged.
+        The file is hidden and lives in the output folder, so finalize_file only has to link it.
+
+        Args:
+            name (str): The name the file gets if the user entered no artist or title.
+
+        Returns:
+            Path: The path of the hidden file, which keeps the extension ffmpeg relies on.
+        """
+
+        self.default_name = name
+        self.temporary = Path.joinpath(self.output_directory, f".{Path(name).stem}.partial{Path(name).suffix}")
+        return self.temporary
+
+    def quality_folder(self, quality: str) -> Path:
+        """Gets the folder of the output file in the given quality: the output folder itself,
+        or a subfolder named after the quality for jobs producing several of them."""
+
+        return Path.joinpath(self.output_directory, quality) if self.job.variants else self.output_directory
+
+    def output_files(self, file: Path) -> dict[str, Path]:
+        """Gets the output files of the job, keyed by quality, given the one in its main quality."""
+
+        return {self.job.quality: file, **self.variant_files}
+
+    def discard(self) -> None:
+        """Removes the incomplete output of a failed job, if any."""
+
+        for temporary in (self.temporary, *self.variant_files.values()):
+            if temporary is not None:
+                temporary.unlink(missing_ok=True)
+
+    def encoded(self, file: Path) -> None:
+        """Records whether the encoder wrote every tag, and notifies listeners of the conversion.
+
+        Args:
+            file (Path): The encoded file, in the main quality of the job.
+        """
+
+        self.tagged = all(
+            encoding.embeds_tags(path, self.quality_tags(quality), self.job.cover)
+            for quality, path in self.output_files(file).items()
+        )
+        self.file_converted.emit()
+
+    def analyse_file(self, file: Path) -> None:
+        """Measures the loudness and the silences of the downloaded audio file. The gain levelling it
+        is only applied when the audio is re-encoded, original quality files get ReplayGain tags only.
+
+        Args:
+            file (Path): The path to the downloaded audio file.
+        """
+
+        with self.measure("analyse") as metrics:
+            metrics.bytes = file.stat().st_size
+            self.analysis = loudness.analyse(file)
+
+        self.gain = self.analysis.gain()
+
+    @qthread_error_handler
+    def convert_file(self, file: Path) -> Path:
+        """Converts the downloaded audio file to MP3 format, or remuxes it into a taggable
+        container when the original quality is requested, writing the tags in the same pass.
+        ffmpeg reads the file directly, the audio is never decoded on the Python side,
+        except for normalised jobs, which go through loudness.render in fixed-size blocks.
+
+        Args:
+            file (Path): The path to the downloaded audio file.
+
+        Returns:
+            Path: The path to the converted file.
+        """
+
+        self.set_status(JobStatus.CONVERTING)
+        suffix: str = encoding.output_suffix(self.job.quality, self.audio_codec)
+        output_file: Path = self.temporary_file(f"{file.stem}{suffix}")
+
+        if self.job.normalize:
+            self.analyse_file(file)
+
+        with self.measure("encode") as metrics:
+            metrics.bytes = file.stat().st_size
+            on_progress: Callable = lambda seconds: self.report_progress("encode", seconds, self.duration)
+
+            if self.job.variants:
+                self.encode_variants(file, output_file, on_progress)
+
+            elif self.analysis is not None and self.job.quality != constants.ORIGINAL_QUALITY:
+                encoding.encode_pcm(chunks=loudness.render(file, self.analysis, self.gain), destination=output_file,
+                                    quality=self.job.quality, metadata=self.tags, cover=self.job.cover,
+                                    on_progress=on_progress)
+
+            else:
+                encoding.transcode(source=file, destination=output_file, quality=self.job.quality,
+                                   metadata=self.tags, cover=self.job.cover, on_progress=on_progress)
+
+        self.encoded(output_file)
+        self.reach("encoded", self.output_files(output_file))
+        return output_file
+
+    def encode_variants(self, file: Path, output_file: Path, on_progress: Callable[[float], None]) -> None:
+        """Encodes the downloaded audio in every quality of the job. The audio is decoded (and levelled)
+        once, and its PCM blocks are fanned out to one encoder per bitrate, see encoding.encode_many.
+        The original quality is copied separately, as it involves no decoding at all.
+
+        Args:
+            file (Path): The path to the downloaded audio file.
+            output_file (Path): The path of the file in the main quality.
+            on_progress (Callable[[float], None]): Called with the number of seconds of audio encoded so far.
+        """
+
+        stem: str = Path(self.default_name).stem
+
+        for quality in self.job.variants:
+            suffix: str = encoding.output_suffix(quality, self.audio_codec)
+            self.variant_files[quality] = Path.joinpath(self.output_directory, f".{stem}.{quality}.partial{suffix}")
+
+        files: dict[str, Path] = self.output_files(output_file)
+        bitrates: dict[str, Path] = {quality: path for quality, path in files.items()
+                                     if quality != constants.ORIGINAL_QUALITY}
+
+        if bitrates:
+            pcm: Iterator[bytes] = (loudness.render(file, self.analysis, self.gain) if self.analysis
+                                    else encoding.decode_pcm(file))
+            encoding.encode_many(chunks=pcm, destinations=bitrates, metadata=self.quality_tags(next(iter(bitrates))),
+                                 cover=self.job.cover, on_progress=on_progress)
+
+        if constants.ORIGINAL_QUALITY in files:
+            encoding.transcode(source=file, destination=files[constants.ORIGINAL_QUALITY],
+                               quality=constants.ORIGINAL_QUALITY, cover=self.job.cover,
+                               metadata=self.quality_tags(constants.ORIGINAL_QUALITY))
+
+    @qthread_error_handler
+    def download_file(self) -> Path:
+        """Downloads the audio from the YouTube video over several connections.
+        An interrupted download of the same stream is resumed where it stopped.
+        Only the clip is downloaded for clipped jobs, see clips.download_clip.
+
+        Returns:
+            Path: The path to the downloaded audio file.
+        """
+
+        self.set_status(JobStatus.DOWNLOADING)
+        audio_stream = self.select_stream()
+        self.audio_codec = audio_stream.audio_codec
+
+        if self.job.clipped:
+            if self.duration and self.job.start >= self.duration:
+                raise ValueError(f"The clip starts after the end of the video ({self.duration} s).")
+
+            ends: list[float] = [time for time in (self.job.end, self.duration) if time]  # 0 if unknown
+            self.duration = max(min(ends) - self.job.start, 0.0) if ends else 0.0
+
+        self.reach("resolved")
+        # The job ID keeps jobs targeting the same video apart, while the partial file
+        # only depends on the stream so that another session can resume the download
+        filename: str = f"{self.job.job_id}_{audio_stream.default_filename}"
+        partial: str = f"{videos.video_id(self.job.youtube_link)}-{audio_stream.itag}.part"
+
+        with self.measure("download") as metrics:
+            on_progress: Callable = lambda done, total: self.report_progress("download", done, total)
+
+            if self.job.clipped:
+                audio_file: Path = clips.download_clip(
+                    url=audio_stream.url, size=audio_stream.filesize,
+                    destination=Path.joinpath(self.output_directory, filename), start=self.job.start,
+                    end=self.job.end, partial=Path.joinpath(self.output_directory, partial), on_progress=on_progress
+                )
+
+            else:
+                audio_file: Path = downloader.download(
+                    url=audio_stream.url,
+                    destination=Path.joinpath(self.output_directory, filename),
+                    size=audio_stream.filesize,
+                    partial=Path.joinpath(self.output_directory, partial),
+                    on_progress=on_progress
+                )
+
+            metrics.bytes = audio_file.stat().st_size
+
+        self.download_finished.emit()
+        self.reach("downloaded", {"download": audio_file})
+        return audio_file
+
+    @qthread_error_handler
+    def stream_file(self) -> Path:
+        """Downloads the audio from the YouTube video and converts and tags it on the fly.
+        The downloaded bytes are piped straight into the encoder, so the audio is never
+        written to disk nor decoded in memory as a whole.
+
+        Returns:
+            Path: The path to the converted file.
+        """
+
+        self.set_status(JobStatus.DOWNLOADING)
+        audio_stream = self.select_stream()
+        self.audio_codec = audio_stream.audio_codec
+        self.reach("resolved")
+        suffix: str = encoding.output_suffix(self.job.quality, self.audio_codec)
+        output_file: Path = self.temporary_file(f"{self.job.job_id}_{Path(audio_stream.default_filename).stem}{suffix}")
+
+        with self.measure("stream") as metrics:
+            chunks = streaming.iter_chunks(url=audio_stream.url, size=audio_stream.filesize)
+            encoding.encode_stream(chunks=self.count_chunks(chunks, metrics, audio_stream.filesize),
+                                   destination=output_file, quality=self.job.quality,
+                                   metadata=self.tags, cover=self.job.cover)
+
+        self.download_finished.emit()
+        self.encoded(output_file)
+        self.reach("encoded", self.output_files(output_file))
+        return output_file
+
+    @qthread_error_handler
+    def tag_file(self, file: Path) -> None:
+        """Tags the given file with metadata and cover image if available. The encoder already
+        wrote them in most cases, a file is only rewritten when its container could not hold
+        the cover (Ogg Opus) or some of the tags (ReplayGain in m4a). The files of the other
+        qualities of the job, if any, are tagged in the same way.
+
+        Args:
+            file (Path): The path to the MP3 (or original quality) file to be tagged.
+        """
+
+        self.set_status(JobStatus.TAGGING)
+
+        if not self.tagged:
+            with self.measure("tag") as metrics:
+                for quality, path in self.output_files(file).items():
+                    tags: dict = self.quality_tags(quality)
+
+                    if not encoding.embeds_tags(path, tags, self.job.cover):
+                        tagging.write_tags(file=path, metadata=tags, cover=self.job.cover)
+                        metrics.bytes += path.stat().st_size
+
+            self.tagged = True
+
+        self.file_tagged.emit()
+        self.reach("tagged", self.output_files(file))
+
+    @qthread_error_handler
+    def finalize_file(self, file: Path) -> Path:
+        """Gives the tagged file its final name. The complete file is moved there atomically,
+        and a number is appended to the name rather than replacing an existing file.
+        The files of the other qualities of the job, if any, are moved to their folders in the same way.
+
+        Args:
+            file (Path): The path to the tagged file.
+
+        Returns:
+            Path: The final path of the file.
+        """
+
+        metadata = self.job.metadata
+        data: bool = metadata.get("artist") and metadata.get("title")
+        name: str = f"{metadata["artist"]} - {metadata["title"]}" if data else Path(self.default_name).stem
+
+        with self.measure("finalize") as metrics:
+            for quality, path in self.output_files(file).items():
+                folder: Path = self.quality_folder(quality)
+                folder.mkdir(exist_ok=True)
+                destination: Path = Path.joinpath(folder, name + path.suffix)
+                self.outputs[quality] = move_to_free_name(source=path, destination=destination)
+                metrics.bytes += self.outputs[quality].stat().st_size
+
+        self.reach("finalised", dict(self.outputs))
+        file = self.outputs[self.job.quality]
+        self.output_file = file
+        self.temporary = None
+        self.variant_files = {}
+        self.percent = 100
+        self.progress_changed.emit(Progress(stage="finalize", done=metrics.bytes, total=metrics.bytes, percent=100))
+        self.set_status(JobStatus.DONE)
+        return file
+
+    def skip(self, entries: dict[str, ArchiveEntry]) -> None:
+        """Ends the job without doing anything, the files it would produce already existing.
+
+        Args:
+            entries (dict[str, ArchiveEntry]): The files produced earlier for the video, in every quality of the job.
+        """
+
+        self.end_skipped({quality: entry.path for quality, entry in entries.items()}, entries[self.job.quality].size)
+
+    def end_skipped(self, outputs: dict[str, Path], size: int) -> None:
+        """Ends the job on files that already existed, see skip and find_duplicate.
+
+        Args:
+            outputs (dict[str, Path]): The existing files, keyed by quality, the main quality of the job included.
+            size (int): The size of the file in the main quality.
+        """
+
+        self.outputs = outputs
+        self.output_file = self.outputs[self.job.quality]
+        self.skipped = True
+        self.percent = 100
+        self.job_skipped.emit(self.output_file)
+        self.progress_changed.emit(Progress(stage="skip", done=size, total=size, percent=100))
+        self.set_status(JobStatus.DONE)
+
+    def find_duplicate(self, file: Path) -> bool:
+        """Fingerprints the audio of the job and looks it up in the library, if there is a fingerprint index.
+        A match is reported through duplicate_found, and ends the job if it skips duplicates, its files
+        being removed. The check is best effort: a file that cannot be fingerprinted is not a duplicate.
+
+        Args:
+            file (Path): The downloaded or encoded audio file.
+
+        Returns:
+            bool: Whether the job ended there.
+        """
+
+        if self.fingerprints is None:
+            return False
+
+        try:
+            with self.measure("fingerprint") as metrics:
+                metrics.bytes = file.stat().st_size
+                self.fingerprint = fingerprint_file(file)
+                self.duplicate = self.fingerprints.match(self.fingerprint)
+
+        except (EncoderError, DatabaseError, OSError):
+            return False
+
+        if self.duplicate is None:
+            return False
+
+        try:
+            size: int = self.duplicate.path.stat().st_size
+
+        except OSError:  # Deleted or moved since it was matched, the job goes on as if there was no match
+            stale, self.duplicate = self.duplicate.path, None
+
+            try:
+                self.fingerprints.forget(stale)
+
+            except DatabaseError:
+                pass
+
+            return False
+
+        self.duplicate_found.emit(self.duplicate)
+
+        if not self.job.skip_duplicates:
+            return False
+
+        self.discard()
+        self.end_skipped({self.job.quality: self.duplicate.path}, size)
+        return True
+
+    def run_conversion(self, file: Path) -> Path | None:
+        """CPU-bound part of the job: duplicate check, conversion, then removal of the downloaded file.
+
+        Returns:
+            Path | None: The converted file, or None if the job ended as a duplicate.
+        """
+
+        output_file: Path | None = None if self.find_duplicate(file) else self.convert_file(file=file)
+
+        if isinstance(file, Path) and file.is_file():
+            file.unlink()
+
+        return output_file
+
+    def run_tagging(self, file: Path | None) -> Path:
+        """I/O-bound end of the job: duplicate check if not done yet (streaming jobs), tagging and renaming."""
+
+        if file is None or (self.fingerprint is None and self.find_duplicate(file)):
+            return self.output_file
+
+        self.tag_file(file=file)
+        return self.finalize_file(file=file)
+
+    def run(self) -> Path:
+        """Runs every stage of the job sequentially in the calling thread."""
+
+        if self.job.streamed:
+            return self.run_tagging(file=self.stream_file())
+
+        file: Path = self.download_file()
+        return self.run_tagging(file=self.run_conversion(file=file))
+
+
+class JobRunner:
+    """
+    Runs jobs concurrently. Downloads and tagging are I/O-bound and go to a thread pool
+    of constants.IO_WORKERS threads, while conversions go to a pool sized to the number
+    of cores (the actual encoding happens in ffmpeg child processes, so threads are enough
+    to keep every core busy). Streaming jobs download while they encode, so that stage
+    goes to the CPU pool as well.
+
+    The job_submitted event is emitted synchronously before any work is queued,
+    so listeners can connect to the per-job events without missing any of them.
+    When a metrics log is given, the measurements of every stage of every job are appended to it.
+    When an archive is given, jobs whose video was already produced in each of their qualities end
+    right after job_submitted, without any network access, and every file produced is recorded.
+    When a fingerprint index is given, the audio of every job is looked up in the library, and every
+    file produced is added to it (see Pipeline.find_duplicate).
+    When a journal is given, every job and the stages it completes are written down until it ends,
+    and resume picks up the jobs of earlier sessions after their last completed stage. Jobs cancelled
+    by shutdown are then kept, files included, to be resumed by the next session.
+    """
+
+    job_submitted = Event()
+    job_finished = Event()
+
+    def __init__(self, io_workers: int = constants.IO_WORKERS, cpu_workers: int = constants.CPU_WORKERS,
+                 output_directory: Path = constants.OUTPUT_FOLDER, metrics_log: MetricsLog | None = None,
+                 archive: Archive | None = None, journal: Journal | None = None,
+                 fingerprints: FingerprintIndex | None = None):
+
+        self.output_directory: Path = output_directory
+        self.metrics_log: MetricsLog | None = metrics_log
+        self.archive: Archive | None = archive
+        self.journal: Journal | None = journal
+        self.fingerprints: FingerprintIndex | None = fingerprints
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+        self.cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="cpu")
+        self.pipelines: dict[int, Pipeline] = {}
+        self.entries: dict[int, int | None] = {}  # Journal entry of each job
+
+    def submit(self, job: Job, entry: JournalEntry | None = None) -> Pipeline:
+        """Queues a job for processing.
+
+        Args:
+            job (Job): The job to process.
+            entry (JournalEntry | None): The journal entry of the job, if it was interrupted in an earlier session.
+
+        Returns:
+            Pipeline: The object processing the job, which carries its status and events.
+        """
+
+        pipeline = Pipeline(job=job, output_directory=entry.output_directory if entry else self.output_directory,
+                            fingerprints=self.fingerprints)
+        self.pipelines[job.job_id] = pipeline
+
+        if self.metrics_log is not None:
+            pipeline.stage_measured.connect(self.metrics_log.write)
+
+        self.job_submitted.emit(pipeline)
+        identifier: str | None = videos.video_id(job.youtube_link)
+        entries: dict[str, ArchiveEntry | None] = {}
+
+        if self.archive is not None and identifier is not None and not job.clipped:
+            entries = {quality: self.archive.lookup(identifier, quality) for quality in job.qualities}
+
+        if entries and all(entries.values()):
+            self.entries[job.job_id] = entry.entry_id if entry else None
+            pipeline.skip(entries)
+            self.finish(pipeline)
+            return pipeline
+
+        if self.journal is not None:
+            entry_id: int | None = entry.entry_id if entry else self.journal.start(job, pipeline.output_directory)
+            self.entries[job.job_id] = entry_id
+            pipeline.checkpoint.connect(partial(self.journal.record, entry_id))
+
+        stage, files = entry.resume_point() if entry else (None, {})
+
+        if stage is not None:
+            self.resume_stages(pipeline, entry, stage, files)
+            return pipeline
+
+        if job.streamed:
+            stages: list[tuple] = [
+                (self.cpu_pool, pipeline.stream_file),
+                (self.io_pool, pipeline.run_tagging)
+            ]
+
+        else:
+            stages: list[tuple] = [
+                (self.io_pool, pipeline.download_file),
+                (self.cpu_pool, pipeline.run_conversion),
+                (self.io_pool, pipeline.run_tagging)
+            ]
+
+        self.run_stages(pipeline, stages)
+        return pipeline
+
+    def resume_stages(self, pipeline: Pipeline, entry: JournalEntry, stage: str, files: dict[str, Path]) -> None:
+        """Runs the stages following the last one an interrupted job completed, on the files it produced.
+        The files of the earlier stages that were left behind are removed.
+
+        Args:
+            pipeline (Pipeline): The object processing the job.
+            entry (JournalEntry): The journal entry of the job.
+            stage (str): The last stage completed, see JournalEntry.resume_point.
+            files (dict[str, Path]): The files it produced.
+        """
+
+        for path in entry.obsolete(stage):
+            path.unlink(missing_ok=True)
+
+        pipeline.resume(stage, files, entry.state)
+
+        if stage == "downloaded":
+            stages: list[tuple] = [(self.cpu_pool, pipeline.run_conversion), (self.io_pool, pipeline.run_tagging)]
+            self.run_stages(pipeline, stages, files["download"])
+
+        elif stage == "encoded":
+            self.run_stages(pipeline, [(self.io_pool, pipeline.run_tagging)], pipeline.temporary)
+
+        elif stage == "tagged":
+            self.run_stages(pipeline, [(self.io_pool, pipeline.finalize_file)], pipeline.temporary)
+
+        else:
+            self.archive_output(pipeline)
+            self.finish(pipeline)
+
+    def submit_many(self, jobs: Iterable[Job]) -> list[Pipeline]:
+        """Queues several jobs, such as the videos of an imported file, their journal entries being
+        written in a single transaction, see Journal.batch.
+
+        Args:
+            jobs (Iterable[Job]): The jobs to process.
+
+        Returns:
+            list[Pipeline]: The objects processing the jobs, in the same order.
+        """
+
+        with self.journal.batch() if self.journal is not None else nullcontext():
+            return [self.submit(job) for job in jobs]
+
+    def resume(self) -> list[Pipeline]:
+        """Queues the jobs that earlier sessions left unfinished, if there is a journal.
+
+        Returns:
+            list[Pipeline]: The objects processing the jobs, oldest job first.
+        """
+
+        if self.journal is None:
+            return []
+
+        return [self.submit(entry.job, entry) for entry in self.journal.interrupted()]
+
+    def run_stages(self, pipeline: Pipeline, stages: list[tuple], *args) -> None:
+        """Submits the first stage to its pool, the remaining ones follow once it has completed.
+
+        Args:
+            pipeline (Pipeline): The object processing the job.
+            stages (list[tuple]): The (pool, stage) pairs still to run, in order.
+            *args: The result of the previous stage, if any.
+        """
+
+        pool, stage = stages[0]
+
+        try:
+            future: Future = pool.submit(stage, *args)
+
+        except RuntimeError:  # The pool has been shut down
+            pipeline.error = "The job was cancelled."
+            pipeline.set_status(JobStatus.FAILED)
+            self.finish(pipeline, interrupted=True)
+            return
+
+        future.add_done_callback(partial(self.on_stage_done, pipeline, stages[1:]))
+
+    def on_stage_done(self, pipeline: Pipeline, remaining: list[tuple], future: Future) -> None:
+        """Moves a job on to its next stage, or records its outcome if there is nothing left to do."""
+
+        interrupted: bool = future.cancelled() and self.journal is not None  # Kept to be resumed
+
+        if future.cancelled() or future.exception() is not None:
+            pipeline.error = "The job was cancelled." if future.cancelled() else str(future.exception())
+
+            if not interrupted:
+                pipeline.discard()
+
+            pipeline.set_status(JobStatus.FAILED)
+
+        elif remaining:
+            self.run_stages(pipeline, remaining, future.result())
+            return
+
+        else:
+            self.archive_output(pipeline)
+            self.index_output(pipeline)
+
+        self.finish(pipeline, interrupted=interrupted)
+
+    def finish(self, pipeline: Pipeline, interrupted: bool = False) -> None:
+        """Lets go of a job that has ended, and notifies listeners. Its journal entry is removed,
+        unless the job was interrupted and has to be resumed."""
+
+        entry_id: int | None = self.entries.pop(pipeline.job.job_id, None)
+
+        if self.journal is not None and not interrupted:
+            self.journal.finish(entry_id)
+
+        self.pipelines.pop(pipeline.job.job_id, None)
+        self.job_finished.emit(pipeline)
+
+    def archive_output(self, pipeline: Pipeline) -> None:
+        """Records the file produced by a successful job in the archive, if there is one.
+        The job has succeeded either way, so a failure to record it is ignored."""
+
+        identifier: str | None = videos.video_id(pipeline.job.youtube_link)
+
+        if self.archive is None or identifier is None or pipeline.skipped or pipeline.job.clipped:
+            return  # Skipped as a duplicate of another video, or holding part of the video only
+
+        try:
+            for quality, path in pipeline.outputs.items():
+                self.archive.record(identifier, quality, path)
+
+        except (DatabaseError, OSError):
+            pass
+
+    def index_output(self, pipeline: Pipeline) -> None:
+        """Adds the file produced by a successful job to the fingerprint index, if there is one.
+        The job has succeeded either way, so a failure to add it is ignored."""
+
+        if self.fingerprints is None or pipeline.fingerprint is None or pipeline.skipped:
+            return
+
+        try:
+            self.fingerprints.add(pipeline.output_file, pipeline.fingerprint)
+
+        except (DatabaseError, OSError):
+            pass
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Cancels the queued stages and lets the running ones finish in the background.
+
+        Args:
+            wait (bool): Whether to block until the running stages have finished.
+        """
+
+        self.io_pool.shutdown(wait=wait, cancel_futures=True)
+        self.cpu_pool.shutdown(wait=wait, cancel_futures=True)
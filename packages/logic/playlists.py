@@ -0,0 +1,205 @@
+"""
+This module expands playlists and channels into the videos they contain. Videos are resolved
+(their title and streams described, see videos.describe) concurrently on the network loop, a
+bounded number at a time, while the list is still being read page by page, and each one is
+handed over as soon as it is resolved, so the first jobs start long before the last entries of
+a large playlist are even known. Resolved videos are cached, which makes the jobs themselves
+skip that work.
+"""
+
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from queue import SimpleQueue
+from threading import Event, Semaphore, Thread
+from typing import Callable, Iterator, Mapping, NamedTuple
+
+from packages.constants import constants
+from packages.logic.metadata_store import VideoInfo
+
+
+PLAYLIST_PATTERN: re.Pattern = re.compile(r"youtube\.com/playlist\?(?:[^#]*&)?list=[\w-]+")
+CHANNEL_PATTERN: re.Pattern = re.compile(
+    r"youtube\.com/(?:channel/[\w-]+|c/[^/?#]+|user/[^/?#]+|@[^/?#]+)(?:/(?:videos|featured))?/?(?:[?#]|$)"
+)
+
+
+class Listing(NamedTuple):
+    """The content of a playlist or channel: its title, its number of videos (0 if unknown) and their links."""
+
+    title: str
+    total: int
+    urls: Iterator[str]
+
+
+class PlaylistEntry(NamedTuple):
+    """A video of a playlist or channel, once resolved. Either info or error is None."""
+
+    url: str
+    position: int
+    total: int
+    playlist_title: str
+    info: VideoInfo | None = None
+    error: str | None = None
+
+
+def is_collection(url: str) -> bool:
+    """Check if a link points to a playlist or a channel rather than a single video.
+    Watch links carrying a playlist (watch?v=...&list=...) are single videos, as on YouTube.
+
+    Args:
+        url (str): The link to check.
+
+    Returns:
+        bool: True if the link is a playlist or channel link; False otherwise.
+    """
+
+    return bool(PLAYLIST_PATTERN.search(url) or CHANNEL_PATTERN.search(url))
+
+
+def list_videos(url: str) -> Listing:
+    """List the videos of a YouTube playlist or channel. Pages of the list are only
+    requested as the returned links are consumed.
+
+    Args:
+        url (str): The link of the playlist or channel.
+
+    Returns:
+        Listing: The title, size and links of the videos.
+    """
+
+    import pytube
+
+    if PLAYLIST_PATTERN.search(url):
+        playlist = pytube.Playlist(url)
+
+        try:
+            total: int = playlist.length
+
+        except (KeyError, IndexError, ValueError, TypeError):  # The size is only given in the sidebar
+            total = 0
+
+        return Listing(title=playlist.title or "", total=total, urls=playlist.url_generator())
+
+    channel = pytube.Channel(url)
+    return Listing(title=channel.channel_name or "", total=0, urls=channel.url_generator())
+
+
+def expand(url: str, lister: Callable[[str], Listing] = list_videos, resolver: Callable[[str], VideoInfo] | None = None,
+           concurrency: int = constants.RESOLVE_CONCURRENCY) -> Iterator[PlaylistEntry]:
+    """Resolve the videos of a playlist or channel concurrently.
+
+    Args:
+        url (str): The link of the playlist or channel.
+        lister (Callable[[str], Listing]): Lists the videos of the link.
+        resolver (Callable[[str], VideoInfo] | None): Describes a video from its link on a pool of threads,
+            if None videos.describe_async does it on the network loop, without holding any thread.
+        concurrency (int): The maximum number of videos resolved at the same time.
+
+    Yields:
+        PlaylistEntry: Each video, in the order the resolutions complete, with its position in the list.
+    """
+
+    listing: Listing = lister(url)
+    results: SimpleQueue = SimpleQueue()
+    stopped = Event()
+
+    slots = Semaphore(max(concurrency, 1))
+    pool: ThreadPoolExecutor | None = None
+
+    if resolver is not None:
+        pool = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="resolve")
+
+    def start(video_url: str) -> Future:
+
+        if pool is not None:
+            return pool.submit(resolver, video_url)
+
+        from packages.logic import network, videos
+
+        return network.shared().submit(videos.describe_async(video_url))
+
+    def finish(position: int, video_url: str, future: Future) -> None:
+
+        slots.release()
+
+        if future.cancelled():
+            return
+
+        entry = PlaylistEntry(url=video_url, position=position, total=listing.total, playlist_title=listing.title)
+        error: BaseException | None = future.exception()
+
+        if error is None:
+            entry = entry._replace(info=future.result())
+
+        else:
+            entry = entry._replace(error=str(error) or type(error).__name__)
+
+        results.put(entry)
+
+    def produce() -> None:
+
+        submitted: int = 0
+
+        try:
+            for position, video_url in enumerate(listing.urls, start=1):
+                if stopped.is_set():
+                    break
+
+                slots.acquire()
+                start(video_url).add_done_callback(partial(finish, position, video_url))
+                submitted += 1
+
+        except Exception as error:  # Reading the next page failed, the entries already listed are kept
+            results.put(error)
+
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=stopped.is_set())
+
+            results.put(submitted)
+
+    Thread(target=produce, daemon=True).start()
+    expected: int | None = None
+    received: int = 0
+    failure: Exception | None = None
+
+    try:
+        while expected is None or received < expected:
+            item = results.get()
+
+            if isinstance(item, Exception):
+                failure = item
+
+            elif isinstance(item, int):
+                expected = item
+
+            else:
+                received += 1
+                yield item
+
+    finally:
+        stopped.set()
+
+    if failure is not None:
+        raise failure
+
+
+def entry_metadata(entry: PlaylistEntry, template: Mapping) -> dict:
+    """Build the tags of a playlist entry. The tags entered by the user apply to every entry,
+    except the title, which comes from the video, and the track number, which comes from
+    the position of the video in the playlist. The album defaults to the playlist title.
+
+    Args:
+        entry (PlaylistEntry): The resolved video.
+        template (Mapping): The tags entered by the user.
+
+    Returns:
+        dict: The tags of the video.
+    """
+
+    metadata: dict = dict(template)
+    metadata["title"] = entry.info.title if entry.info else ""
+    metadata["album"] = template.get("album") or entry.playlist_title
+    metadata["track_number"] = f"{entry.position}/{entry.total}" if entry.total else str(entry.position)
+    return metadata
@@ -0,0 +1,236 @@
+"""
+This module provides the developer profiling mode, which tells where the time and memory of a job go:
+YouTube parsing, decoding, ffmpeg, tagging or image processing. It is off unless the environment
+variable named by constants.PROFILE_VARIABLE is set (to a folder, or to "1" for constants.PROFILE_FOLDER)
+or the command line interface is given --profile, and a section then costs a single global lookup.
+
+When it is on, every section of code wrapped by section (each stage of a job, album covers and
+copyright checks) records:
+    - cProfile statistics, saved as a .pstats file readable by pstats, snakeviz and friends;
+    - stacks sampled every constants.PROFILE_INTERVAL seconds, saved in the collapsed format
+      (one "frame;frame;frame count" line per stack) read by flamegraph.pl, speedscope and inferno;
+    - the peak of the memory allocated by Python, and the lines holding the most memory at the end;
+    - the CPU time of the section's thread and of the child processes (ffmpeg) that ended meanwhile.
+
+Files are written to one folder per job, under a folder per session, and a summary of every section
+is appended to the profile.jsonl file of the session. Memory and child process times being
+process-wide, sections are profiled one at a time: the others wait for their turn.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter, thread_time
+from types import FrameType
+from typing import ContextManager, Iterator
+
+from packages.constants import constants
+
+try:
+    import resource
+
+except ImportError:  # Windows, where child process times are not reported
+    resource = None
+
+
+def frame_name(frame: FrameType) -> str:
+    """Get the name of a frame in a collapsed stack, e.g. "pipeline:Pipeline.convert_file"."""
+
+    return f"{Path(frame.f_code.co_filename).stem}:{frame.f_code.co_qualname}"
+
+
+def collapse(frame: FrameType) -> str:
+    """Get the stack of a frame in the collapsed format, outermost frame first."""
+
+    names: list[str] = []
+
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+def children_time() -> float:
+    """Get the CPU time, user and system, of the child processes that ended so far, 0 if unknown."""
+
+    if resource is None:
+        return 0.0
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of a thread, sampled at a fixed interval until it is stopped."""
+
+    def __init__(self, thread_id: int, interval: float = constants.PROFILE_INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+
+        self.thread_id: int = thread_id
+        self.interval: float = interval
+        self.stacks: Counter = Counter()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+
+        while not self.stopped.wait(self.interval):
+            frame: FrameType | None = sys._current_frames().get(self.thread_id)
+
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self) -> Counter:
+        """Stop sampling.
+
+        Returns:
+            Counter: The number of samples of each collapsed stack.
+        """
+
+        self.stopped.set()
+        self.join()
+        return self.stacks
+
+
+class Profiler:
+    """
+    Profiles sections of code, one at a time, and writes the results to a folder, see the module documentation.
+    A section entered while the same thread is already profiling one is part of it, and is not profiled on its own.
+    """
+
+    def __init__(self, folder: Path = constants.PROFILE_FOLDER, top: int = constants.PROFILE_TOP_ALLOCATIONS):
+
+        self.folder: Path = Path.joinpath(folder, f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}")
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.top: int = top
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def section(self, name: str, stage: str, wait: bool = True) -> Iterator[None]:
+        """Profile the code run in the context.
+
+        Args:
+            name (str): What the code works for, e.g. "job-3" or "cover", which names the folder of the results.
+            stage (str): What the code does, e.g. "encode", which names the files of the results.
+            wait (bool): Whether to wait while another section is being profiled, or to run unprofiled.
+                The GUI thread does not wait.
+        """
+
+        if getattr(self.local, "active", False) or not self.lock.acquire(blocking=wait):
+            yield
+            return
+
+        self.local.active = True
+        sampler = StackSampler(threading.get_ident())
+        profile = cProfile.Profile()
+        tracing: bool = tracemalloc.is_tracing()  # Already started by the user, with python -X tracemalloc
+
+        if tracing:
+            tracemalloc.reset_peak()
+
+        else:
+            tracemalloc.start()
+
+        children: float = children_time()
+        cpu: float = thread_time()
+        started: float = perf_counter()
+        sampler.start()
+        profile.enable()
+
+        try:
+            yield
+
+        finally:
+            profile.disable()
+            stacks: Counter = sampler.stop()
+            summary: dict = {
+                "name": name,
+                "stage": stage,
+                "seconds": round(perf_counter() - started, 6),
+                "cpu_seconds": round(thread_time() - cpu, 6),
+                "children_seconds": round(children_time() - children, 6),
+                "peak_memory": tracemalloc.get_traced_memory()[1],
+                "allocations": self.allocations(tracemalloc.take_snapshot())
+            }
+
+            if not tracing:
+                tracemalloc.stop()
+
+            self.local.active = False
+            self.lock.release()
+            self.save(summary, profile, stacks)
+
+    def allocations(self, snapshot: tracemalloc.Snapshot) -> list[dict]:
+        """Get the lines holding the most memory allocated during a section, largest first,
+        those of the profilers themselves aside."""
+
+        statistics: list[tracemalloc.Statistic] = snapshot.filter_traces(
+            [tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, sys.modules[__name__])]
+        ).statistics("lineno")
+        return [{"site": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+                 "size": statistic.size, "count": statistic.count} for statistic in statistics[:self.top]]
+
+    def save(self, summary: dict, profile: cProfile.Profile, stacks: Counter) -> None:
+        """Write the results of a section. Profiling never makes a job fail, so write errors are ignored."""
+
+        folder: Path = Path.joinpath(self.folder, summary["name"])
+        stage: str = summary["stage"]
+
+        try:
+            folder.mkdir(exist_ok=True)
+            profile.dump_stats(Path.joinpath(folder, f"{stage}.pstats"))
+
+            with open(Path.joinpath(folder, f"{stage}.collapsed"), "w", encoding="UTF-8") as file:
+                file.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+            with open(Path.joinpath(self.folder, "profile.jsonl"), "a", encoding="UTF-8") as file:
+                file.write(json.dumps(summary) + "\n")
+
+        except OSError:
+            pass
+
+
+def from_environment() -> Profiler | None:
+    """Get a profiler if the environment variable named by constants.PROFILE_VARIABLE asks for one."""
+
+    value: str = os.environ.get(constants.PROFILE_VARIABLE, "")
+
+    if not value or value == "0":
+        return None
+
+    return Profiler(folder=constants.PROFILE_FOLDER if value == "1" else Path(value).expanduser())
+
+
+profiler: Profiler | None = from_environment()
+
+
+def enable(folder: Path = constants.PROFILE_FOLDER) -> Profiler:
+    """Turn the profiling mode on, unless the environment already did.
+
+    Args:
+        folder (Path): The folder the results are written to, in a subfolder per session.
+
+    Returns:
+        Profiler: The profiler in use.
+    """
+
+    global profiler
+
+    if profiler is None:
+        profiler = Profiler(folder=folder)
+
+    return profiler
+
+
+def section(name: str, stage: str, wait: bool = True) -> ContextManager:
+    """Profile the code run in the context, if the profiling mode is on, see Profiler.section."""
+
+    return nullcontext() if profiler is None else profiler.section(name, stage, wait)
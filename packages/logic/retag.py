@@ -0,0 +1,205 @@
+"""
+This module re-tags existing libraries in bulk. A manifest maps audio files to tags and covers,
+files are shared out between worker processes, and those already holding the requested tags are
+not written at all. MP3 files get the same ID3 frames as the files produced by the application,
+saved in place within the padding of their tag so the audio data is never rewritten.
+"""
+
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from mutagen import id3
+
+from packages.constants import constants
+from packages.logic import covers, tagging
+from packages.logic.toolkit import check_data
+
+
+FRAMES: dict = {
+    "title": "TIT2",
+    "artist": "TPE1",
+    "album": "TALB",
+    "year": "TDRC",
+    "genre": "TCON",
+    "copyright": "TCOP",
+    "disc_number": "TPOS",
+    "track_number": "TRCK"
+}
+
+
+class RetagEntry(NamedTuple):
+    """A line of the manifest: the file, the tags to set on it, and the path of its cover."""
+
+    path: str
+    tags: dict
+    cover: str | None = None
+
+
+def parse_entry(record: dict, base: Path) -> RetagEntry:
+    """Turn a manifest record into an entry. Empty values are dropped, so they leave
+    the existing tags of the file as they are.
+
+    Args:
+        record (dict): The record, holding a "path" key, tags, and optionally a "cover" key.
+        base (Path): The folder relative paths are resolved against.
+
+    Returns:
+        RetagEntry: The entry.
+    """
+
+    tags: dict = {key: str(record[key]) for key in FRAMES if record.get(key) not in (None, "")}
+    cover: str | None = str(base / record["cover"]) if record.get("cover") else None
+    return RetagEntry(path=str(base / (record.get("path") or "")), tags=tags, cover=cover)
+
+
+def read_manifest(manifest: Path) -> Iterator[RetagEntry]:
+    """Read a CSV or JSON manifest. A CSV file needs a header row with a "path" column and any of
+    the tag columns, while a JSON file holds either a list of such objects or an object mapping
+    each path to its tags. Relative paths are relative to the manifest.
+
+    Args:
+        manifest (Path): The path to the manifest, its format being given by its extension.
+
+    Yields:
+        RetagEntry: The next entry.
+    """
+
+    base: Path = manifest.expanduser().resolve().parent
+
+    if manifest.suffix.lower() == ".csv":
+        with open(manifest, "r", encoding="UTF-8", newline="") as file:
+            yield from (parse_entry(record, base) for record in csv.DictReader(file))
+
+        return
+
+    with open(manifest, "r", encoding="UTF-8") as file:
+        content = json.load(file)
+
+    if isinstance(content, dict):
+        content = [{**tags, "path": path} for path, tags in content.items()]
+
+    yield from (parse_entry(record, base) for record in content)
+
+
+@lru_cache(maxsize=64)
+def load_cover(path: str) -> bytes:
+    """Prepare a cover once per worker process, as many files usually share the same one."""
+
+    return covers.process_cover(source=Path(path))
+
+
+def frame_matches(tags: id3.ID3, frame: id3.Frame) -> bool:
+    """Check if a file already holds the given frame with the same content.
+
+    Args:
+        tags (id3.ID3): The current tags of the file.
+        frame (id3.Frame): The wanted frame.
+
+    Returns:
+        bool: True if writing the frame would not change anything; False otherwise.
+    """
+
+    if isinstance(frame, id3.APIC):
+        return any(picture.type == frame.type and picture.data == frame.data for picture in tags.getall("APIC"))
+
+    current: id3.Frame | None = tags.get(frame.FrameID)
+    return current is not None and [str(text) for text in current.text] == [str(text) for text in frame.text]
+
+
+def retag_mp3(file: Path, metadata: dict, cover: bytes | None) -> bool:
+    """Set the given tags on an MP3 file, in place and only if one of them differs.
+
+    Args:
+        file (Path): The path to the MP3 file.
+        metadata (dict): The tags to set, the others being left as they are.
+        cover (bytes | None): The album cover in PNG or JPEG format.
+
+    Returns:
+        bool: True if the file was written; False if it already held these tags.
+    """
+
+    try:
+        tags = id3.ID3(file)
+
+    except id3.ID3NoHeaderError:
+        tags = id3.ID3()
+
+    wanted: set[str] = {FRAMES[key] for key in metadata} | ({"APIC"} if cover else set())
+    frames: list[id3.Frame] = [
+        frame for frame in tagging.id3_frames({key: metadata.get(key, "") for key in FRAMES}, cover)
+        if frame.FrameID in wanted and not frame_matches(tags, frame)
+    ]
+
+    if not frames:
+        return False
+
+    if cover:
+        tags.delall("APIC")
+
+    for frame in frames:
+        tags.add(frame)
+
+    tags.save(file, padding=tagging.id3_padding)
+    return True
+
+
+def retag_file(entry: RetagEntry) -> dict:
+    """Apply a manifest entry. Runs in a worker process, so errors are returned rather than raised.
+
+    Args:
+        entry (RetagEntry): The file and its tags.
+
+    Returns:
+        dict: The path, the status ("updated", "unchanged" or "failed") and the error, if any.
+    """
+
+    file: Path = Path(entry.path)
+    numbers: list[str] = [
+        entry.tags.get("year", ""),
+        *entry.tags.get("disc_number", "").split("/"),
+        *entry.tags.get("track_number", "").split("/")
+    ]
+
+    try:
+        if not check_data(strings=numbers):
+            raise ValueError("One or more tags are non-numeric.")
+
+        if file.suffix.lower() not in tagging.TAGGERS:
+            raise ValueError(f"Files with the {file.suffix or 'empty'} extension cannot be tagged.")
+
+        if not file.is_file():
+            raise FileNotFoundError(f"No such file: {file}")
+
+        cover: bytes | None = load_cover(entry.cover) if entry.cover else None
+
+        if file.suffix.lower() == ".mp3":
+            updated: bool = retag_mp3(file, entry.tags, cover)
+
+        else:
+            tagging.write_tags(file, entry.tags, cover)
+            updated = True
+
+    except Exception as error:
+        return {"path": entry.path, "status": "failed", "error": str(error)}
+
+    return {"path": entry.path, "status": "updated" if updated else "unchanged", "error": None}
+
+
+def retag(entries: Iterable[RetagEntry], workers: int = constants.CPU_WORKERS, chunk_size: int = 32) -> Iterator[dict]:
+    """Re-tag many files on a pool of processes, mutagen being too CPU-bound for threads.
+
+    Args:
+        entries (Iterable[RetagEntry]): The files and their tags.
+        workers (int): The number of worker processes.
+        chunk_size (int): The number of entries sent to a worker at once.
+
+    Yields:
+        dict: The outcome of each entry, in the order of the manifest.
+    """
+
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+        yield from executor.map(retag_file, entries, chunksize=chunk_size)
@@ -0,0 +1,48 @@
+"""
+This module reads audio streams over HTTP in small fixed-size chunks, so they can be
+handed to an encoder while the download is still running. The ranges are requested
+through the shared network loop, and therefore over its pooled keep-alive connections.
+"""
+
+from typing import Iterator
+
+from packages.constants import constants
+from packages.logic import network
+
+
+def iter_chunks(url: str, size: int, chunk_size: int = constants.STREAM_CHUNK_SIZE,
+                range_size: int = constants.STREAM_RANGE_SIZE) -> Iterator[bytes]:
+    """Yield the content of a stream chunk by chunk.
+
+    The stream is requested in successive ranges of range_size bytes (YouTube throttles
+    requests for a whole stream), and each range is read chunk_size bytes at a time,
+    so no more than one chunk is ever held in memory.
+
+    Args:
+        url (str): The URL of the stream.
+        size (int): The size of the stream in bytes, 0 if unknown.
+        chunk_size (int): The maximum size of the yielded chunks.
+        range_size (int): The size of each ranged request.
+
+    Yields:
+        bytes: The next chunk of the stream.
+    """
+
+    loop: network.NetworkLoop = network.shared()
+
+    if not size:
+        yield from loop.stream(url, chunk_size=chunk_size)
+        return
+
+    separator: str = "&" if "?" in url else "?"
+    downloaded: int = 0
+
+    while downloaded < size:
+        stop: int = min(downloaded + range_size, size) - 1
+
+        for chunk in loop.stream(f"{url}{separator}range={downloaded}-{stop}", chunk_size=chunk_size):
+            downloaded += len(chunk)
+            yield chunk
+
+        if downloaded <= stop:
+            raise ConnectionError(f"The server closed the connection after {downloaded} of {size} bytes.")
@@ -0,0 +1,218 @@
+"""
+This module writes user information into audio files. MP3 files get ID3 frames,
+while the containers produced by the "original quality" option (m4a and opus)
+get the equivalent atoms or Vorbis comments.
+"""
+
+from base64 import b64encode
+from pathlib import Path
+from typing import Mapping
+
+from mutagen import id3, mp4, oggopus
+from mutagen.flac import Picture
+
+from packages.constants import constants
+
+
+def split_number(value: str | None) -> tuple[int, int]:
+    """Split a "number/total" string into integers, missing parts being 0.
+
+    Args:
+        value (str | None): A string such as "3/12", "3/" or "/12".
+
+    Returns:
+        tuple[int, int]: The number and the total.
+    """
+
+    number, _, total = (value or "").partition("/")
+    return int(number or 0), int(total or 0)
+
+
+def cover_mime(cover: bytes) -> str:
+    """Get the MIME type of a cover from its first bytes.
+
+    Args:
+        cover (bytes): The album cover, in JPEG or PNG format.
+
+    Returns:
+        str: "image/jpeg" or "image/png".
+    """
+
+    return "image/jpeg" if cover.startswith(b"\xff\xd8") else "image/png"
+
+
+TXXX_FRAMES: dict = {  # Tags without a frame of their own, described as ffmpeg does
+    "comment": "comment",
+    "replaygain_track_gain": "REPLAYGAIN_TRACK_GAIN",
+    "replaygain_track_peak": "REPLAYGAIN_TRACK_PEAK"
+}
+
+
+def id3_frames(metadata: Mapping, cover: bytes | None = None) -> list[id3.Frame]:
+    """Build the ID3 frames holding the given tags, the same ones whatever the caller.
+
+    Args:
+        metadata (Mapping): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format.
+
+    Returns:
+        list[id3.Frame]: The text frames, followed by the TXXX and cover frames if there are any.
+    """
+
+    frames: list[id3.Frame] = [
+        id3.TIT2(encoding=3, text=metadata.get("title")),
+        id3.TPE1(encoding=3, text=metadata.get("artist")),
+        id3.TALB(encoding=3, text=metadata.get("album")),
+        id3.TDRC(encoding=3, text=metadata.get("year")),
+        id3.TCON(encoding=3, text=metadata.get("genre")),
+        id3.TCOP(encoding=3, text=metadata.get("copyright")),
+        id3.TPOS(encoding=3, text=metadata.get("disc_number")),
+        id3.TRCK(encoding=3, text=metadata.get("track_number"))
+    ]
+
+    for key, description in TXXX_FRAMES.items():
+        if metadata.get(key):
+            frames.append(id3.TXXX(encoding=3, desc=description, text=metadata[key]))
+
+    if cover:
+        frames.append(id3.APIC(encoding=3, mime=cover_mime(cover), type=3, desc=u"Cover", data=cover))
+
+    return frames
+
+
+def id3_padding(info) -> int:
+    """Padding policy of ID3 saves. The existing padding is kept whenever the new tags fit in it,
+    so the file is updated in place, and a generous amount is reserved when they do not, so the
+    next edits fit in turn instead of rewriting the whole audio file again.
+
+    Args:
+        info (mutagen.PaddingInfo): The padding that would be left with the current tag size.
+
+    Returns:
+        int: The padding to write.
+    """
+
+    return info.padding if info.padding >= 0 else constants.ID3_PADDING
+
+
+def tag_mp3(file: Path, metadata: Mapping, cover: bytes | None) -> None:
+    """Tags an MP3 file with ID3 frames.
+
+    Args:
+        file (Path): The path to the MP3 file.
+        metadata (Mapping): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format.
+    """
+
+    tags = id3.ID3(file)
+
+    if cover:
+        tags.delall("APIC")
+
+    for frame in id3_frames(metadata, cover):
+        tags.add(frame)
+
+    tags.save(padding=id3_padding)
+
+
+def tag_mp4(file: Path, metadata: Mapping, cover: bytes | None) -> None:
+    """Tags an m4a file with iTunes-style atoms.
+
+    Args:
+        file (Path): The path to the m4a file.
+        metadata (Mapping): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format.
+    """
+
+    audio = mp4.MP4(file)
+
+    if audio.tags is None:
+        audio.add_tags()
+
+    atoms: dict = {
+        "\xa9nam": "title",
+        "\xa9ART": "artist",
+        "\xa9alb": "album",
+        "\xa9day": "year",
+        "\xa9gen": "genre",
+        "cprt": "copyright",
+        "\xa9cmt": "comment"
+    }
+
+    for atom, key in atoms.items():
+        if metadata.get(key):
+            audio.tags[atom] = [metadata[key]]
+
+    if metadata.get("disc_number"):
+        audio.tags["disk"] = [split_number(metadata["disc_number"])]
+
+    if metadata.get("track_number"):
+        audio.tags["trkn"] = [split_number(metadata["track_number"])]
+
+    for key in ("replaygain_track_gain", "replaygain_track_peak"):  # Freeform atoms, as iTunes and foobar2000 do
+        if metadata.get(key):
+            audio.tags[f"----:com.apple.iTunes:{key}"] = [mp4.MP4FreeForm(metadata[key].encode("UTF-8"))]
+
+    if cover:
+        image_format = mp4.MP4Cover.FORMAT_JPEG if cover_mime(cover) == "image/jpeg" else mp4.MP4Cover.FORMAT_PNG
+        audio.tags["covr"] = [mp4.MP4Cover(cover, imageformat=image_format)]
+
+    audio.save()
+
+
+def tag_opus(file: Path, metadata: Mapping, cover: bytes | None) -> None:
+    """Tags an opus file with Vorbis comments.
+
+    Args:
+        file (Path): The path to the opus file.
+        metadata (Mapping): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format.
+    """
+
+    audio = oggopus.OggOpus(file)
+    comments: dict = {
+        "TITLE": "title",
+        "ARTIST": "artist",
+        "ALBUM": "album",
+        "DATE": "year",
+        "GENRE": "genre",
+        "COPYRIGHT": "copyright",
+        "DISCNUMBER": "disc_number",
+        "TRACKNUMBER": "track_number",
+        "DESCRIPTION": "comment",
+        "REPLAYGAIN_TRACK_GAIN": "replaygain_track_gain",
+        "REPLAYGAIN_TRACK_PEAK": "replaygain_track_peak"
+    }
+
+    for comment, key in comments.items():
+        if metadata.get(key):
+            audio[comment] = [metadata[key]]
+
+    if cover:
+        picture = Picture()
+        picture.type = 3
+        picture.mime = cover_mime(cover)
+        picture.desc = "Cover"
+        picture.data = cover
+        audio["METADATA_BLOCK_PICTURE"] = [b64encode(picture.write()).decode("ascii")]
+
+    audio.save()
+
+
+TAGGERS: dict = {
+    ".mp3": tag_mp3,
+    ".m4a": tag_mp4,
+    ".opus": tag_opus
+}
+
+
+def write_tags(file: Path, metadata: Mapping, cover: bytes | None = None) -> None:
+    """Tags an audio file, the format of the tags depending on its extension.
+
+    Args:
+        file (Path): The path to the audio file.
+        metadata (Mapping): The tags entered by the user.
+        cover (bytes | None): The album cover in PNG or JPEG format.
+    """
+
+    TAGGERS[file.suffix.lower()](file, metadata, cover)
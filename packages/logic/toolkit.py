@@ -2,11 +2,13 @@
 This module contains useful tools for the application.
 """
 
+import hashlib
+import os
+from itertools import count
+from pathlib import Path
 from typing import Callable
-from io import BytesIO
 
-from PIL import Image
-from PySide6.QtGui import QPixmap
+from packages.logic import links
 
 
 def check_data(strings: list[str]) -> bool:
@@ -23,53 +25,90 @@ def check_data(strings: list[str]) -> bool:
 
 
 def check_link(text: str) -> bool:
-    """Check if a given text string contains a valid YouTube link.
+    """Check if a given text string is a link to a YouTube video, in any of the forms
+    accepted by links.parse_link (youtu.be, m.youtube.com, shorts...).
 
     Args:
         text (str): The text string to check.
 
     Returns:
-        bool: True if all conditions are met, indicating a valid YouTube link format; False otherwise.
+        bool: True if the text is a link to a YouTube video; False otherwise.
     """
 
-    step_01: bool = "www.youtube.com" in text
-    step_02: bool = text.startswith("https://") or text.startswith("www.")
-    step_03: bool = text.count(".") == 2
+    try:
+        links.parse_link(text)
 
-    return step_01 and step_02 and step_03
+    except links.LinkError:
+        return False
 
+    return True
 
-def process_album_cover(image: str) -> tuple[QPixmap, bytes]:
-    """Process an album cover image by removing metadata, resizing,
-    and converting it to both QPixmap and binary data formats.
+
+def video_id(url: str) -> str | None:
+    """Extract the video ID from a YouTube link, in any of the forms accepted by links.parse_link.
 
     Args:
-        image (str): The file path to the album cover image.
+        url (str): The YouTube link.
 
     Returns:
-        tuple[QPixmap, bytes]: A tuple containing:
-            - QPixmap: The image as a QPixmap, suitable for display in a PySide6 application.
-            - bytes: The image data in PNG format, suitable for tagging an MP3 file.
+        str | None: The 11-character video ID, or None if the text is not a link to a video.
     """
 
-    image: Image = Image.open(image)
+    link: links.Link | str = links.read_link(url.strip())
+    return link.video_id if isinstance(link, links.Link) else None
+
+
+def file_digest(path: Path) -> str:
+    """Get the SHA-256 hash of a file, read in large blocks rather than loaded in memory as a whole.
+
+    Args:
+        path (Path): The path to the file.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def move_to_free_name(source: Path, destination: Path) -> Path:
+    """Move a complete file to the given path, or to "name (2).ext", "name (3).ext"... if it is taken.
+    An existing file is never replaced: the hard link to each candidate name either succeeds or fails
+    atomically, so two jobs finishing at the same time cannot pick the same name either.
+
+    Args:
+        source (Path): The file to move, in the same folder or at least on the same filesystem.
+        destination (Path): The preferred path of the file.
+
+    Returns:
+        Path: The path the file was moved to.
+    """
+
+    with open(source, "rb") as file:
+        os.fsync(file.fileno())  # The file must be on disk before it appears under its final name
+
+    for index in count(1):
+        candidate: Path = destination if index == 1 else destination.with_stem(f"{destination.stem} ({index})")
+
+        try:
+            os.link(source, candidate)
+
+        except FileExistsError:
+            continue
 
-    # Remove metadata by creating a new image with the same data
-    data: list = list(image.getdata())
-    new_image: Image = Image.new(image.mode, image.size)
-    new_image.putdata(data)
+        except OSError:  # Hard links are not supported by the filesystem, the name is reserved instead
+            try:
+                os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
 
-    # Resize the image to 200x200 pixels
-    new_image: Image = new_image.resize((200, 200))
+            except FileExistsError:
+                continue
 
-    # Save the processed image to a byte array in PNG format
-    byte_array: BytesIO = BytesIO()
-    new_image.save(byte_array, format='PNG')
-    byte_data: bytes = byte_array.getvalue()
+            os.replace(source, candidate)
+            return candidate
 
-    pixmap = QPixmap()
-    pixmap.loadFromData(byte_data)
-    return pixmap, byte_data
+        source.unlink()
+        return candidate
 
 
 def qthread_error_handler(function: Callable):
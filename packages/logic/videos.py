@@ -0,0 +1,320 @@
+"""
+This module resolves YouTube links into pytube.YouTube objects with their stream manifest
+loaded, and keeps them in an in-memory LRU cache keyed by video ID. The copyright check
+and the download of the same video therefore share a single round trip to YouTube.
+Descriptions of the videos (title, duration, audio streams) are also kept on disk,
+so videos seen in a previous session can be checked without any request at all.
+
+Videos are fetched on the network loop (see packages.logic.network): the watch page and the
+player response are requested concurrently, then handed to pytube, which parses them without
+any further request. Threads use the blocking functions, and the coroutines suffixed with
+"_async" let callers wait for a video without holding a thread.
+"""
+
+import asyncio
+import json
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable
+from urllib.parse import urlencode
+
+import pytube
+from pytube.innertube import InnerTube
+
+from packages.constants import constants
+from packages.logic import network
+from packages.logic.metadata_store import MetadataStore, VideoInfo
+from packages.logic.toolkit import video_id
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed time.
+
+    get_or_create makes concurrent callers asking for the same missing key wait for a single
+    computation of the value instead of each computing it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = monotonic):
+
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self.clock: Callable[[], float] = clock
+        self.entries: OrderedDict = OrderedDict()
+        self.pending: dict[Hashable, Future] = {}
+        self.lock = Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        """Get a value from the cache.
+
+        Args:
+            key (Hashable): The key of the value.
+
+        Returns:
+            Any | None: The value, or None if it is missing or has expired.
+        """
+
+        with self.lock:
+            entry: tuple | None = self.entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] <= self.clock():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value in the cache, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (Hashable): The key of the value.
+            value (Any): The value.
+        """
+
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Get a value from the cache, computing and storing it first if needed.
+
+        Args:
+            key (Hashable): The key of the value.
+            factory (Callable[[], Any]): Computes the value when it is not cached.
+
+        Returns:
+            Any: The value.
+        """
+
+        value: Any | None = self.get(key)
+
+        if value is not None:
+            return value
+
+        with self.lock:
+            future: Future | None = self.pending.get(key)
+            owner: bool = future is None
+
+            if owner:
+                future = self.pending[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = factory()
+
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+
+        with self.lock:
+            self.entries.clear()
+
+
+cache = TTLCache(maxsize=constants.VIDEO_CACHE_SIZE, ttl=constants.VIDEO_CACHE_TTL)
+store: MetadataStore | None = None
+store_lock = Lock()
+
+
+def watch_url(identifier: str) -> str:
+    """Get the canonical watch URL of a video.
+
+    Args:
+        identifier (str): The ID of the video.
+
+    Returns:
+        str: The watch URL.
+    """
+
+    return f"https://www.youtube.com/watch?v={identifier}"
+
+
+def metadata_store() -> MetadataStore:
+    """Get the persistent metadata store, opening it on first use."""
+
+    global store
+
+    with store_lock:
+        if store is None:
+            store = MetadataStore(
+                path=constants.METADATA_CACHE,
+                ttl=constants.METADATA_CACHE_TTL,
+                max_entries=constants.METADATA_CACHE_SIZE
+            )
+
+    return store
+
+
+def expect(response: network.Response, url: str) -> network.Response:
+    """Check that a response is successful, raising network.HttpError otherwise."""
+
+    if response.status >= 400:
+        raise network.HttpError(status=response.status, url=url)
+
+    return response
+
+
+async def fetch_async(url: str) -> pytube.YouTube:
+    """Fetch a video and its stream manifest from YouTube, the watch page and the player
+    response being requested concurrently. The parsing is done on a worker thread so the
+    network loop is never held up.
+
+    Args:
+        url (str): The YouTube link.
+
+    Returns:
+        pytube.YouTube: The video, with its streams loaded.
+    """
+
+    client: network.HttpClient = network.shared().client
+    video = pytube.YouTube(url)
+    innertube = InnerTube()  # The client pytube asks for the player response by default
+    query: str = urlencode({"videoId": video.video_id, **innertube.base_params})
+    player_url: str = f"{innertube.base_url}/player?{query}"
+    player_headers: dict = {**network.HEADERS, "Content-Type": "application/json", **innertube.header}
+    watch, player = await asyncio.gather(
+        client.request("GET", video.watch_url),
+        client.request("POST", player_url, player_headers, json.dumps(innertube.base_data).encode("UTF-8"))
+    )
+    video._watch_html = expect(watch, video.watch_url).text()
+    video._vid_info = expect(player, player_url).json()
+    js_url: str = await asyncio.to_thread(lambda: video.js_url)
+
+    if pytube.__js_url__ != js_url:  # The player script changes every few days, and is shared by every video
+        script: network.Response = expect(await client.request("GET", js_url), js_url)
+        pytube.__js__, pytube.__js_url__ = script.text(), js_url
+
+    await asyncio.to_thread(lambda: video.streams)  # Parsed from what was fetched above
+    return video
+
+
+def fetch(url: str) -> pytube.YouTube:
+    """Fetch a video and its stream manifest from YouTube.
+
+    Args:
+        url (str): The YouTube link.
+
+    Returns:
+        pytube.YouTube: The video, with its streams loaded.
+    """
+
+    return network.shared().run(fetch_async(url))
+
+
+def resolve(url: str) -> pytube.YouTube:
+    """Get a video and its stream manifest, from the cache when it was resolved recently.
+
+    Args:
+        url (str): The YouTube link.
+
+    Returns:
+        pytube.YouTube: The video, with its streams loaded.
+    """
+
+    identifier: str | None = video_id(url)
+
+    if identifier is None:
+        return cache.get_or_create(url, lambda: fetch(url))
+
+    return cache.get_or_create(identifier, lambda: fetch(watch_url(identifier)))
+
+
+async def resolve_async(url: str) -> pytube.YouTube:
+    """Get a video and its stream manifest without holding a thread, see resolve.
+
+    Args:
+        url (str): The YouTube link.
+
+    Returns:
+        pytube.YouTube: The video, with its streams loaded.
+    """
+
+    identifier: str | None = video_id(url)
+    key: str = identifier or url
+    video: pytube.YouTube | None = cache.get(key)
+
+    if video is None:
+        video = await fetch_async(watch_url(identifier) if identifier else url)
+        cache.put(key, video)
+
+    return video
+
+
+def youtube_resolver(identifier: str) -> VideoInfo:
+    """Describe a video by asking YouTube (or the in-memory cache).
+
+    Args:
+        identifier (str): The ID of the video.
+
+    Returns:
+        VideoInfo: The description of the video.
+    """
+
+    return VideoInfo.from_youtube(identifier, resolve(watch_url(identifier)))
+
+
+def describe(url: str, resolver: Callable[[str], VideoInfo] = youtube_resolver) -> VideoInfo:
+    """Get the description of a video, from the persistent store when it is known.
+
+    Args:
+        url (str): The YouTube link.
+        resolver (Callable[[str], VideoInfo]): Describes a video from its ID on a cache miss.
+
+    Returns:
+        VideoInfo: The description of the video.
+    """
+
+    identifier: str | None = video_id(url)
+
+    if identifier is None:
+        return VideoInfo.from_youtube(url, resolve(url))
+
+    return metadata_store().get_or_resolve(identifier, resolver)
+
+
+async def describe_async(url: str) -> VideoInfo:
+    """Get the description of a video without holding a thread, see describe.
+
+    Args:
+        url (str): The YouTube link.
+
+    Returns:
+        VideoInfo: The description of the video.
+    """
+
+    identifier: str | None = video_id(url)
+    info: VideoInfo | None = await asyncio.to_thread(metadata_store().get, identifier) if identifier else None
+
+    if info is not None:
+        return info
+
+    video: pytube.YouTube = await resolve_async(url)
+    info = await asyncio.to_thread(VideoInfo.from_youtube, identifier or url, video)  # May ask for file sizes
+
+    if identifier is not None:
+        await asyncio.to_thread(metadata_store().put, info)
+
+    return info
+
@@ -8,12 +8,22 @@ from PySide6.QtGui import QPixmap
 from packages.constants import constants
 
 
+class LazyPixmaps(dict):
+    """Dictionary of the application images, each one being decoded the first time it is requested."""
+
+    def __missing__(self, image_name: str) -> QPixmap:
+
+        pixmap = QPixmap(constants.IMAGES[image_name])
+        self[image_name] = pixmap
+        return pixmap
+
+
 class AestheticWindow(QWidget):
 
     def __init__(self):
 
         super().__init__()
-        self.images: dict = {image_name: QPixmap(image_path) for image_name, image_path in constants.IMAGES.items()}
+        self.images: dict = LazyPixmaps()
 
         if constants.STYLE.exists():
             self.ui_apply_style()
@@ -23,3 +33,37 @@ class AestheticWindow(QWidget):
 
         with open(constants.STYLE, "r", encoding="UTF-8") as style:
             self.setStyleSheet(style.read())
+
+
+def process_album_cover(image: str) -> tuple[QPixmap, bytes]:
+    """Process an album cover image by removing metadata, resizing,
+    and converting it to both QPixmap and binary data formats.
+
+    Args:
+        image (str): The file path to the album cover image.
+
+    Returns:
+        tuple[QPixmap, bytes]: A tuple containing:
+            - QPixmap: The image as a QPixmap, suitable for display in a PySide6 application.
+            - bytes: The image data in PNG format, suitable for tagging an MP3 file.
+    """
+
+    from packages.logic import covers  # Loads PIL, which the window does not need to be painted
+
+    byte_data: bytes = covers.process_cover(source=image)
+    return pixmap_from_bytes(data=byte_data), byte_data
+
+
+def pixmap_from_bytes(data: bytes) -> QPixmap:
+    """Build a QPixmap from encoded image data. Must be called from the GUI thread.
+
+    Args:
+        data (bytes): The image data, in any format supported by Qt.
+
+    Returns:
+        QPixmap: The image, suitable for display in a PySide6 application.
+    """
+
+    pixmap = QPixmap()
+    pixmap.loadFromData(data)
+    return pixmap
@@ -3,8 +3,8 @@ This module contains custom widgets.
 """
 
 from PySide6 import QtCore
-from PySide6.QtWidgets import QLineEdit, QLabel, QProgressBar
-from PySide6.QtGui import Qt, QPainter, QPen, QColor
+from PySide6.QtWidgets import QLineEdit, QLabel, QProgressBar, QScrollArea, QWidget
+from PySide6.QtGui import Qt, QPainter, QPen, QColor, QBrush
 
 
 class CustomQLineEdit(QLineEdit):
@@ -50,41 +50,38 @@ class CustomQProgressBar(QProgressBar):
 
     This class extends the functionality of QProgressBar to render a progress bar with a custom shape.
     The progress indicator follows a non-rectangular path specified by a list of points.
+    The path, its length and the pen never change, so they are computed once rather than on every repaint.
     """
 
+    # Path points of the progress indicator
+    PATH_POINTS: list[tuple] = [
+        (0, 103, 448, 103),
+        (448, 103, 448, 3),
+        (448, 3, 900, 3)
+    ]
+
     def __init__(self, parent=None):
         super().__init__(parent=parent)
 
         self.setValue(0)
         self.setGeometry(QtCore.QRect(0, 55, 900, 105))
+        self.segments: list[tuple] = [(*points, abs(points[2] - points[0]) + abs(points[3] - points[1]))
+                                      for points in self.PATH_POINTS]
+        self.total_length: int = sum(segment[4] for segment in self.segments)
+        self.progress_pen = QPen(QColor("#FFA500"), 5, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)  # type: ignore
 
     def paintEvent(self, arg__1):
 
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)  # type: ignore
-
-        # Define the path points for the progress indicator
-        path_points: list[tuple] = [
-            (0, 103, 448, 103),
-            (448, 103, 448, 3),
-            (448, 3, 900, 3)
-        ]
-
-        # Calculate the total length of the path
-        total_length: int = sum([abs(x2 - x1) + abs(y2 - y1) for x1, y1, x2, y2 in path_points])
+        painter.setPen(self.progress_pen)
 
         # Calculate the length of progress based on the current value
-        progress_length: int = int((self.value() / self.maximum()) * total_length)
-
-        # Define the pen for drawing the progress indicator
-        progress_pen = QPen(QColor("#FFA500"), 5, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)  # type: ignore
-        painter.setPen(progress_pen)
+        progress_length: int = int((self.value() / self.maximum()) * self.total_length)
         current_length: int = 0
 
         # Iterate through each segment of the path and draw the progress indicator
-        for x1, y1, x2, y2 in path_points:
-
-            segment_length: int = abs(x2 - x1) + abs(y2 - y1)
+        for x1, y1, x2, y2, segment_length in self.segments:
 
             if progress_length <= current_length + segment_length:
 
@@ -100,3 +97,142 @@ class CustomQProgressBar(QProgressBar):
                 # Draw the entire segment
                 painter.drawLine(x1, y1, x2, y2)
                 current_length += segment_length
+
+
+class JobRow:
+    """The state of a job as displayed by CustomQJobList."""
+
+    __slots__ = ("index", "label", "status", "percent")
+
+    def __init__(self, index: int, label: str):
+
+        self.index: int = index
+        self.label: str = label
+        self.status: str = "queued"
+        self.percent: int = 0
+
+
+class CustomQJobList(QWidget):
+    """
+    Paints the progress of many jobs, one row per job.
+
+    A single widget paints every row, instead of a widget per job, and only the rows that
+    changed are repainted: updates invalidate the rectangles of their rows, Qt merges them,
+    and paintEvent only goes through the rows crossing the invalidated area. Fonts, pens,
+    brushes and column positions are computed once, and labels are elided when a job is added.
+    """
+
+    ROW_HEIGHT: int = 30
+    LABEL_WIDTH: int = 300
+    STATUS_WIDTH: int = 100
+    BAR_WIDTH: int = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+
+        self.rows: dict[int, JobRow] = {}
+        self.order: list[JobRow] = []
+        self.setFixedWidth(self.LABEL_WIDTH + self.STATUS_WIDTH + self.BAR_WIDTH + 70)
+        self.text_pen = QPen(QColor("#000000"))
+        self.failed_pen = QPen(QColor("#FF6060"))
+        self.bar_brush = QBrush(QColor("#87A9B5"))
+        self.progress_brush = QBrush(QColor("#FFA500"))
+        self.status_x: int = self.LABEL_WIDTH + 10
+        self.bar_x: int = self.status_x + self.STATUS_WIDTH
+        self.percent_x: int = self.bar_x + self.BAR_WIDTH + 10
+        self.text_flags = Qt.AlignVCenter | Qt.AlignLeft  # type: ignore
+
+    def row_rect(self, row: JobRow) -> QtCore.QRect:
+        """Get the area covered by a row."""
+
+        return QtCore.QRect(0, row.index * self.ROW_HEIGHT, self.width(), self.ROW_HEIGHT)
+
+    def add_job(self, job_id: int, label: str) -> None:
+        """Adds a row for a new job, at the bottom of the list.
+
+        Args:
+            job_id (int): The ID of the job.
+            label (str): The text identifying the job, elided if too long.
+        """
+
+        elided: str = self.fontMetrics().elidedText(label, Qt.ElideRight, self.LABEL_WIDTH - 10)  # type: ignore
+        row = JobRow(index=len(self.order), label=elided)
+        self.rows[job_id] = row
+        self.order.append(row)
+        self.setFixedHeight(len(self.order) * self.ROW_HEIGHT)
+        self.update(self.row_rect(row))
+
+    def apply(self, updates: dict) -> None:
+        """Applies a batch of job updates, repainting the rows that changed.
+
+        Args:
+            updates (dict): The bg_processes.JobUpdate of each job, keyed by job ID.
+        """
+
+        for job_id, update in updates.items():
+            row: JobRow | None = self.rows.get(job_id)
+
+            if row is None:
+                continue
+
+            status: str = update.status.value if update.status else row.status
+            percent: int = update.progress.percent if update.progress else row.percent
+            percent = 100 if status == "done" else percent
+
+            if (status, percent) != (row.status, row.percent):
+                row.status, row.percent = status, percent
+                self.update(self.row_rect(row))
+
+    def overall(self) -> int:
+        """Get the mean progress of the jobs, failed ones counting as finished."""
+
+        if not self.order:
+            return 0
+
+        return sum(100 if row.status == "failed" else row.percent for row in self.order) // len(self.order)
+
+    def active(self) -> int:
+        """Get the number of jobs that are neither done nor failed."""
+
+        return sum(row.status not in ("done", "failed") for row in self.order)
+
+    def clear(self) -> None:
+        """Removes every row."""
+
+        self.rows.clear()
+        self.order.clear()
+        self.setFixedHeight(0)
+        self.update()
+
+    def paintEvent(self, event):
+
+        painter = QPainter(self)
+        area: QtCore.QRect = event.rect()
+        first: int = max(area.top() // self.ROW_HEIGHT, 0)
+        last: int = min(area.bottom() // self.ROW_HEIGHT, len(self.order) - 1)
+        bar_height: int = self.ROW_HEIGHT // 3
+
+        for row in self.order[first:last + 1]:
+            top: int = row.index * self.ROW_HEIGHT
+            painter.setPen(self.failed_pen if row.status == "failed" else self.text_pen)
+            painter.drawText(5, top, self.LABEL_WIDTH - 5, self.ROW_HEIGHT, self.text_flags, row.label)
+            painter.drawText(self.status_x, top, self.STATUS_WIDTH, self.ROW_HEIGHT, self.text_flags, row.status)
+            painter.drawText(self.percent_x, top, 60, self.ROW_HEIGHT, self.text_flags, f"{row.percent}%")
+            painter.fillRect(self.bar_x, top + bar_height, self.BAR_WIDTH, bar_height, self.bar_brush)
+            painter.fillRect(self.bar_x, top + bar_height, self.BAR_WIDTH * row.percent // 100, bar_height,
+                             self.progress_brush)
+
+
+class JobsDashboard(QScrollArea):
+    """A separate window listing the progress of every job, scrolling when there are many of them."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+
+        self.setWindowFlag(Qt.Window)  # type: ignore
+        self.setWindowTitle("YouTube MP3 Downloader - Jobs")
+        self.job_list = CustomQJobList()
+        self.setWidget(self.job_list)
+        self.setWidgetResizable(False)
+        self.setFixedWidth(self.job_list.width() + self.verticalScrollBar().sizeHint().width() + 4)
+        self.resize(self.width(), 10 * CustomQJobList.ROW_HEIGHT)
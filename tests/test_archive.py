@@ -0,0 +1,41 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from packages.constants import constants
+from packages.logic import encoding
+from packages.logic.archive import Archive
+
+
+@unittest.skipUnless(shutil.which(constants.FFMPEG), "ffmpeg is required to encode the files")
+class ArchiveScanTest(unittest.TestCase):
+
+    def setUp(self):
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.folder = Path(directory.name)
+        self.archive = Archive(self.folder / "archive.sqlite3")
+        self.addCleanup(self.archive.connection.close)
+
+    def encode(self, name: str, comment: str) -> Path:
+
+        silence: bytes = bytes(constants.PCM_RATE * 2 * 4)  # One second of stereo 32-bit float samples
+        return encoding.encode_pcm([silence], self.folder / "output" / name, "128k", metadata={"comment": comment})
+
+    def test_scan_skips_clips(self):
+
+        (self.folder / "output").mkdir()
+        full: Path = self.encode("full.mp3", "https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        self.encode("clip.mp3", "https://www.youtube.com/watch?v=9bZkp7q19f0 clip=60-90")
+        self.encode("open clip.mp3", "https://www.youtube.com/watch?v=kJQP7kiw5Fk clip=30-")
+
+        self.assertEqual(self.archive.scan(self.folder / "output"), 1)
+        self.assertEqual(self.archive.lookup("dQw4w9WgXcQ", "128k").path, full.absolute())
+        self.assertIsNone(self.archive.lookup("9bZkp7q19f0", "128k"))
+        self.assertIsNone(self.archive.lookup("kJQP7kiw5Fk", "128k"))
+
+
+if __name__ == "__main__":
+    unittest.main()
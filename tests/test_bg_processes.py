@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from threading import Event
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from packages.logic import bg_processes
+from packages.logic.archive import Archive
+from packages.logic.fingerprints import FingerprintIndex
+from packages.logic.jobs import Job, JobStatus
+from packages.logic.journal import Journal
+from packages.logic.metrics import MetricsLog
+
+
+class JobSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.folder = Path(directory.name)
+
+        stores: dict = {
+            "Archive": lambda: Archive(self.folder / "archive.sqlite3"),
+            "Journal": lambda: Journal(self.folder / "journal.sqlite3"),
+            "FingerprintIndex": lambda: FingerprintIndex(self.folder / "fingerprints.sqlite3"),
+            "MetricsLog": lambda: MetricsLog(self.folder / "metrics.jsonl"),
+        }
+
+        with mock.patch.multiple(bg_processes, **stores):
+            self.scheduler = bg_processes.JobScheduler(io_workers=1, cpu_workers=1)
+
+        self.addCleanup(lambda: self.scheduler.closer.join())
+        self.addCleanup(self.scheduler.shutdown)
+
+    def test_submit_archived_video(self):
+
+        file: Path = self.folder / "song.mp3"
+        file.write_bytes(b"audio")
+        self.scheduler.runner.archive.record("dQw4w9WgXcQ", "192k", file)
+        finished: list = []
+        self.scheduler.job_finished.connect(finished.append)
+
+        processor = self.scheduler.submit(Job(youtube_link="https://www.youtube.com/watch?v=dQw4w9WgXcQ"))
+
+        self.assertEqual(processor.status, JobStatus.DONE)
+        self.assertTrue(processor.pipeline.skipped)
+        self.assertEqual(processor.pipeline.output_file, file.absolute())
+        self.assertEqual(finished, [processor])
+        self.assertEqual(self.scheduler.processors, {})
+        self.assertEqual(self.scheduler.submitted, {})
+
+    def test_submit_many_archived_videos(self):
+
+        identifiers: tuple = ("dQw4w9WgXcQ", "9bZkp7q19f0", "kJQP7kiw5Fk")
+
+        for identifier in identifiers:
+            file: Path = self.folder / f"{identifier}.mp3"
+            file.write_bytes(b"audio")
+            self.scheduler.runner.archive.record(identifier, "192k", file)
+
+        jobs: list[Job] = [Job(youtube_link=f"https://youtu.be/{identifier}") for identifier in identifiers]
+        processors: list = self.scheduler.submit_many(jobs)
+
+        self.assertEqual([processor.job for processor in processors], jobs)
+        self.assertTrue(all(processor.pipeline.skipped for processor in processors))
+        self.assertEqual(self.scheduler.submitted, {})
+
+    def test_shutdown_closes_the_journal_once_running_stages_end(self):
+
+        journal: Journal = self.scheduler.runner.journal
+        entry_id: int = journal.start(Job(youtube_link="https://youtu.be/dQw4w9WgXcQ"), self.folder)
+        release = Event()
+        self.scheduler.runner.io_pool.submit(lambda: (release.wait(5), journal.finish(entry_id)))
+
+        self.scheduler.shutdown()
+        release.set()
+        self.scheduler.closer.join(5)
+
+        connection = sqlite3.connect(self.folder / "journal.sqlite3")
+        self.addCleanup(connection.close)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
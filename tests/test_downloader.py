@@ -0,0 +1,51 @@
+import unittest
+from pathlib import Path
+from threading import Event, Thread
+from unittest import mock
+
+from packages.logic import downloader
+from packages.logic.downloader import SegmentedDownloader
+
+
+class ActiveDownloadsTest(unittest.TestCase):
+
+    def test_lock_released_by_the_last_download(self):
+
+        started, release = Event(), Event()
+        partial = Path("/tmp/stream.part")
+
+        def run(instance) -> Path:
+
+            started.set()
+            release.wait(5)
+            return instance.destination
+
+        with mock.patch.object(SegmentedDownloader, "run", run):
+            first = Thread(target=SegmentedDownloader("http://127.0.0.1/", Path("/tmp/a"), partial=partial).download)
+            second = Thread(target=SegmentedDownloader("http://127.0.0.1/", Path("/tmp/b"), partial=partial).download)
+            first.start()
+            started.wait(5)
+            second.start()
+
+            while downloader.active_downloads[partial][1] < 2:
+                second.join(0.01)
+
+            release.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertNotIn(partial, downloader.active_downloads)
+
+    def test_lock_released_after_a_failure(self):
+
+        partial = Path("/tmp/failing.part")
+
+        with mock.patch.object(SegmentedDownloader, "run", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                SegmentedDownloader("http://127.0.0.1/", Path("/tmp/c"), partial=partial).download()
+
+        self.assertNotIn(partial, downloader.active_downloads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from packages.logic.fingerprints import Fingerprint, FingerprintIndex
+
+
+class FingerprintIndexTest(unittest.TestCase):
+
+    def setUp(self):
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.folder = Path(directory.name)
+        self.index = FingerprintIndex(self.folder / "fingerprints.sqlite3")
+        self.addCleanup(self.index.connection.close)
+
+    def track(self, name: str, seed: int) -> tuple[Path, Fingerprint]:
+
+        path: Path = self.folder / name
+        path.write_bytes(b"audio")
+        generator = np.random.default_rng(seed)
+        hashes: np.ndarray = generator.integers(0, 1 << 32, size=500, dtype=np.int64)
+        times: np.ndarray = np.sort(generator.integers(0, 5000, size=500, dtype=np.int64))
+        return path, Fingerprint(hashes=hashes, times=times, duration=60.0)
+
+    def test_match(self):
+
+        path, fingerprint = self.track("a.mp3", seed=1)
+        self.index.add(path, fingerprint)
+
+        match = self.index.match(fingerprint)
+
+        self.assertEqual(match.path, path.absolute())
+        self.assertEqual(match.score, 1.0)
+        self.assertEqual(match.offset, 0.0)
+
+    def test_forgotten_track_does_not_match_the_next_one(self):
+
+        first, first_fingerprint = self.track("a.mp3", seed=1)
+        second, second_fingerprint = self.track("b.mp3", seed=2)
+        self.index.add(first, first_fingerprint)
+        self.index.forget(first)
+        self.index.add(second, second_fingerprint)
+
+        self.assertIsNone(self.index.match(first_fingerprint))
+        self.assertEqual(self.index.match(second_fingerprint).path, second.absolute())
+
+    def test_replaced_track_keeps_only_its_new_hashes(self):
+
+        path, old_fingerprint = self.track("a.mp3", seed=1)
+        _, new_fingerprint = self.track("a.mp3", seed=2)
+        self.index.add(path, old_fingerprint)
+        self.index.add(path, new_fingerprint)
+
+        self.assertIsNone(self.index.match(old_fingerprint))
+        self.assertEqual(self.index.match(new_fingerprint).path, path.absolute())
+
+
+if __name__ == "__main__":
+    unittest.main()
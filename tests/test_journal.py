@@ -0,0 +1,48 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from packages.logic.jobs import Job
+from packages.logic.journal import Journal
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.folder = Path(directory.name)
+        self.journal = Journal(self.folder / "journal.sqlite3")
+        self.addCleanup(self.journal.close)
+
+    def count(self) -> int:
+
+        connection = sqlite3.connect(self.folder / "journal.sqlite3")
+
+        try:
+            return connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+        finally:
+            connection.close()
+
+    def test_batch_commits_once_at_the_end(self):
+
+        with self.journal.batch():
+            entries: list = [self.journal.start(Job(youtube_link=f"https://youtu.be/dQw4w9WgXc{index}"), self.folder)
+                             for index in range(3)]
+            self.assertEqual(self.count(), 0)
+
+        self.assertEqual(self.count(), 3)
+        self.assertNotIn(None, entries)
+
+    def test_start_commits_outside_batches(self):
+
+        self.journal.start(Job(youtube_link="https://youtu.be/dQw4w9WgXcQ"), self.folder)
+
+        self.assertEqual(self.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
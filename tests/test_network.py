@@ -0,0 +1,50 @@
+import asyncio
+import http.client
+import unittest
+
+from packages.logic.network import HttpClient
+
+
+class ChunkedBodyTest(unittest.TestCase):
+
+    def fetch(self, body: bytes) -> bytes:
+
+        async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + body)
+            await writer.drain()
+            writer.close()
+
+        async def run() -> bytes:
+
+            server = await asyncio.start_server(answer, "127.0.0.1", 0)
+            port: int = server.sockets[0].getsockname()[1]
+            client = HttpClient(retries=0)
+
+            try:
+                return (await client.request("GET", f"http://127.0.0.1:{port}/")).body
+
+            finally:
+                await client.close()
+                server.close()
+
+        return asyncio.run(run())
+
+    def test_complete_body(self):
+
+        self.assertEqual(self.fetch(b"5\r\nhello\r\n6;name=value\r\n world\r\n0\r\n\r\n"), b"hello world")
+
+    def test_connection_closed_before_a_chunk_size(self):
+
+        with self.assertRaises(http.client.IncompleteRead):
+            self.fetch(b"5\r\nhello\r\n")
+
+    def test_malformed_chunk_size(self):
+
+        with self.assertRaises(http.client.HTTPException):
+            self.fetch(b"zz\r\nhello\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
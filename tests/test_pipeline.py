@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from packages.logic.fingerprints import Fingerprint, FingerprintIndex, FingerprintMatch
+from packages.logic.jobs import Job
+from packages.logic.pipeline import Pipeline
+
+
+class FindDuplicateTest(unittest.TestCase):
+
+    def setUp(self):
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.folder = Path(directory.name)
+        self.index = FingerprintIndex(self.folder / "fingerprints.sqlite3")
+        self.addCleanup(self.index.connection.close)
+
+    def test_matched_file_deleted_since(self):
+
+        fingerprint = Fingerprint(hashes=np.arange(100, dtype=np.int64), times=np.arange(100, dtype=np.int64),
+                                  duration=10.0)
+        library: Path = self.folder / "library.mp3"
+        library.write_bytes(b"audio")
+        self.index.add(library, fingerprint)
+        library.unlink()
+
+        download: Path = self.folder / "download.webm"
+        download.write_bytes(b"audio")
+        pipeline = Pipeline(job=Job(youtube_link="https://youtu.be/dQw4w9WgXcQ", skip_duplicates=True),
+                            output_directory=self.folder, fingerprints=self.index)
+        found: list = []
+        pipeline.duplicate_found.connect(found.append)
+        match = FingerprintMatch(path=library.absolute(), score=1.0, offset=0.0)  # Matched just before the deletion
+
+        with mock.patch("packages.logic.pipeline.fingerprint_file", return_value=fingerprint), \
+                mock.patch.object(self.index, "match", return_value=match):
+            self.assertFalse(pipeline.find_duplicate(download))
+
+        self.assertIsNone(pipeline.duplicate)
+        self.assertFalse(pipeline.skipped)
+        self.assertEqual(found, [])
+        self.assertEqual(self.index.stats(), {"tracks": 0, "hashes": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from packages.logic import toolkit
+
+
+class VideoIdTest(unittest.TestCase):
+
+    def test_every_form_accepted_by_check_link(self):
+
+        for link in ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=90s", "youtu.be/dQw4w9WgXcQ",
+                     "https://YOUTU.BE/dQw4w9WgXcQ?t=3", "https://m.youtube.com/shorts/dQw4w9WgXcQ",
+                     "https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ", "https://www.youtube.com/v/dQw4w9WgXcQ",
+                     "https://www.youtube.com/e/dQw4w9WgXcQ", " https://www.youtube.com/live/dQw4w9WgXcQ\n"):
+            with self.subTest(link=link):
+                self.assertTrue(toolkit.check_link(link))
+                self.assertEqual(toolkit.video_id(link), "dQw4w9WgXcQ")
+
+    def test_not_a_video(self):
+
+        for text in ("https://www.youtube.com/playlist?list=PL123", "https://example.com/watch?v=dQw4w9WgXcQ", ""):
+            with self.subTest(text=text):
+                self.assertIsNone(toolkit.video_id(text))
+
+
+if __name__ == "__main__":
+    unittest.main()